@@ -0,0 +1,46 @@
+"""Masks blacklisted words with the compiled censor and with the per-word loop it replaced.
+
+Run from the repository root with ``python -m benchmarks.censor``.
+"""
+import random
+import re
+import string
+import time
+
+from bot.utils.censor import Censor
+
+
+WORDS = 1_000
+NAMES = 2_000
+
+
+def loop(blacklist, name):
+    for word in blacklist:
+        if word.casefold() in name.casefold():
+            name = re.sub(word, '*' * len(word), name, flags=re.IGNORECASE)
+    return name
+
+
+def main():
+    rng = random.Random(0)
+    blacklist = ["".join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 10))) for _ in range(WORDS)]
+    names = [f"{rng.choice(blacklist).upper()}'s channel {i}" if i % 2 else f"member{i}'s channel" for i in range(NAMES)]
+
+    start = time.perf_counter()
+    expected = [loop(blacklist, name) for name in names]
+    before = time.perf_counter() - start
+
+    start = time.perf_counter()
+    censor = Censor(blacklist)
+    compiled = time.perf_counter() - start
+    start = time.perf_counter()
+    masked = [censor(name) for name in names]
+    after = time.perf_counter() - start
+
+    assert masked == expected
+    print(f"{WORDS} words, {NAMES} names: loop {before * 1000:.1f} ms, "
+          f"censor {after * 1000:.1f} ms (+{compiled * 1000:.1f} ms to compile once)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""Runs real clusters under the supervisor against the local stand-in server and checks where their records end up.
+
+The records start out in one shared data directory, the way the bot kept them before it was
+clustered. A first generation of clusters adopts them and serves the members waiting in the
+lobbies while one guild is unavailable. Its cluster is killed afterwards and restarted by the
+supervisor, then the guild comes back and has to be adopted and served as well. Then members
+leave some channels and join the lobbies while the bot is down, and the shard and cluster counts
+change. The second generation has to adopt the channels the first one created, delete the ones
+that were left empty and serve the new members with the adopted configs.
+
+Afterwards every record has to be in the directory of the one cluster that owns its guild, with
+nothing lost and nothing left of deleted channels.
+
+Run from the repository root with ``python -m benchmarks.clusters``.
+"""
+import asyncio
+import os
+import tempfile
+import time
+
+import disnake as discord
+
+from bot import cluster
+from bot.utils import data
+
+from .load import wait_for
+from .server import Server
+
+
+GENERATIONS = ((4, 2), (6, 3))  # shard and cluster counts
+GUILDS = 24
+MEMBERS = 3  # joining each lobby per generation
+CRASHING = 1  # cluster of the first generation that is killed once, one of its guilds is unavailable
+
+
+def run_cluster(url, *args):
+    discord.http.Route.BASE = f"{url}/api/v10"
+    cluster.run_cluster(*args)
+
+
+async def write_legacy(directory, lobbies):
+    configs = data.JournalDict(os.path.join(directory, "configs.json"))
+    blacklists = data.JournalDict(os.path.join(directory, "blacklists.json"))
+    limits = data.JournalDict(os.path.join(directory, "limits.json"))
+    for guild, lobby in lobbies.items():
+        configs[str(lobby)] = {"name": f"@user in {guild.id}"}
+        blacklists[str(guild.id)] = [f"word{guild.id}"]
+        limits[str(guild.id)] = {"rate": 5, "per": 10.0}
+    for store in (configs, blacklists, limits):
+        await store.close()
+
+
+async def join(server, lobbies, first):
+    for guild, lobby in lobbies.items():
+        users = [user_id for user_id, m in guild.members.items() if not m["user"]["bot"]]
+        for user_id in users[first:first + MEMBERS]:
+            await server.connect(guild, user_id, lobby)
+
+
+def served(server, lobbies):
+    return not any(channel_id == lobby for guild, lobby in lobbies.items() for channel_id in guild.voice.values())
+
+
+async def generation(server, directory, lobbies, shard_count, clusters, first, *, crash=False):
+    args = cluster.cluster_args("token", shard_count=shard_count, clusters=clusters, path=directory)
+    outage = None
+    if crash:
+        outage = next(guild for guild in lobbies if cluster.shard_of(guild.id, shard_count) in args[CRASHING][1])
+        outage.unavailable = True
+    available = {guild: lobby for guild, lobby in lobbies.items() if guild is not outage}
+    await join(server, available, first)
+    supervisor = cluster.Supervisor(run_cluster, [(server.url, *a) for a in args], backoff=0.1)
+    running = asyncio.get_running_loop().run_in_executor(None, supervisor.run)
+    connected = lambda shard_ids: set(shard_ids) <= {session.shard[0] for session in server.sessions}
+
+    try:
+        await wait_for(lambda: served(server, available) and connected(range(shard_count)))
+        await asyncio.sleep(2)  # for prepare's flush
+        if crash:
+            supervisor.processes[CRASHING].kill()  # no close(), adopt and prepare have to have written everything
+            await wait_for(lambda: supervisor.crashes[CRASHING] and CRASHING in supervisor.processes and connected(args[CRASHING][1]))
+            await asyncio.sleep(2)
+
+            adopted = os.path.join(args[CRASHING][3], "adopted")
+            assert not os.path.exists(adopted), "adopted while a guild was unavailable"
+            await server.recover(outage)
+            await wait_for(lambda: os.path.exists(adopted))
+            await join(server, {outage: lobbies[outage]}, first)
+            await wait_for(lambda: served(server, lobbies))
+            await asyncio.sleep(2)
+    finally:
+        for process in list(supervisor.processes.values()):
+            process.terminate()  # disnake closes the bot on SIGTERM
+        await running
+    return args, supervisor
+
+
+async def check(server, lobbies, args):
+    shard_count = args[0][2]
+    channels = {c for guild, lobby in lobbies.items() for c in guild.channels if c != lobby}
+    found = {"configs": set(), "channels": set(), "blacklists": set(), "limits": set()}
+    for _, shard_ids, _, path, _, _ in args:
+        ours = {guild.id for guild in lobbies if cluster.shard_of(guild.id, shard_count) in shard_ids}
+        for name in found:
+            store = (data.JournalSet if name == "channels" else data.JournalDict)(os.path.join(path, f"{name}.json"))
+            for key in store:
+                guild = (server.channels if name in ("configs", "channels") else server.guilds).get(int(key))
+                assert guild is not None and guild.id in ours, f"{name} {key} is gone or in the wrong cluster"
+                assert key not in found[name], f"{name} {key} is in two clusters"
+                found[name].add(key)
+
+    assert found["configs"] == {str(lobby) for lobby in lobbies.values()}, "configs were lost"
+    assert found["channels"] == channels, "channels were lost or deleted ones kept"
+    assert found["blacklists"] == found["limits"] == {str(guild.id) for guild in lobbies}, "blacklists or limits were lost"
+    return len(channels)
+
+
+async def main():
+    server = Server()
+    lobbies = {}
+    for i in range(GUILDS):
+        guild = server.add_guild(members=MEMBERS * len(GENERATIONS), guild_id=(i + 1) << 22)  # spread over the shards
+        lobbies[guild] = int(server.add_channel(guild, "join me")["id"])
+    await server.start()
+
+    with tempfile.TemporaryDirectory() as directory:
+        await write_legacy(directory, lobbies)
+        start = time.perf_counter()
+        for number, (shard_count, clusters) in enumerate(GENERATIONS):
+            if number:
+                # while the bot is down: a member leaves every guild's first channel, new members wait in the lobbies
+                emptied = set()
+                for guild, lobby in lobbies.items():
+                    channel_id = min(c for c in guild.channels if c != lobby)
+                    user_id = next(u for u, c in guild.voice.items() if c == channel_id)
+                    await server.connect(guild, user_id, None)
+                    emptied.add(channel_id)
+            args, supervisor = await generation(server, directory, lobbies, shard_count, clusters, number * MEMBERS, crash=not number)
+            if not number:
+                assert len(supervisor.crashes[CRASHING]) == 1
+        assert not emptied & server.channels.keys(), "channels left empty weren't deleted"
+        assert all(os.path.exists(os.path.join(a[3], "adopted")) for a in args), "a cluster never finished adopting"
+        channels = await check(server, lobbies, args)
+        elapsed = time.perf_counter() - start
+    await server.close()
+
+    print(f"{GUILDS} guilds on " + " then ".join(f"{s} shards in {c} clusters" for s, c in GENERATIONS) +
+          f": every record in its cluster once, {channels} channels tracked, {elapsed:.1f}s")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
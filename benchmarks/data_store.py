@@ -0,0 +1,71 @@
+"""Compares the persistence cost of tracking one new channel across the storage backends.
+
+Run from the repository root with ``python -m benchmarks.data_store``.
+"""
+import asyncio
+import os
+import tempfile
+import time
+
+from bot.utils import data, database
+
+
+SIZES = (1_000, 10_000, 100_000)
+SAVES = 200
+
+
+def disk_usage(*paths):
+    return sum(os.path.getsize(p) for p in paths if os.path.exists(p))
+
+
+async def run(name, size, directory):
+    path = os.path.join(directory, f"{name}-{size}")
+    db = None
+    if name == "dump":
+        store = data.Set(path + ".json")
+        log = None
+    elif name == "journal":
+        store = data.JournalSet(path + ".json")
+        log = store.log
+    else:
+        db = database.Database(path + ".db")
+        store = database.Set(db, "channels")
+        log = path + ".db-wal"
+
+    store.update(range(size))
+    await store.flush()
+    if hasattr(store, "compact"):
+        await store.compact()
+
+    written = 0
+    start = time.perf_counter()
+    for i in range(SAVES):
+        before = disk_usage(log) if log else 0
+        store.add(size + i)
+        await store.flush()
+        after = disk_usage(log) if log else 0
+        if log is None:
+            written += disk_usage(store.path)
+        elif after >= before:
+            written += after - before
+        else:  # the journal was folded into a new snapshot, or sqlite checkpointed its WAL
+            written += disk_usage(log) + (disk_usage(store.path) if name == "journal" else 0)
+    elapsed = time.perf_counter() - start
+
+    await store.close()
+    if db is not None:
+        db.close()
+    return written / SAVES, elapsed / SAVES * 1000
+
+
+async def main():
+    print(f"{'entries':>8} {'store':>12} {'bytes/save':>12} {'ms/save':>9}")
+    with tempfile.TemporaryDirectory() as directory:
+        for size in SIZES:
+            for name in ("dump", "journal", "sqlite"):
+                written, latency = await run(name, size, directory)
+                print(f"{size:>8} {name:>12} {written:>12.0f} {latency:>9.3f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,199 @@
+"""Stand-ins for the disnake objects the bot touches, backed by a simulated REST layer"""
+import asyncio
+import collections
+import itertools
+import random
+import types
+
+import disnake as discord
+
+
+ids = itertools.count(10 ** 17)
+
+
+def reset_ids(start):
+    """Makes the ids handed out from now on start at ``start``, e.g. to keep processes apart"""
+    global ids
+    ids = itertools.count(start)
+
+
+class Rest:
+    """Counts calls per route and delays each one by ``latency`` seconds.
+
+    A share of ``rate_limit`` requests is answered with a 429 first, they are retried after
+    ``retry_after`` seconds the way disnake's HTTP client does it.
+    """
+
+    def __init__(self, latency=0.0, *, rate_limit=0.0, retry_after=1.0, seed=0):
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.calls = collections.Counter()
+        self.limited = collections.Counter()
+
+    async def request(self, route):
+        self.calls[route] += 1
+        if self.rate_limit and self.random.random() < self.rate_limit:
+            self.limited[route] += 1
+            await asyncio.sleep(self.retry_after)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+
+class Role:
+    def __init__(self, name):
+        self.id = next(ids)
+        self.name = name
+
+    def __hash__(self):
+        return hash(self.id)
+
+
+class Member:
+    def __init__(self, guild, name=None):
+        self.id = next(ids)
+        self.guild = guild
+        self.display_name = name or f"member{self.id % 10000}"
+        self.voice_channel = None
+
+    def __hash__(self):
+        return hash(self.id)
+
+    @property
+    def voice(self):
+        return None if self.voice_channel is None else types.SimpleNamespace(channel=self.voice_channel)
+
+    def connect(self, channel):
+        """Puts the member into ``channel``, or disconnects them for ``None``, and reports it like the gateway would"""
+        before = self.voice_channel
+        if before is not None:
+            before.members.remove(self)
+        if channel is not None:
+            channel.members.append(self)
+        self.voice_channel = channel
+        if self.guild.on_voice_state is not None:
+            self.guild.on_voice_state(self, types.SimpleNamespace(channel=before), types.SimpleNamespace(channel=channel))
+
+    async def move_to(self, channel):
+        await self.guild.rest.request("move")
+        if self.voice_channel is None:
+            response = types.SimpleNamespace(status=400, reason="Bad Request")
+            raise discord.HTTPException(response, {"code": 40032, "message": "Target user is not connected to voice."})
+        self.connect(channel)
+
+    async def send(self, content):
+        await self.guild.rest.request("dm")
+
+
+class VoiceChannel:
+    def __init__(self, guild, name, *, category=None, position=0, user_limit=0, bitrate=64000, overwrites=None):
+        self.id = next(ids)
+        self.guild = guild
+        self.name = name
+        self.category = category
+        self.position = position
+        self.user_limit = user_limit
+        self.bitrate = bitrate
+        self.rtc_region = None
+        self.video_quality_mode = discord.VideoQualityMode.auto
+        self._overwrites = []
+        self.set_overwrites(overwrites or {})
+        self.members = []
+
+    @property
+    def category_id(self):
+        return self.category.id if self.category else None
+
+    def set_overwrites(self, overwrites):
+        """Keeps them the way disnake does, as ids with their type"""
+        self._overwrites = []
+        for target, overwrite in overwrites.items():
+            allow, deny = overwrite.pair()
+            kind = discord.abc._Overwrites.ROLE if isinstance(target, Role) else discord.abc._Overwrites.MEMBER
+            self._overwrites.append(discord.abc._Overwrites({"id": target.id, "allow": allow.value, "deny": deny.value, "type": kind}))
+
+    async def edit(self, *, name=None, overwrites=None, position=None):
+        await self.guild.rest.request("edit")
+        if name is not None:
+            self.name = name
+        if overwrites is not None:
+            self.set_overwrites(overwrites)
+        if position is not None:
+            self.position = position
+
+    async def delete(self):
+        await self.guild.rest.request("delete")
+        self.guild.remove_channel(self)
+
+
+class CategoryChannel:
+    def __init__(self, guild, name):
+        self.id = next(ids)
+        self.guild = guild
+        self.name = name
+
+    @property
+    def voice_channels(self):
+        return [c for c in self.guild.voice_channels if c.category is self]
+
+
+class Guild:
+    def __init__(self, rest, id=None):
+        self.id = next(ids) if id is None else id
+        self.rest = rest
+        self.bitrate_limit = 96000
+        self.voice_channels = []
+        self.categories = []
+        self.channels = {}
+        self.unavailable = False
+        self.on_delete = None
+        self.on_voice_state = None
+        self.default_role = Role("@everyone")
+        self.me = Role("bot")
+
+    def get_channel(self, channel_id):
+        return self.channels.get(channel_id)
+
+    def get_role(self, role_id):
+        return next((role for role in (self.default_role, self.me) if role.id == role_id), None)
+
+    def get_member(self, member_id):
+        return None  # members aren't kept by id, as if they weren't cached
+
+    def add_category(self, name):
+        category = CategoryChannel(self, name)
+        self.categories.append(category)
+        self.channels[category.id] = category
+        return category
+
+    def add_voice_channel(self, name, **kwargs):
+        channel = VoiceChannel(self, name, **kwargs)
+        self.voice_channels.append(channel)
+        self.channels[channel.id] = channel
+        return channel
+
+    def add_member(self, channel=None):
+        member = Member(self)
+        if channel is not None:
+            channel.members.append(member)
+            member.voice_channel = channel
+        return member
+
+    def remove_channel(self, channel):
+        self.voice_channels.remove(channel)
+        del self.channels[channel.id]
+        if self.on_delete is not None:
+            self.on_delete(channel)
+
+    async def create_voice_channel(self, name, *, category=None, position=discord.utils.MISSING, bitrate=64000,
+                                   user_limit=0, overwrites=None, **kwargs):
+        await self.rest.request("create")
+        return self.add_voice_channel(
+            name,
+            category=category,
+            position=0 if position is discord.utils.MISSING else position,
+            bitrate=bitrate,
+            user_limit=user_limit,
+            overwrites=overwrites
+        )
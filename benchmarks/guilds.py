@@ -0,0 +1,174 @@
+"""Compares startup time and resident memory of the JSON stores and the per guild partitions.
+
+Each loader runs in a fresh process so their memory doesn't mix. Afterwards a few thousand lookups
+of settings and blacklists hit a small set of active guilds, as they would on a real bot.
+
+Before that, a guild evicted before it was ever written is read and changed while a flush writes it,
+and the JSON stores are partitioned while a guild is unavailable.
+
+Run from the repository root with ``python -m benchmarks.guilds``.
+"""
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+
+import psutil
+
+from bot.utils import data, guilds
+
+from . import fakes
+from .prepare import Bot
+
+
+GUILDS = 50_000
+ACTIVE = 2_000  # guilds that actually use their lobbies
+LOOKUPS = 20_000
+
+
+def lobbies_of(guild_id):
+    return [str(guild_id + 1 + i) for i in range(1 + guild_id % 3 // 2)]
+
+
+def generate(directory):
+    rng = random.Random(0)
+    configs, blacklists, limits = {}, {}, {}
+    for i in range(GUILDS):
+        guild_id = (i + 1) << 22
+        for lobby in lobbies_of(guild_id):
+            configs[lobby] = {"name": "@user's room", "limit": 5} if rng.random() < 0.5 else {}
+        if rng.random() < 0.2:
+            blacklists[str(guild_id)] = [f"word{rng.randrange(10_000)}" for _ in range(30)]
+        if rng.random() < 0.05:
+            limits[str(guild_id)] = {"rate": 5, "per": 30}
+
+    os.makedirs(os.path.join(directory, "json"))
+    for name, store in (("configs", configs), ("blacklists", blacklists), ("limits", limits)):
+        with open(os.path.join(directory, "json", f"{name}.json"), "w") as file:
+            json.dump(store, file)
+
+    async def partition():
+        path = os.path.join(directory, "guilds")
+        partitions = guilds.Partitions(os.path.join(path, "guilds"))
+        routes = data.JournalDict(os.path.join(path, "lobbies.json"))
+        sections = (
+            (guilds.Section(partitions, "configs", guild_of=None, routes=routes), configs),
+            (guilds.Section(partitions, "blacklists", guild_of=int), blacklists),
+            (guilds.Section(partitions, "limits", guild_of=int), limits),
+        )
+        for section, store in sections:
+            for key, value in store.items():
+                if section.routes is not None:
+                    routes[key] = int(key) >> 22 << 22
+                section[key] = value
+            await section.flush()
+        await routes.close()
+
+    asyncio.run(partition())
+
+
+def load(storage, directory):
+    if storage == "json":
+        path = os.path.join(directory, "json")
+        configs = data.JournalDict(os.path.join(path, "configs.json"))
+        blacklists = data.JournalDict(os.path.join(path, "blacklists.json"))
+        limits = data.JournalDict(os.path.join(path, "limits.json"))
+        return configs, blacklists, limits
+
+    path = os.path.join(directory, "guilds")
+    partitions = guilds.Partitions(os.path.join(path, "guilds"))
+    routes = data.JournalDict(os.path.join(path, "lobbies.json"))
+    configs = guilds.Section(partitions, "configs", guild_of=None, routes=routes)
+    blacklists = guilds.Section(partitions, "blacklists", guild_of=int)
+    limits = guilds.Section(partitions, "limits", guild_of=int)
+    return configs, blacklists, limits
+
+
+def measure(storage, directory, results):
+    asyncio.set_event_loop(asyncio.new_event_loop())
+    process = psutil.Process()
+    before = process.memory_info().rss
+    start = time.perf_counter()
+    configs, blacklists, limits = load(storage, directory)
+    startup = time.perf_counter() - start
+    loaded = process.memory_info().rss - before
+
+    rng = random.Random(1)
+    active = [(rng.randrange(GUILDS) + 1) << 22 for _ in range(ACTIVE)]
+    start = time.perf_counter()
+    for _ in range(LOOKUPS):
+        guild_id = rng.choice(active)
+        for lobby in lobbies_of(guild_id):
+            if lobby in configs:
+                configs[lobby].get("name")
+        blacklists.get(str(guild_id), [])
+        limits.get(str(guild_id))
+    lookups = time.perf_counter() - start
+    results.put((storage, startup, loaded, process.memory_info().rss - before, lookups))
+
+
+async def check_flush(directory):
+    partitions = guilds.Partitions(os.path.join(directory, "flush"), budget=1)  # only the latest guild stays loaded
+    for guild_id in range(1, 1_001):
+        partitions.get(guild_id, create=True)["limits"] = {str(guild_id): {"rate": 1, "per": 1}}
+        partitions.touch(guild_id)
+    partitions.get(1_001, create=True)  # evicts the last one, which is written last
+    flush = asyncio.ensure_future(partitions.flush())
+    await asyncio.sleep(0)  # the writer thread has started on them
+    assert not flush.done()
+    partitions.get(1_000)["limits"]["1000"]["rate"] = 2
+    partitions.touch(1_000)
+    await flush
+    await partitions.flush()
+    assert guilds.Partitions(partitions.path).get(1_000)["limits"]["1000"]["rate"] == 2, "the change was overwritten"
+
+
+async def check_partition(directory):
+    rest = fakes.Rest()
+    available, outage = fakes.Guild(rest), fakes.Guild(rest)
+    lobbies = [guild.add_voice_channel("join me") for guild in (available, outage)]
+    path = os.path.join(directory, "partition")
+    os.makedirs(path)
+    configs = data.JournalDict(os.path.join(path, "configs.json"))
+    for lobby in lobbies:
+        configs[str(lobby.id)] = {"name": "@user"}
+    configs[str(outage.id + 1)] = {"name": "@user"}  # a lobby that was deleted while the bot was offline
+    await configs.close()
+
+    channels, outage.voice_channels, outage.unavailable = outage.voice_channels, [], True
+    bot = Bot([available, outage], path=path, storage="guilds")
+    await bot.prepare()
+    assert str(lobbies[0].id) in bot.configs and str(lobbies[1].id) not in bot.configs
+    assert os.path.exists(configs.path), "configs.json was renamed while a guild was unavailable"
+
+    outage.voice_channels, outage.unavailable = channels, False
+    await bot.on_guild_available(outage)
+    await bot.catching_up
+    assert bot.configs[str(lobbies[1].id)] == {"name": "@user"} and lobbies[1].id in bot.lobby_index
+    assert str(outage.id + 1) not in bot.configs and not os.path.exists(configs.path), "configs.json wasn't done"
+    await bot.close()
+
+
+def main():
+    context = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as directory:
+        asyncio.run(check_flush(directory))
+        asyncio.run(check_partition(directory))
+        generate(directory)
+        print(f"{GUILDS} guilds, {LOOKUPS} lookups over {ACTIVE} active ones")
+        print(f"{'storage':>8} {'startup':>10} {'RSS loaded':>11} {'RSS after':>10} {'µs/lookup':>10}")
+        results = context.Queue()
+        for storage in ("json", "guilds"):
+            process = context.Process(target=measure, args=(storage, directory, results))
+            process.start()
+            storage, startup, loaded, after, lookups = results.get()
+            process.join()
+            print(f"{storage:>8} {startup * 1000:>8.0f}ms {loaded / 1024 ** 2:>7.1f} MiB {after / 1024 ** 2:>6.1f} MiB "
+                  f"{lookups / LOOKUPS * 1e6:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Times /help autocompletion per keystroke, with the difflib scan it replaced and with the index.
+
+The bot's real commands are loaded, the queries are every prefix of every command name as it is
+typed, with and without a typo.
+
+Run from the repository root with ``python -m benchmarks.help``.
+"""
+import asyncio
+import difflib
+import tempfile
+import time
+
+from bot.ext import help
+
+from . import fakes
+from .prepare import Bot
+
+
+ROUNDS = 20
+
+
+def scan(bot, arg):
+    cmds = [help.get_command_info(cmd)[0] for cmd in help.get_commands(bot)]
+    results = difflib.get_close_matches(arg, cmds)
+    for cmd in cmds:
+        if arg in cmd and cmd not in results:
+            results.append(cmd)
+    return results
+
+
+def typo(name):
+    i = len(name) // 2
+    return name[:i] + name[i + 1:i + 2] + name[i] + name[i + 2:]  # two letters swapped
+
+
+async def main():
+    bot = Bot([fakes.Guild(fakes.Rest())], path=tempfile.mkdtemp())
+    names = [help.get_command_info(cmd)[0] for cmd in help.get_commands(bot)]
+    queries = [name[:end] for name in names + [typo(name) for name in names] for end in range(1, len(name) + 1)]
+
+    start = time.perf_counter()
+    index = help.get_index(bot)
+    built = time.perf_counter() - start
+    for name in names:
+        assert index.search.search(name)[0] == name
+        assert name in index.search.search(typo(name)), typo(name)
+
+    for label, func in (("difflib", lambda arg: scan(bot, arg)), ("index", lambda arg: help.get_index(bot).search.search(arg))):
+        start = time.perf_counter()
+        for _ in range(ROUNDS):
+            for query in queries:
+                func(query)
+        elapsed = (time.perf_counter() - start) / (ROUNDS * len(queries))
+        print(f"{label:>8}: {elapsed * 1e6:7.1f} µs per keystroke over {len(names)} commands")
+    print(f"index built in {built * 1000:.2f} ms, {len(index.pages)} help pages prerendered")
+
+    assert help.get_index(bot) is index
+    bot.remove_slash_command("dvc")  # module level commands outlive unloading their extension
+    bot.unload_extension("bot.ext.dvc")
+    bot.load_extension("bot.ext.dvc")
+    assert help.get_index(bot) is not index, "the index survived a reload"
+    await bot.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,156 @@
+"""Replays join/leave storms against the real bot, connected to the local stand-in server over HTTP and a websocket.
+
+Unlike ``benchmarks/replay.py`` nothing inside disnake is faked: the bot logs in, receives READY
+and GUILD_CREATE, prepares and then gets every voice state through the gateway. Its REST calls go
+through disnake's HTTP client and rate limit handling to ``benchmarks/server.py``, which answers
+with rate limit headers and 429s. The traces are replay's synthetic ones.
+
+Reports events per second, join-to-move latency percentiles as the server sees them, REST calls per
+join by route and 429s. The server runs in the same process and event loop as the bot, so its own
+work is part of the numbers.
+
+Run from the repository root with ``python -m benchmarks.load``.
+"""
+import argparse
+import asyncio
+import collections
+import random
+import tempfile
+import time
+
+from bot import client
+
+from . import replay
+from .server import LIMITS, Server
+
+
+MEMBERS = 30  # per guild, the traces use the first 25
+LATENCY = 0.02
+TIMEOUT = 120
+
+
+async def wait_for(condition, timeout=TIMEOUT):
+    deadline = time.perf_counter() + timeout
+    while not condition():
+        if time.perf_counter() > deadline:
+            raise TimeoutError("gave up waiting")
+        await asyncio.sleep(0.01)
+
+
+async def run(trace, directory, *, latency=LATENCY, limits=LIMITS, global_limit=50, speed=1.0, grace=0):
+    trace = sorted(trace)
+    server = Server(latency=latency, limits=limits, global_limit=global_limit)
+    guilds, lobbies = [], []
+    for _ in range(max(event[1] for event in trace) + 1):
+        guild = server.add_guild(members=MEMBERS)
+        category = server.add_channel(guild, "Dynamic Voice Channels", type=4)
+        lobbies.append(int(server.add_channel(guild, "join me", parent_id=category["id"])["id"]))
+        guilds.append(guild)
+    await server.start()
+    server.install()
+
+    bot = client.Bot(path=directory)
+    for lobby in lobbies:
+        bot.configs[str(lobby)] = {"grace": grace}
+    errors = collections.Counter()
+
+    async def on_error(event, *args, **kwargs):
+        errors[event] += 1  # disnake would log them, e.g. a member that left before the move landed
+
+    bot.on_error = on_error
+    runner = asyncio.create_task(bot.start("token"))
+    await wait_for(lambda: bot.prepared or runner.done())
+    if runner.done():
+        runner.result()
+
+    joined = {}
+    latencies = []
+    events = 0
+
+    def on_voice_state(guild, user_id, before, after):
+        nonlocal events
+        events += 1
+        if after is not None and after not in lobbies:
+            started = joined.pop((guild.id, user_id), None)
+            if started is not None:
+                latencies.append(time.perf_counter() - started)
+
+    server.on_voice_state = on_voice_state
+    users = [[user_id for user_id, m in guild.members.items() if not m["user"]["bot"]] for guild in guilds]
+    left = {}
+    joins = 0
+    calls = server.calls.copy()
+    limited = server.limited.copy()
+
+    start = time.perf_counter()
+    for t, index, member, action in trace:
+        delay = start + t / speed - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        guild, user_id = guilds[index], users[index][member]
+        if action == "rejoin" and user_id not in guild.voice:
+            channel_id = left.pop(user_id, None)
+            if channel_id in guild.channels:
+                await server.connect(guild, user_id, channel_id)
+                continue
+            action = "join"
+        if action == "join":
+            joins += 1
+            joined[guild.id, user_id] = time.perf_counter()
+            await server.connect(guild, user_id, lobbies[index])
+        elif action == "leave" and user_id in guild.voice:
+            joined.pop((guild.id, user_id), None)
+            left[user_id] = guild.voice[user_id]
+            await server.connect(guild, user_id, None)
+
+    # everyone left, done once the last of their channels is gone
+    await wait_for(lambda: all(len(guild.channels) == 2 for guild in guilds) and not bot.api.depth() and not bot.api.running)
+    elapsed = time.perf_counter() - start
+    await bot.close()
+    await runner
+    await server.close()
+
+    calls = server.calls - calls
+    stats = {
+        "events": events,
+        "events/s": events / elapsed,
+        "moved": len(latencies),
+        "p50 ms": replay.percentile(latencies, 50) * 1000,
+        "p90 ms": replay.percentile(latencies, 90) * 1000,
+        "p99 ms": replay.percentile(latencies, 99) * 1000,
+        "errors": sum(errors.values()),
+        "REST calls": sum(calls.values()),
+        "429s": sum((server.limited - limited).values()),
+    }
+    per_join = {route: count / max(joins, 1) for route, count in calls.items()}
+    return stats, per_join, server.unknown
+
+
+async def main(args):
+    print(f"{args.latency * 1000:.0f} ms per REST call, " + ("no route limits" if args.unlimited else "route limits as in benchmarks/server.py"))
+    scenarios = args.scenario or list(replay.SCENARIOS)
+    for name in scenarios:
+        trace = replay.SCENARIOS[name](random.Random(args.seed))
+        with tempfile.TemporaryDirectory() as directory:
+            stats, per_join, unknown = await run(
+                trace, directory, latency=args.latency, limits={} if args.unlimited else LIMITS,
+                global_limit=args.global_limit, speed=args.speed, grace=args.grace
+            )
+        print(f"{name}: " + ", ".join(f"{value:.1f} {key}" if isinstance(value, float) else f"{value} {key}"
+                                      for key, value in stats.items()))
+        for route, count in sorted(per_join.items(), key=lambda item: -item[1]):
+            print(f"    {count:5.2f} per join  {route}")
+        if unknown:
+            print("    not emulated: " + ", ".join(f"{route} ({count})" for route, count in unknown.items()))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenario", action="append", choices=list(replay.SCENARIOS), help="can be repeated, all by default")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--speed", type=float, default=1.0, help="how much faster than generated to replay")
+    parser.add_argument("--latency", type=float, default=LATENCY)
+    parser.add_argument("--unlimited", action="store_true", help="leave out the per-route rate limits")
+    parser.add_argument("--global-limit", type=int, default=50, help="requests per second, 0 for none")
+    parser.add_argument("--grace", type=float, default=0, help="seconds empty channels are kept for")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,141 @@
+"""Compares resident memory and time to ready of the default configuration and ``low_memory``.
+
+Gateway payloads for a few large guilds are fed through disnake's parsers. The default
+configuration gets the members in voice with each guild and the rest from chunking, as it would
+at startup. ``low_memory`` only gets the guilds. Afterwards both have to see the same members in
+the voice channels, ``prepare`` has to keep every occupied dynamic channel and a lobby's overwrite
+for a member who isn't in voice has to make it into the settings.
+
+Network time for chunking is left out, on a live bot it comes on top.
+
+Run from the repository root with ``python -m benchmarks.low_memory``.
+"""
+import asyncio
+import gc
+import multiprocessing
+import tempfile
+import time
+
+import psutil
+from disnake.state import ChunkRequest
+
+from bot import client
+
+
+GUILDS = 10
+MEMBERS = 20_000  # per guild
+CHANNELS = 50  # dynamic voice channels per guild
+IN_VOICE = 4  # members per channel
+CHUNK = 1000
+CONNECT = 1 << 20
+
+COLORS = {"primary_color": 0, "secondary_color": None, "tertiary_color": None}
+
+
+def member(user_id):
+    return {
+        "user": {"id": str(user_id), "username": f"user{user_id}", "discriminator": "0", "avatar": None, "global_name": None},
+        "roles": [], "joined_at": "2020-01-01T00:00:00+00:00", "deaf": False, "mute": False, "flags": 0,
+    }
+
+
+def voice_state(user_id, channel_id):
+    return {
+        "user_id": str(user_id), "channel_id": str(channel_id), "session_id": "session", "deaf": False, "mute": False,
+        "self_deaf": False, "self_mute": False, "self_video": False, "suppress": False, "request_to_speak_timestamp": None,
+    }
+
+
+def guild_create(guild_id):
+    first = guild_id + 1000
+    channels = [{"id": str(guild_id + 1), "type": 4, "name": "Dynamic Voice Channels", "position": 0, "permission_overwrites": []}]
+    channels.extend(
+        {"id": str(guild_id + 2 + i), "type": 2, "name": f"channel {i}", "position": i, "parent_id": str(guild_id + 1),
+         "bitrate": 64000, "user_limit": 0, "permission_overwrites": []}
+        for i in range(CHANNELS)
+    )
+    channels.append({
+        "id": str(guild_id + 2 + CHANNELS), "type": 2, "name": "join me", "position": CHANNELS, "parent_id": str(guild_id + 1),
+        "bitrate": 64000, "user_limit": 0,
+        "permission_overwrites": [{"id": str(first + MEMBERS - 1), "type": 1, "allow": "0", "deny": str(CONNECT)}],  # not in voice
+    })
+    voice_states = [voice_state(first + i, guild_id + 2 + i // IN_VOICE) for i in range(CHANNELS * IN_VOICE)]
+    return {
+        "id": str(guild_id), "name": f"guild {guild_id}", "large": True, "member_count": MEMBERS, "features": [],
+        "roles": [{"id": str(guild_id), "name": "@everyone", "permissions": "0", "position": 0, "color": 0, "colors": COLORS,
+                   "hoist": False, "managed": False, "mentionable": False}],
+        "channels": channels,
+        "members": [member(first + i) for i in range(CHANNELS * IN_VOICE)],  # only those in voice for large guilds
+        "voice_states": voice_states,
+    }
+
+
+def chunks(guild_id, nonce):
+    first = guild_id + 1000
+    for start in range(0, MEMBERS, CHUNK):
+        yield {
+            "guild_id": str(guild_id), "nonce": nonce, "chunk_index": start // CHUNK, "chunk_count": MEMBERS // CHUNK,
+            "members": [member(first + i) for i in range(start, min(start + CHUNK, MEMBERS))],
+        }
+
+
+def measure(low_memory, results):
+    async def main():
+        with tempfile.TemporaryDirectory() as directory:
+            # the chunks are fed below instead of being requested from a gateway that isn't there
+            bot = client.Bot(path=directory, low_memory=low_memory, chunk_guilds_at_startup=False)
+            state = bot._connection
+            process = psutil.Process()
+            gc.collect()
+            baseline = process.memory_info().rss
+
+            parse = 0.0
+            for i in range(GUILDS):
+                guild_id = (i + 1) << 32
+                payload = guild_create(guild_id)
+                start = time.perf_counter()
+                state.parsers["GUILD_CREATE"](payload)
+                parse += time.perf_counter() - start
+                if not low_memory:
+                    request = ChunkRequest(guild_id, asyncio.get_running_loop(), state._get_guild, cache=True)
+                    state._chunk_requests[request.nonce] = request
+                    for chunk in chunks(guild_id, request.nonce):
+                        start = time.perf_counter()
+                        state.parsers["GUILD_MEMBERS_CHUNK"](chunk)
+                        parse += time.perf_counter() - start
+                del payload
+            gc.collect()
+            rss = process.memory_info().rss - baseline
+
+            in_voice = sum(len(c.members) for guild in bot.guilds for c in guild.voice_channels)
+            assert in_voice == GUILDS * CHANNELS * IN_VOICE, f"{in_voice} members in voice channels"
+            for guild in bot.guilds:
+                *channels, lobby = guild.voice_channels
+                bot.channels.update(c.id for c in channels)
+                bot.configs[str(lobby.id)] = {}
+            stats = await bot.prepare()
+            assert stats["kept"] == GUILDS * CHANNELS, stats
+            for guild in bot.guilds:
+                lobby, outsider = guild.voice_channels[-1], guild.id + 1000 + MEMBERS - 1
+                overwrites = bot.get_settings(lobby).overwrites
+                assert [(target.id, overwrite.connect) for target, overwrite in overwrites.items()] == [(outsider, False)], overwrites
+            results.append((parse, rss, sum(len(guild._members) for guild in bot.guilds)))
+            await bot.close()
+
+    asyncio.run(main())
+
+
+def main():
+    with multiprocessing.Manager() as manager:
+        for low_memory in (False, True):
+            results = manager.list()
+            process = multiprocessing.Process(target=measure, args=(low_memory, results))
+            process.start()
+            process.join()
+            parse, rss, cached = results[0]
+            print(f"{'low_memory' if low_memory else 'default':>10}: {parse * 1000:7.1f} ms to ready, "
+                  f"{rss / 1024 ** 2:6.1f} MiB for {GUILDS} guilds of {MEMBERS} members, {cached} members cached")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""Imports JSON stores left by an earlier version into the sqlite backend and checks the result.
+
+The stores are written the way the JSON backend leaves them, a snapshot with a journal on top.
+Starting the bot with ``storage="sqlite"`` has to import every record, rename the JSON files and
+keep the records across a restart without importing them again. Imported rows get their guild
+filled in by ``prepare``, after which removing a guild has to purge its rows even if its lobbies
+were never indexed.
+
+Run from the repository root with ``python -m benchmarks.migration``.
+"""
+import asyncio
+import os
+import tempfile
+import time
+
+from bot.utils import data
+
+from . import fakes
+from .prepare import Bot
+
+
+GUILDS = 2_000
+CHANNELS = 2  # occupied dynamic channels per guild
+
+
+def build(rest):
+    guilds = []
+    for _ in range(GUILDS):
+        guild = fakes.Guild(rest)
+        category = guild.add_category("Dynamic Voice Channels")
+        guild.add_voice_channel("join me", category=category)
+        for i in range(CHANNELS):
+            guild.add_member(guild.add_voice_channel(f"occupied {i}", category=category))
+        guilds.append(guild)
+    return guilds
+
+
+async def write_legacy(directory, guilds):
+    """Writes the JSON stores, half of every store only lives in its journal"""
+    expected = {}
+    for name, cls in (("configs", data.JournalDict), ("channels", data.JournalSet), ("blacklists", data.JournalDict), ("limits", data.JournalDict)):
+        store = cls(os.path.join(directory, f"{name}.json"))
+        for i, guild in enumerate(guilds):
+            lobby, *channels = guild.voice_channels
+            if name == "configs":
+                store[str(lobby.id)] = {"name": f"@user's room {i}"}
+            elif name == "channels":
+                store.update(c.id for c in channels)
+            elif name == "blacklists":
+                store[str(guild.id)] = [f"word{i}"]
+            else:
+                store[str(guild.id)] = {"rate": 3, "per": 15.0}
+            if i == len(guilds) // 2:
+                await store.flush()
+                await store.compact()
+        await store.close()
+        expected[name] = dict(store) if isinstance(store, dict) else set(store)
+    return expected
+
+
+def unresolved(bot):
+    tables = ("configs", "channels", "blacklists", "limits")
+    query = " UNION ALL ".join(f"SELECT id FROM {name} WHERE guild_id IS NULL" for name in tables)
+    return bot.database.call(lambda: bot.database.connection.execute(query).fetchall())
+
+
+def contents(bot):
+    return {
+        "configs": dict(bot.configs),
+        "channels": set(bot.channels),
+        "blacklists": dict(bot.blacklists),
+        "limits": dict(bot.limits),
+    }
+
+
+async def main():
+    guilds = build(fakes.Rest())
+    with tempfile.TemporaryDirectory() as directory:
+        expected = await write_legacy(directory, guilds)
+
+        start = time.perf_counter()
+        bot = Bot(guilds, path=directory, storage="sqlite")
+        elapsed = time.perf_counter() - start
+        imported = sum(map(len, expected.values()))
+        assert contents(bot) == expected, "records were lost in the import"
+        for name in expected:
+            path = os.path.join(directory, f"{name}.json")
+            assert not os.path.exists(path) and os.path.exists(path + ".migrated"), f"{name}.json wasn't renamed"
+        assert unresolved(bot), "the import already knew the guilds"
+        stats = await bot.prepare()
+        assert not unresolved(bot), "imported rows are still missing their guild"
+        assert stats["backfilled"] == GUILDS * (1 + CHANNELS), stats
+
+        removed = guilds.pop()
+        lobby, *channels = removed.voice_channels
+        bot.lobby_index.pop(removed.id)  # as if the guild was unavailable during prepare
+        await bot.on_guild_remove(removed)
+        await bot.close()
+        del expected["configs"][str(lobby.id)]
+        expected["channels"].difference_update(c.id for c in channels)
+        del expected["blacklists"][str(removed.id)]
+        del expected["limits"][str(removed.id)]
+
+        bot = Bot(guilds, path=directory, storage="sqlite")
+        assert contents(bot) == expected, "records were lost after the import"
+        await bot.close()
+    print(f"imported {imported} records of {GUILDS} guilds in {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,96 @@
+"""Times removing guilds from the bot and checks that orphan collection finds what went away unnoticed.
+
+Some guilds are removed with ``on_guild_remove``, others just vanish from the cache, and some lobbies
+and dynamic channels are deleted without an event, like they would be while the bot is offline.
+One run of :meth:`Bot.collect_orphans` has to purge exactly those while another guild is in an
+outage, keep that guild's records and the config of a lobby that was never indexed because its
+guild was unavailable during prepare.
+
+Run from the repository root with ``python -m benchmarks.orphans``.
+"""
+import asyncio
+import tempfile
+import time
+
+from . import fakes
+from .prepare import Bot
+
+
+GUILDS = 5_000
+CHANNELS = 2  # occupied dynamic channels per guild
+REMOVED = 500  # of each kind
+
+
+def build(rest):
+    guilds = []
+    for _ in range(GUILDS):
+        guild = fakes.Guild(rest)
+        category = guild.add_category("Dynamic Voice Channels")
+        guild.add_voice_channel("join me", category=category)
+        for i in range(CHANNELS):
+            guild.add_member(guild.add_voice_channel(f"occupied {i}", category=category))
+        guilds.append(guild)
+    return guilds
+
+
+def vanish(guild, channel):
+    guild.voice_channels.remove(channel)
+    del guild.channels[channel.id]
+
+
+async def run(directory, storage):
+    guilds = build(fakes.Rest())
+    bot = Bot(guilds, path=directory, storage=storage)
+    for guild in guilds:
+        lobby, *channels = guild.voice_channels
+        if storage == "guilds":
+            bot.lobbies[str(lobby.id)] = guild.id  # the fakes aren't in the connection's cache
+        bot.configs[str(lobby.id)] = {"name": "@user's room"}
+        bot.blacklists[str(guild.id)] = ["word"]
+        bot.channels.update(c.id for c in channels)
+    await bot.prepare()
+
+    removed, gone = guilds[:REMOVED], guilds[REMOVED:2 * REMOVED]
+    live = guilds[2 * REMOVED:]
+    bot.fake_guilds = live
+    start = time.perf_counter()
+    for guild in removed:
+        bot.forget_guild(guild.id)  # on_guild_remove without waiting for the coalesced save
+    elapsed = time.perf_counter() - start
+    await asyncio.gather(*(bot.on_guild_remove(guild) for guild in removed))  # nothing left but the save
+
+    late = live[REMOVED]  # unavailable during prepare, so its lobby was never indexed
+    bot.lobby_index.discard(late.voice_channels[0].id)
+    for guild in live[:REMOVED]:
+        vanish(guild, guild.voice_channels[0])  # the lobby
+    for guild in live[-REMOVED:]:
+        vanish(guild, guild.voice_channels[-1])
+    outage = live[REMOVED + 1]  # its channels aren't cached while it is unavailable
+    cached = outage.voice_channels, outage.channels
+    outage.voice_channels, outage.channels, outage.unavailable = [], {}, True
+    stats = await bot.collect_orphans(batch=100)
+    assert stats == {"guilds": len(gone), "lobbies": REMOVED, "channels": REMOVED}, stats
+    assert await bot.collect_orphans() == {}, "orphans were left behind"
+    (outage.voice_channels, outage.channels), outage.unavailable = cached, False
+    await bot.on_guild_available(late)
+    assert late.voice_channels[0].id in bot.lobby_index, "the late guild's lobby wasn't indexed"
+
+    lobbies = {str(g.voice_channels[0].id) for g in live[REMOVED:]}
+    assert set(bot.configs) == lobbies, "configs differ"
+    assert len(bot.channels) == len(live) * CHANNELS - REMOVED, "tracked channels differ"
+    assert len(bot.lobby_index) == len(lobbies)
+    for guild in removed + gone:
+        assert str(guild.id) not in bot.blacklists
+    await bot.close()
+    return elapsed / len(removed)
+
+
+async def main():
+    for storage in ("json", "sqlite", "guilds"):
+        with tempfile.TemporaryDirectory() as directory:
+            seconds = await run(directory, storage)
+        print(f"{storage:>7}: {seconds * 1e6:7.1f} µs to forget a guild with {GUILDS} guilds, orphans collected")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,51 @@
+"""Compares join-to-move latency with and without a warm pool.
+
+Run from the repository root with ``python -m benchmarks.pool``.
+"""
+import asyncio
+import statistics
+import tempfile
+import time
+
+from . import fakes
+from .prepare import Bot
+
+
+JOINS = 20
+POOL = 3
+LATENCY = 0.05
+INTERVAL = 0.2  # between joins, gives the pool time to refill
+
+
+async def run(pool):
+    rest = fakes.Rest(LATENCY)
+    guild = fakes.Guild(rest)
+    lobby = guild.add_voice_channel("join me", category=guild.add_category("Dynamic Voice Channels"))
+    with tempfile.TemporaryDirectory() as directory:
+        bot = Bot([guild], path=directory)
+        bot.configs[str(lobby.id)] = {"pool": pool}
+        await bot.refill(lobby)
+
+        latencies = []
+        for _ in range(JOINS):
+            member = guild.add_member(lobby)
+            start = time.perf_counter()
+            channel = await bot.serve(member, lobby)
+            latencies.append(time.perf_counter() - start)
+            assert member.voice_channel is channel and channel.id in bot.channels
+            await asyncio.sleep(INTERVAL)
+
+        assert bot.pool.size(lobby.id) == pool
+        await bot.close()
+    return latencies
+
+
+async def main():
+    for name, pool in (("cold", 0), ("warm", POOL)):
+        latencies = await run(pool)
+        print(f"{name}: join-to-move median {statistics.median(latencies) * 1000:.1f} ms, "
+              f"max {max(latencies) * 1000:.1f} ms ({LATENCY * 1000:.0f} ms per API call)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
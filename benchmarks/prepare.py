@@ -0,0 +1,89 @@
+"""Checks Bot.prepare against fake guilds and times it with simulated API latency.
+
+Run from the repository root with ``python -m benchmarks.prepare``.
+"""
+import asyncio
+import tempfile
+import time
+
+from bot import client
+from bot.utils import data
+
+from . import fakes
+
+
+GUILDS = 40
+STALE = 10  # per guild
+OCCUPIED = 5
+WAITING = 5
+LATENCY = 0.05
+
+
+class Bot(client.Bot):
+    def __init__(self, guilds, **kwargs):
+        self.fake_guilds = guilds
+        super().__init__(**kwargs)
+
+    @property
+    def guilds(self):
+        return self.fake_guilds
+
+    def get_guild(self, guild_id):
+        return next((guild for guild in self.fake_guilds if guild.id == guild_id), None)
+
+
+def build(rest):
+    guilds = []
+    for _ in range(GUILDS):
+        guild = fakes.Guild(rest)
+        category = guild.add_category("Dynamic Voice Channels")
+        lobby = guild.add_voice_channel("join me", category=category)
+        for _ in range(WAITING):
+            guild.add_member(lobby)
+        for i in range(STALE):
+            guild.add_voice_channel(f"stale {i}", category=category)
+        for i in range(OCCUPIED):
+            guild.add_member(guild.add_voice_channel(f"occupied {i}", category=category))
+        guilds.append(guild)
+    return guilds
+
+
+async def run(directory, **limits):
+    rest = fakes.Rest(LATENCY)
+    guilds = build(rest)
+    bot = Bot(guilds, path=directory)
+    lobbies, stale, occupied, waiting = set(), set(), set(), []
+    for guild in guilds:
+        lobby, *channels = guild.voice_channels
+        lobbies.add(lobby.id)
+        bot.configs[str(lobby.id)] = {}
+        waiting.extend(lobby.members)
+        for channel in channels:
+            (occupied if channel.members else stale).add(channel.id)
+    bot.channels.update(stale | occupied)
+
+    start = time.perf_counter()
+    await bot.prepare(**limits)
+    elapsed = time.perf_counter() - start
+
+    remaining = {c.id for g in guilds for c in g.voice_channels}
+    assert not stale & remaining, "stale channels survived"
+    assert occupied <= bot.channels, "occupied channels were dropped"
+    assert all(m.voice_channel.id in bot.channels for m in waiting), "waiting members were not served"
+    assert len(bot.channels) == len(occupied) + len(waiting)
+    assert rest.calls == {"delete": len(stale), "create": len(waiting), "move": len(waiting)}, rest.calls
+
+    await bot.close()
+    assert data.JournalSet(bot.channels.path) == bot.channels, "saved channels differ"
+    return elapsed
+
+
+async def main():
+    for name, limits in (("serial", dict(concurrency=1, per_guild=1)), ("concurrent", {})):
+        with tempfile.TemporaryDirectory() as directory:
+            elapsed = await run(directory, **limits)
+        print(f"{name:>10}: {elapsed:.2f}s for {GUILDS} guilds at {LATENCY * 1000:.0f} ms per API call")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
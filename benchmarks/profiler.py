@@ -0,0 +1,62 @@
+"""Measures what a running profile costs the event loop and checks that it finds a blocking handler.
+
+The workload is autocompletion searches and channel name renders, yielding to the loop after each
+one like event handlers do. It runs without a profile, with a sampling profile and with
+allocations traced too. A handler that sleeps without awaiting has to show up as blocking.
+
+Run from the repository root with ``python -m benchmarks.profiler``.
+"""
+import asyncio
+import time
+
+from bot.utils.profiler import Profiler
+from bot.utils.search import Index
+from bot.utils.template import Template
+
+
+SECONDS = 2.0
+BLOCK = 0.3
+
+
+async def workload(seconds):
+    index = Index(f"{verb} {noun}" for verb in ("add", "remove", "list", "set", "clear") for noun in ("lobby", "limit", "name", "bitrate"))
+    template = Template("@user's channel #@position")
+    done = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        index.search("lim")
+        index.search("bitrte")
+        template.render("member", done)
+        done += 1
+        await asyncio.sleep(0)
+    return done / seconds
+
+
+def blocking_handler():
+    time.sleep(BLOCK)
+
+
+async def main():
+    loop = asyncio.get_running_loop()
+    profiler = Profiler(loop=loop)
+    baseline = await workload(SECONDS)
+    print(f"{'no profile':>20}: {baseline:9.0f} iterations/s")
+    for label, memory in (("sampling", False), ("sampling + tracemalloc", True)):
+        task = loop.create_task(profiler.run(SECONDS, memory=memory))
+        rate = await workload(SECONDS)
+        profile = await task
+        print(f"{label:>20}: {rate:9.0f} iterations/s ({rate / baseline - 1:+.1%}), {profile.samples} samples")
+
+    task = loop.create_task(profiler.run(1.0, memory=False))
+    await asyncio.sleep(0.2)
+    loop.call_soon(blocking_handler)
+    profile = await task
+    assert profile.blocks, "the blocking handler wasn't noticed"
+    seconds, frames = profile.blocks[0]
+    assert any("blocking_handler" in line for line in frames), frames
+    print(f"blocked for {seconds * 1000:.0f} ms (slept {BLOCK * 1000:.0f} ms)")
+    print(profile.format(limit=5))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
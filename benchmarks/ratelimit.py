@@ -0,0 +1,45 @@
+"""Feeds millions of simulated joins through the rate limiter and checks that its memory stays bounded.
+
+Run from the repository root with ``python -m benchmarks.ratelimit``.
+"""
+import random
+import time
+import tracemalloc
+
+from bot.utils.ratelimit import RateLimiter
+
+
+JOINS = 2_000_000
+PER_SECOND = 2_000  # simulated joins per second
+MEMBERS = 10_000_000  # most members only ever join once
+
+
+def main():
+    now = 0.0
+    limiter = RateLimiter(clock=lambda: now)
+    rng = random.Random(0)
+    regulars = [rng.randrange(MEMBERS) for _ in range(1_000)]  # these join over and over
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    peak_buckets = 0
+    for i in range(JOINS):
+        now = i / PER_SECOND
+        member = rng.choice(regulars) if i % 4 == 0 else rng.randrange(MEMBERS)
+        limiter.hit(member)
+        peak_buckets = max(peak_buckets, len(limiter))
+        if i % 500_000 == 0:
+            print(f"{i:>9} joins: {len(limiter):>6} buckets, {tracemalloc.get_traced_memory()[0] / 1024 ** 2:6.2f} MiB")
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    # nobody is kept longer than the window, so this is bounded by joins per window
+    bound = PER_SECOND * limiter.per
+    assert peak_buckets <= bound, peak_buckets
+    print(f"{JOINS} joins in {elapsed:.1f}s: at most {peak_buckets} buckets (bound {bound:.0f}), "
+          f"peak {peak / 1024 ** 2:.2f} MiB, {limiter.rejected} rejected")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+"""Replays voice state traces through the bot against fake guilds and a simulated REST layer.
+
+A trace is a list of ``[seconds, guild, member, "join" | "leave" | "rejoin"]`` events, guilds and
+members are indices, ``rejoin`` reconnects a member to the channel they left or, if it is gone, to the lobby. The synthetic ones are
+a join storm, steady churn, a mass leave after an event and flaky connections, all generated from a
+fixed seed. Every event is dispatched as its own task like disnake does, moves made
+by the bot are reported back as voice state updates too.
+
+Reports events per second, join-to-move latency, disk writes, API calls, 429s and peak memory.
+
+Run from the repository root with ``python -m benchmarks.replay``. ``--trace file.jsonl`` replays a
+recorded trace with one event per line instead, ``--dump directory`` writes out the synthetic ones.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+from bot.utils import data, metrics
+
+from . import fakes
+from .prepare import Bot
+
+
+GUILDS = 20
+LATENCY = 0.02
+RATE_LIMIT = 0.02  # share of requests answered with a 429
+RETRY_AFTER = 0.2
+
+
+def storm(rng):
+    """Everyone joins within a second, e.g. when an event starts, and leaves a few seconds later"""
+    trace = []
+    for guild in range(GUILDS):
+        for member in range(25):
+            joined = rng.uniform(0, 1)
+            trace.append([joined, guild, member, "join"])
+            trace.append([joined + rng.uniform(2, 3), guild, member, "leave"])
+    return trace
+
+
+def churn(rng):
+    """Members keep coming and going, some of them rejoin quickly enough to hit the rate limit"""
+    trace = []
+    for guild in range(GUILDS):
+        for member in range(10):
+            t = rng.uniform(0, 1)
+            while t < 4:
+                trace.append([t, guild, member, "join"])
+                t += rng.expovariate(1)
+                trace.append([t, guild, member, "leave"])
+                t += rng.expovariate(2)
+    return trace
+
+
+def mass_leave(rng):
+    """Members trickle in and all leave within a fraction of a second"""
+    trace = []
+    for guild in range(GUILDS):
+        for member in range(15):
+            trace.append([rng.uniform(0, 2), guild, member, "join"])
+            trace.append([rng.uniform(2.5, 2.7), guild, member, "leave"])
+    return trace
+
+
+def flaky(rng):
+    """Members drop out of their channel and reconnect a moment later, a grace period saves their channel"""
+    trace = []
+    for guild in range(GUILDS):
+        for member in range(10):
+            t = rng.uniform(0, 1)
+            trace.append([t, guild, member, "join"])
+            for _ in range(3):
+                t += rng.uniform(0.5, 1)
+                trace.append([t, guild, member, "leave"])
+                t += rng.uniform(0.1, 0.5)
+                trace.append([t, guild, member, "rejoin"])
+            trace.append([t + rng.uniform(0.5, 1), guild, member, "leave"])
+    return trace
+
+
+SCENARIOS = {"storm": storm, "churn": churn, "mass_leave": mass_leave, "flaky": flaky}
+
+
+def percentile(values, percent):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+
+async def replay(trace, directory, *, latency=LATENCY, rate_limit=RATE_LIMIT, speed=1.0, grace=0):
+    trace = sorted(trace)
+    rest = fakes.Rest(latency, rate_limit=rate_limit, retry_after=RETRY_AFTER)
+    guilds, lobbies = [], []
+    for _ in range(max(event[1] for event in trace) + 1):
+        guild = fakes.Guild(rest)
+        lobbies.append(guild.add_voice_channel("join me", category=guild.add_category("Dynamic Voice Channels")))
+        guilds.append(guild)
+    lobby_of = dict(zip(guilds, lobbies))
+    members = {}
+    left = {}
+
+    bot = Bot(guilds, path=directory)
+    bot.sweeper.interval = 0.05
+    for lobby in lobbies:
+        bot.configs[str(lobby.id)] = {"grace": grace}
+    await bot.configs.flush()
+    saves = sum(store.performed for store in bot.stores)
+    written = sum(data.WRITTEN_BYTES.values.values())
+
+    loop = asyncio.get_running_loop()
+    tasks = set()
+    joined = {}
+    latencies = []
+    handled = 0
+    errors = 0
+
+    def done(task):
+        nonlocal errors
+        tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            errors += 1  # disnake would log it, e.g. a member that left before the move landed
+
+    def dispatch(coroutine):
+        task = loop.create_task(coroutine)
+        tasks.add(task)
+        task.add_done_callback(done)
+
+    def on_voice_state(member, before, after):
+        nonlocal handled
+        handled += 1
+        if after.channel is not None and after.channel is not lobby_of[member.guild]:
+            started = joined.pop(member, None)
+            if started is not None:
+                latencies.append(time.perf_counter() - started)
+        dispatch(bot.on_voice_state_update(member, before, after))
+
+    for guild in guilds:
+        guild.on_voice_state = on_voice_state
+        guild.on_delete = lambda channel: dispatch(bot.on_guild_channel_delete(channel))
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    for t, guild, member, action in trace:
+        delay = start + t / speed - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        key = guild, member
+        if key not in members:
+            members[key] = guilds[guild].add_member()
+        member = members[key]
+        if action == "rejoin" and member.voice_channel is None:
+            channel = left.pop(member, None)
+            if channel is not None and channel.id in guilds[guild].channels:
+                member.connect(channel)
+                continue
+            action = "join"
+        if action == "join":
+            joined[member] = time.perf_counter()
+            member.connect(lobbies[guild])
+        elif action == "leave" and member.voice_channel is not None:
+            joined.pop(member, None)
+            left[member] = member.voice_channel
+            member.connect(None)
+
+    while tasks or bot.api.depth() or bot.api.running:
+        await asyncio.sleep(0.01)
+    elapsed = time.perf_counter() - start
+    while tasks or bot.api.depth() or bot.api.running or len(bot.sweeper):
+        await asyncio.sleep(0.01)  # empty channels waiting for their grace period
+    for store in bot.stores:
+        await store.flush()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    # everyone left, so nothing may be left behind
+    leftover = [c for guild in guilds for c in guild.voice_channels if c not in lobbies]
+    assert not leftover, f"{len(leftover)} channels were not deleted"
+    assert not bot.channels, f"{len(bot.channels)} channels are still tracked"
+    await bot.close()
+
+    return {
+        "events": handled,
+        "events/s": handled / elapsed,
+        "moved": len(latencies),
+        "errors": errors,
+        "p50 ms": percentile(latencies, 50) * 1000,
+        "p99 ms": percentile(latencies, 99) * 1000,
+        "saves": sum(store.performed for store in bot.stores) - saves,
+        "KiB written": (sum(data.WRITTEN_BYTES.values.values()) - written) / 1024,
+        "created": rest.calls["create"],
+        "API calls": sum(rest.calls.values()),
+        "429s": sum(rest.limited.values()),
+        "peak MiB": peak / 1024 ** 2,
+    }
+
+
+async def main(args):
+    metrics.enable()  # for the bytes written
+    if args.trace:
+        with open(args.trace) as file:
+            traces = {os.path.basename(args.trace): [json.loads(line) for line in file if line.strip()]}
+    else:
+        traces = {name: generate(random.Random(args.seed)) for name, generate in SCENARIOS.items()}
+
+    if args.dump:
+        os.makedirs(args.dump, exist_ok=True)
+        for name, trace in traces.items():
+            with open(os.path.join(args.dump, f"{name}.jsonl"), "w") as file:
+                file.writelines(json.dumps(event) + "\n" for event in sorted(trace))
+
+    print(f"{args.latency * 1000:.0f} ms per API call, {args.rate_limit:.0%} answered with a 429 first")
+    for name, trace in traces.items():
+        with tempfile.TemporaryDirectory() as directory:
+            stats = await replay(trace, directory, latency=args.latency, rate_limit=args.rate_limit, speed=args.speed, grace=args.grace)
+        print(f"{name}: " + ", ".join(f"{value:.1f} {key}" if isinstance(value, float) else f"{value} {key}"
+                                      for key, value in stats.items()))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--trace", help="a recorded trace, one JSON event per line")
+    parser.add_argument("--dump", help="directory to write the traces to")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--speed", type=float, default=1.0, help="how much faster than recorded to replay")
+    parser.add_argument("--latency", type=float, default=LATENCY)
+    parser.add_argument("--rate-limit", type=float, default=RATE_LIMIT)
+    parser.add_argument("--grace", type=float, default=0, help="seconds empty channels are kept for")
+    asyncio.run(main(parser.parse_args()))
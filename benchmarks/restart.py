@@ -0,0 +1,94 @@
+"""Times a restart until the first member joining a lobby is moved, with and without a checkpoint.
+
+The first bot prepares and shuts down gracefully, which leaves a checkpoint behind. The second one
+starts on the same data directory, once with the checkpoint and once with it removed.
+
+Fake guilds return their voice channels from a plain list, disnake sorts them on every access,
+so the full scan costs more on a live bot.
+
+Run from the repository root with ``python -m benchmarks.restart``.
+"""
+import asyncio
+import gc
+import os
+import tempfile
+import time
+
+from bot.utils import data, metrics
+
+from . import fakes
+from .prepare import Bot
+
+
+GUILDS = 2_000
+VOICE_CHANNELS = 30  # per guild, not ours
+OCCUPIED = 3  # dynamic channels per guild
+LATENCY = 0.02
+ROUNDS = 3
+
+
+def build(rest):
+    guilds = []
+    for _ in range(GUILDS):
+        guild = fakes.Guild(rest)
+        for i in range(VOICE_CHANNELS):
+            guild.add_voice_channel(f"voice {i}")
+        category = guild.add_category("Dynamic Voice Channels")
+        guild.add_voice_channel("join me", category=category)
+        for i in range(OCCUPIED):
+            guild.add_member(guild.add_voice_channel(f"occupied {i}", category=category))
+        guilds.append(guild)
+    return guilds
+
+
+async def restart(guilds, directory):
+    loop = asyncio.get_running_loop()
+    written = sum(data.WRITTEN_BYTES.values.values())
+    gc.collect()  # the fakes are a big heap, a full collection would land on whichever run is unlucky
+    start = time.perf_counter()
+    bot = Bot(guilds, path=directory)
+    stats = await bot.prepare()
+    prepared = time.perf_counter() - start
+
+    guild = guilds[len(guilds) // 2]
+    lobby = guild.voice_channels[VOICE_CHANNELS]
+    guild.on_voice_state = lambda m, before, after: loop.create_task(bot.on_voice_state_update(m, before, after))
+    member = guild.add_member()
+    member.connect(lobby)
+    while member.voice_channel is lobby:
+        await asyncio.sleep(0.001)
+    served = time.perf_counter() - start
+    guild.on_voice_state = None
+
+    # back to how it was, so the next restart starts from the same state
+    channel = member.voice_channel
+    member.connect(None)
+    guild.remove_channel(channel)
+    await bot.on_guild_channel_delete(channel)
+    await bot.close()
+    return prepared, served, stats, sum(data.WRITTEN_BYTES.values.values()) - written
+
+
+async def main():
+    metrics.enable()
+    guilds = build(fakes.Rest(LATENCY))
+    with tempfile.TemporaryDirectory() as directory:
+        bot = Bot(guilds, path=directory)
+        for guild in guilds:
+            lobby, *channels = guild.voice_channels[VOICE_CHANNELS:]
+            bot.configs[str(lobby.id)] = {}
+            bot.channels.update(c.id for c in channels)
+        await bot.prepare()
+        await bot.close()
+
+        for label in ("checkpoint", "full scan") * ROUNDS:
+            if label == "full scan":
+                os.remove(os.path.join(directory, "checkpoint.json"))
+            prepared, served, stats, written = await restart(guilds, directory)
+            assert stats["kept"] == GUILDS * OCCUPIED, stats
+            print(f"{label:>10}: started after {prepared * 1000:6.1f} ms ({stats['seconds'] * 1000:.0f} ms in prepare), "
+                  f"first join moved after {served * 1000:6.1f} ms, {written / 1024:.1f} KiB written")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
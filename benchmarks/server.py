@@ -0,0 +1,497 @@
+"""A local stand-in for the parts of Discord's REST API and gateway the bot uses.
+
+It keeps guilds, channels, members and voice states as plain payloads, answers the REST calls the
+bot makes (channel create, edit and delete, member moves, DMs) and sends the matching gateway
+events, so a real :class:`bot.client.Bot` can run against it over HTTP and a websocket.
+
+Every REST route has its own rate limit bucket per major parameter like Discord's, with the same
+headers, and a global limit on top. Requests over a limit are answered with a 429. The limits
+in ``LIMITS`` are ballpark figures, Discord doesn't publish its own and changes them.
+
+Nothing runs by itself: :meth:`Server.connect` puts members into voice channels the way a client
+would, see ``benchmarks/load.py``.
+"""
+import asyncio
+import collections
+import itertools
+import json
+import time
+import uuid
+
+import disnake as discord
+from aiohttp import web
+
+from bot.cluster import shard_of
+
+
+# requests per bucket and seconds until it resets, routes that aren't listed only count towards the global limit
+LIMITS = {
+    "POST /guilds/{guild_id}/channels": (10, 10.0),
+    "PATCH /guilds/{guild_id}/channels": (5, 5.0),
+    "PATCH /guilds/{guild_id}/members/{user_id}": (10, 10.0),
+    "PATCH /channels/{channel_id}": (5, 5.0),
+    "DELETE /channels/{channel_id}": (5, 5.0),
+    "POST /users/@me/channels": (5, 5.0),
+    "POST /channels/{channel_id}/messages": (5, 5.0),
+}
+GLOBAL_LIMIT = 50  # per second
+MAJOR = ("guild_id", "channel_id")
+
+LARGE = 250  # guilds with more members only send those in voice with GUILD_CREATE
+CHUNK = 1000
+HEARTBEAT = 41250
+
+# gateway opcodes
+DISPATCH = 0
+HEARTBEAT_OP = 1
+IDENTIFY = 2
+RESUME = 6
+RECONNECT = 7
+REQUEST_MEMBERS = 8
+INVALID_SESSION = 9
+HELLO = 10
+HEARTBEAT_ACK = 11
+
+ADMINISTRATOR = str(discord.Permissions(administrator=True).value)
+
+
+class Bucket:
+    __slots__ = ("limit", "per", "remaining", "reset")
+
+    def __init__(self, limit, per):
+        self.limit = limit
+        self.per = per
+        self.remaining = limit
+        self.reset = 0.0
+
+    def hit(self, now):
+        """Takes a request and returns 0, or the seconds until the bucket resets if it is empty"""
+        if now >= self.reset:
+            self.remaining = self.limit
+            self.reset = now + self.per
+        if self.remaining == 0:
+            return self.reset - now
+        self.remaining -= 1
+        return 0
+
+
+class Guild:
+    __slots__ = ("id", "name", "roles", "channels", "members", "voice", "unavailable")
+
+    def __init__(self, guild_id, name):
+        self.id = guild_id
+        self.name = name
+        self.roles = [role(guild_id, "@everyone", "0")]
+        self.channels = {}
+        self.members = {}
+        self.voice = {}  # user id -> channel id
+        self.unavailable = False  # in an outage, sessions only get it once it recovers
+
+    def payload(self):
+        large = len(self.members) > LARGE
+        members = [m for user_id, m in self.members.items() if not large or user_id in self.voice or m["user"].get("bot")]
+        return {
+            "id": str(self.id), "name": self.name, "owner_id": str(self.id), "large": large,
+            "member_count": len(self.members), "features": [], "emojis": [], "stickers": [], "threads": [],
+            "presences": [], "stage_instances": [], "guild_scheduled_events": [], "unavailable": False,
+            "roles": self.roles,
+            "channels": list(self.channels.values()),
+            "members": members,
+            "voice_states": [voice_state(self.id, user_id, channel_id) for user_id, channel_id in self.voice.items()],
+        }
+
+
+class Session:
+    """One gateway connection, it receives the events of the guilds on its shard"""
+
+    __slots__ = ("ws", "shard", "sequence", "id")
+
+    def __init__(self, ws):
+        self.ws = ws
+        self.shard = (0, 1)
+        self.sequence = 0
+        self.id = uuid.uuid4().hex
+
+    async def send(self, op, d, t=None):
+        payload = {"op": op, "d": d, "s": None, "t": t}
+        if op == DISPATCH:
+            self.sequence += 1
+            payload["s"] = self.sequence
+        await self.ws.send_str(json.dumps(payload))
+
+
+def role(role_id, name, permissions):
+    return {
+        "id": str(role_id), "name": name, "permissions": permissions, "position": 0 if name == "@everyone" else 1,
+        "color": 0, "colors": {"primary_color": 0, "secondary_color": None, "tertiary_color": None},
+        "hoist": False, "managed": False, "mentionable": False, "flags": 0,
+    }
+
+
+def user(user_id, name, *, bot=False):
+    return {"id": str(user_id), "username": name, "discriminator": "0", "avatar": None, "global_name": None, "bot": bot}
+
+
+def voice_state(guild_id, user_id, channel_id, member=None):
+    state = {
+        "guild_id": str(guild_id), "channel_id": None if channel_id is None else str(channel_id), "user_id": str(user_id),
+        "session_id": "session", "deaf": False, "mute": False, "self_deaf": False, "self_mute": False,
+        "self_video": False, "suppress": False, "request_to_speak_timestamp": None,
+    }
+    if member is not None:
+        state["member"] = member
+    return state
+
+
+def respond(data, *, status=200, headers=None):
+    # disnake only decodes bodies that are exactly "application/json", aiohttp's json_response adds a charset
+    return web.Response(body=json.dumps(data).encode(), status=status, headers={"Content-Type": "application/json", **(headers or {})})
+
+
+def error(status, code, message):
+    return respond({"code": code, "message": message}, status=status)
+
+
+class Server:
+    """Serves the REST API under ``/api/v10`` and the gateway under ``/gateway``.
+
+    ``calls`` and ``limited`` count requests and 429s per route, e.g.
+    ``"POST /guilds/{guild_id}/channels"``, ``unknown`` the requests to routes that aren't emulated.
+    ``on_voice_state(guild, user_id, before, after)`` is called for every voice state change.
+    """
+
+    def __init__(self, *, latency=0.0, limits=LIMITS, global_limit=GLOBAL_LIMIT, host="127.0.0.1", port=0):
+        self.latency = latency
+        self.limits = limits
+        self.global_limit = global_limit
+        self.host = host
+        self.port = port
+        self.url = None
+
+        self.ids = itertools.count((int(time.time() * 1000) - discord.utils.DISCORD_EPOCH) << 22)
+        self.user = user(next(self.ids), "Dynamic Voice Channels", bot=True)
+        self.application_id = self.user["id"]
+        self.guilds = {}
+        self.channels = {}  # channel id -> guild, or None for DMs
+        self.commands = []
+        self.sessions = set()
+        self.buckets = {}
+        self.global_bucket = Bucket(global_limit, 1.0) if global_limit else None
+        self.on_voice_state = None
+
+        self.calls = collections.Counter()
+        self.limited = collections.Counter()
+        self.unknown = collections.Counter()
+
+        self.app = web.Application(middlewares=[self.middleware])
+        self.app.add_routes([
+            web.get("/gateway", self.gateway),
+            web.get("/api/v{version}/gateway", self.get_gateway),
+            web.get("/api/v{version}/gateway/bot", self.get_gateway),
+            web.get("/api/v{version}/users/@me", self.get_me),
+            web.get("/api/v{version}/oauth2/applications/@me", self.get_application),
+            web.get("/api/v{version}/applications/{application_id}/commands", self.get_commands),
+            web.put("/api/v{version}/applications/{application_id}/commands", self.put_commands),
+            web.post("/api/v{version}/guilds/{guild_id}/channels", self.create_channel),
+            web.patch("/api/v{version}/guilds/{guild_id}/channels", self.move_channels),
+            web.patch("/api/v{version}/guilds/{guild_id}/members/{user_id}", self.edit_member),
+            web.patch("/api/v{version}/channels/{channel_id}", self.edit_channel),
+            web.delete("/api/v{version}/channels/{channel_id}", self.delete_channel),
+            web.post("/api/v{version}/users/@me/channels", self.create_dm),
+            web.post("/api/v{version}/channels/{channel_id}/messages", self.send_message),
+        ])
+        self.runner = None
+
+    async def start(self):
+        self.runner = web.AppRunner(self.app, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, self.host, self.port)
+        await site.start()
+        host, port = self.runner.addresses[0][:2]
+        self.url = f"http://{host}:{port}"
+        return self.url
+
+    def install(self):
+        """Points disnake at this server, for clients created afterwards"""
+        discord.http.Route.BASE = f"{self.url}/api/v10"
+
+    async def close(self):
+        for session in list(self.sessions):
+            await session.ws.close()
+        if self.runner is not None:
+            await self.runner.cleanup()
+
+    # world
+
+    def add_guild(self, *, members=10, name=None, guild_id=None):
+        guild = Guild(guild_id or next(self.ids), name or "guild")
+        self.guilds[guild.id] = guild
+        me = int(self.user["id"])
+        admin = role(next(self.ids), "bot", ADMINISTRATOR)
+        guild.roles.append(admin)
+        guild.members[me] = self.member(self.user, roles=[admin["id"]])
+        for i in range(members):
+            user_id = next(self.ids)
+            guild.members[user_id] = self.member(user(user_id, f"member {i}"))
+        return guild
+
+    def add_channel(self, guild, name, *, type=2, parent_id=None, position=None):
+        channel = {
+            "id": str(next(self.ids)), "type": type, "guild_id": str(guild.id), "name": name,
+            "position": len(guild.channels) if position is None else position,
+            "parent_id": None if parent_id is None else str(parent_id), "permission_overwrites": [], "nsfw": False, "flags": 0,
+        }
+        if type == 2:
+            channel.update(bitrate=64000, user_limit=0, rtc_region=None, video_quality_mode=1, rate_limit_per_user=0)
+        guild.channels[int(channel["id"])] = channel
+        self.channels[int(channel["id"])] = guild
+        return channel
+
+    def member(self, data, *, roles=()):
+        return {"user": data, "roles": list(roles), "joined_at": "2020-01-01T00:00:00+00:00", "deaf": False,
+                "mute": False, "flags": 0, "nick": None}
+
+    async def connect(self, guild, user_id, channel_id):
+        """Moves a member into a voice channel, or out of voice with ``None``, and tells the gateway"""
+        before = guild.voice.get(user_id)
+        if channel_id is None:
+            guild.voice.pop(user_id, None)
+        else:
+            guild.voice[user_id] = channel_id
+        if self.on_voice_state is not None:
+            self.on_voice_state(guild, user_id, before, channel_id)
+        await self.dispatch(guild.id, "VOICE_STATE_UPDATE", voice_state(guild.id, user_id, channel_id, guild.members[user_id]))
+
+    async def dispatch(self, guild_id, event, data):
+        if self.guilds[guild_id].unavailable:
+            return
+        for session in list(self.sessions):
+            if shard_of(guild_id, session.shard[1]) == session.shard[0]:
+                try:
+                    await session.send(DISPATCH, data, event)
+                except ConnectionError:
+                    self.sessions.discard(session)
+
+    # gateway
+
+    async def gateway(self, request):
+        ws = web.WebSocketResponse(max_msg_size=0)
+        await ws.prepare(request)
+        session = Session(ws)
+        await session.send(HELLO, {"heartbeat_interval": HEARTBEAT})
+        try:
+            async for message in ws:
+                payload = json.loads(message.data)
+                op, d = payload["op"], payload.get("d")
+                if op == HEARTBEAT_OP:
+                    await session.send(HEARTBEAT_ACK, None)
+                elif op == IDENTIFY:
+                    await self.identify(session, d)
+                elif op == RESUME:
+                    await session.send(INVALID_SESSION, False)  # sessions aren't kept, a fresh IDENTIFY replays everything
+                elif op == REQUEST_MEMBERS:
+                    await self.request_members(session, d)
+        finally:
+            self.sessions.discard(session)
+        return ws
+
+    async def identify(self, session, d):
+        session.shard = tuple(d.get("shard") or (0, 1))
+        guilds = [g for g in self.guilds.values() if shard_of(g.id, session.shard[1]) == session.shard[0]]
+        await session.send(DISPATCH, {
+            "v": 10, "user": self.user, "session_id": session.id, "resume_gateway_url": f"{self.url}/gateway",
+            "guilds": [{"id": str(g.id), "unavailable": True} for g in guilds],
+            "application": {"id": self.application_id, "flags": 0}, "shard": list(session.shard),
+        }, "READY")
+        self.sessions.add(session)
+        for guild in guilds:
+            if not guild.unavailable:
+                await session.send(DISPATCH, guild.payload(), "GUILD_CREATE")
+
+    async def recover(self, guild):
+        """Ends a guild's outage, the sessions of its shard get the guild now"""
+        guild.unavailable = False
+        await self.dispatch(guild.id, "GUILD_CREATE", guild.payload())
+
+    async def request_members(self, session, d):
+        guild = self.guilds.get(int(d["guild_id"]))
+        if guild is None:
+            return
+        members = list(guild.members.values())
+        if d.get("user_ids"):
+            wanted = set(map(str, d["user_ids"]))
+            members = [m for m in members if m["user"]["id"] in wanted]
+        elif d.get("query"):
+            members = [m for m in members if m["user"]["username"].lower().startswith(d["query"].lower())]
+        if d.get("limit"):
+            members = members[:d["limit"]]
+        count = max(1, -(-len(members) // CHUNK))
+        for index in range(count):
+            await session.send(DISPATCH, {
+                "guild_id": str(guild.id), "members": members[index * CHUNK:(index + 1) * CHUNK],
+                "chunk_index": index, "chunk_count": count, "nonce": d.get("nonce"),
+            }, "GUILD_MEMBERS_CHUNK")
+
+    # REST
+
+    @web.middleware
+    async def middleware(self, request, handler):
+        resource = request.match_info.route.resource
+        if resource is None or not resource.canonical.startswith("/api/"):
+            if resource is None:
+                self.unknown[f"{request.method} {request.path}"] += 1
+            return await handler(request)
+        route = f"{request.method} {resource.canonical.split('}', 1)[1]}"
+        self.calls[route] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        now = time.time()
+        if self.global_bucket is not None:
+            retry_after = self.global_bucket.hit(now)
+            if retry_after:
+                self.limited["global"] += 1
+                return respond(
+                    {"message": "You are being rate limited.", "retry_after": retry_after, "global": True}, status=429,
+                    headers={"Retry-After": f"{retry_after:.3f}", "X-RateLimit-Global": "true", "X-RateLimit-Scope": "global", "Via": "1.1 google"}
+                )
+
+        limit = self.limits.get(route)
+        if limit is None:
+            return await handler(request)
+        major = next((request.match_info[key] for key in MAJOR if key in request.match_info), "")
+        bucket = self.buckets.get((route, major))
+        if bucket is None:
+            bucket = self.buckets[route, major] = Bucket(*limit)
+        retry_after = bucket.hit(now)
+        headers = {
+            "X-RateLimit-Limit": str(bucket.limit), "X-RateLimit-Remaining": str(bucket.remaining),
+            "X-RateLimit-Reset": f"{bucket.reset:.3f}", "X-RateLimit-Reset-After": f"{bucket.reset - now:.3f}",
+            "X-RateLimit-Bucket": f"{abs(hash(route)):x}",
+        }
+        if retry_after:
+            self.limited[route] += 1
+            headers.update({"Retry-After": f"{retry_after:.3f}", "X-RateLimit-Scope": "user", "Via": "1.1 google"})
+            return respond({"message": "You are being rate limited.", "retry_after": retry_after, "global": False},
+                                     status=429, headers=headers)
+        response = await handler(request)
+        response.headers.update(headers)
+        return response
+
+    async def get_gateway(self, request):
+        return respond({
+            "url": f"{self.url.replace('http', 'ws', 1)}/gateway", "shards": 1,
+            "session_start_limit": {"total": 1000, "remaining": 1000, "reset_after": 0, "max_concurrency": 1},
+        })
+
+    async def get_me(self, request):
+        return respond(self.user)
+
+    async def get_application(self, request):
+        return respond({
+            "id": self.application_id, "name": self.user["username"], "description": "", "icon": None,
+            "bot_public": True, "bot_require_code_grant": False, "owner": user(next(self.ids), "owner"),
+            "verify_key": "", "flags": 0,
+        })
+
+    async def get_commands(self, request):
+        return respond(self.commands)
+
+    async def put_commands(self, request):
+        self.commands = [
+            {"id": str(next(self.ids)), "application_id": self.application_id, "version": "1", **command}
+            for command in await request.json()
+        ]
+        return respond(self.commands)
+
+    def get_guild(self, request):
+        return self.guilds.get(int(request.match_info["guild_id"]))
+
+    def get_channel(self, request):
+        channel_id = int(request.match_info["channel_id"])
+        guild = self.channels.get(channel_id)
+        if guild is None:
+            return None, None
+        return guild, guild.channels[channel_id]
+
+    async def create_channel(self, request):
+        guild = self.get_guild(request)
+        if guild is None:
+            return error(404, 10004, "Unknown Guild")
+        body = await request.json()
+        channel = self.add_channel(guild, body["name"], type=body.get("type", 0), parent_id=body.get("parent_id"),
+                                   position=body.get("position"))
+        channel.update((key, value) for key, value in body.items() if key in channel and key not in ("id", "type"))
+        await self.dispatch(guild.id, "CHANNEL_CREATE", channel)
+        return respond(channel, status=201)
+
+    async def move_channels(self, request):
+        guild = self.get_guild(request)
+        if guild is None:
+            return error(404, 10004, "Unknown Guild")
+        for change in await request.json():
+            channel = guild.channels.get(int(change["id"]))
+            if channel is None:
+                return error(404, 10003, "Unknown Channel")
+            channel.update((key, value) for key, value in change.items() if key in ("position", "parent_id"))
+            await self.dispatch(guild.id, "CHANNEL_UPDATE", channel)
+        return web.Response(status=204)
+
+    async def edit_channel(self, request):
+        guild, channel = self.get_channel(request)
+        if channel is None:
+            return error(404, 10003, "Unknown Channel")
+        body = await request.json()
+        channel.update((key, value) for key, value in body.items() if key in channel and key not in ("id", "type", "guild_id"))
+        await self.dispatch(guild.id, "CHANNEL_UPDATE", channel)
+        return respond(channel)
+
+    async def delete_channel(self, request):
+        guild, channel = self.get_channel(request)
+        if channel is None:
+            return error(404, 10003, "Unknown Channel")
+        channel_id = int(channel["id"])
+        # whoever is still in there is disconnected first, like on Discord
+        for user_id in [u for u, c in guild.voice.items() if c == channel_id]:
+            await self.connect(guild, user_id, None)
+        del guild.channels[channel_id]
+        del self.channels[channel_id]
+        await self.dispatch(guild.id, "CHANNEL_DELETE", channel)
+        return respond(channel)
+
+    async def edit_member(self, request):
+        guild = self.get_guild(request)
+        user_id = int(request.match_info["user_id"])
+        if guild is None or user_id not in guild.members:
+            return error(404, 10007, "Unknown Member")
+        body = await request.json()
+        if "channel_id" in body:
+            channel_id = body["channel_id"] and int(body["channel_id"])
+            if user_id not in guild.voice:
+                return error(400, 40032, "Target user is not connected to voice.")
+            if channel_id is not None and channel_id not in guild.channels:
+                return error(404, 10003, "Unknown Channel")
+            await self.connect(guild, user_id, channel_id)
+        return respond({**guild.members[user_id], "guild_id": str(guild.id)})
+
+    async def create_dm(self, request):
+        body = await request.json()
+        recipient = next((g.members[int(body["recipient_id"])]["user"] for g in self.guilds.values()
+                          if int(body["recipient_id"]) in g.members), None)
+        if recipient is None:
+            return error(404, 10013, "Unknown User")
+        channel = {"id": str(next(self.ids)), "type": 1, "recipients": [recipient], "last_message_id": None}
+        self.channels[int(channel["id"])] = None
+        return respond(channel)
+
+    async def send_message(self, request):
+        channel_id = int(request.match_info["channel_id"])
+        if channel_id not in self.channels:
+            return error(404, 10003, "Unknown Channel")
+        body = await request.json()
+        return respond({
+            "id": str(next(self.ids)), "channel_id": str(channel_id), "author": self.user, "content": body.get("content", ""),
+            "timestamp": discord.utils.utcnow().isoformat(), "edited_timestamp": None, "tts": False,
+            "mention_everyone": False, "mentions": [], "mention_roles": [], "attachments": [], "embeds": [],
+            "pinned": False, "type": 0, "flags": 0,
+        })
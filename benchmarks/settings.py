@@ -0,0 +1,83 @@
+"""Resolves a lobby's settings the way every join used to and through the per lobby cache.
+
+The lobby is a real disnake channel built from a gateway payload, so ``overwrites`` costs what it
+does on a live bot.
+
+Run from the repository root with ``python -m benchmarks.settings``.
+"""
+import asyncio
+import time
+
+import disnake as discord
+from disnake.state import ConnectionState
+
+from bot.utils.settings import Settings
+from bot.utils.template import Template
+
+
+JOINS = 10_000
+ROLES = 20
+OVERWRITES = 5  # role overwrites on the lobby
+
+
+def build():
+    state = ConnectionState(
+        dispatch=lambda *args: None, handlers={}, hooks={}, http=None,
+        loop=asyncio.new_event_loop(), intents=discord.Intents.default()
+    )
+    guild_id = 1 << 22
+    colors = {"primary_color": 0, "secondary_color": None, "tertiary_color": None}
+    roles = [
+        {"id": str(guild_id + i), "name": f"role {i}", "permissions": "0", "position": i, "color": 0, "colors": colors,
+         "hoist": False, "managed": False, "mentionable": False}
+        for i in range(ROLES)
+    ]
+    channels = [
+        {"id": str(guild_id + 100), "type": 4, "name": "Dynamic Voice Channels", "position": 0, "permission_overwrites": []},
+        {"id": str(guild_id + 101), "type": 2, "name": "join me", "position": 1, "parent_id": str(guild_id + 100),
+         "bitrate": 64000, "user_limit": 0,
+         "permission_overwrites": [{"id": str(guild_id + i), "type": 0, "allow": "1024", "deny": "0"} for i in range(OVERWRITES)]},
+    ]
+    guild = discord.Guild(data={"id": str(guild_id), "name": "guild", "roles": roles, "channels": channels, "features": []}, state=state)
+    return guild.get_channel(guild_id + 101)
+
+
+def uncached(channel, config, templates):
+    settings = config.copy()
+    settings.setdefault("name", "@user's channel")
+    settings.setdefault("limit", channel.user_limit)
+    settings.setdefault("bitrate", channel.bitrate)
+    settings.setdefault("position", "bottom")
+    settings.setdefault("category", channel.category.id if channel.category else None)
+    settings.setdefault("pool", 0)
+    settings.setdefault("grace", 0)
+    category = channel.guild.get_channel(settings["category"])
+    template = templates.get(channel.id)
+    if template is None or template.source != settings["name"]:
+        template = templates[channel.id] = Template(settings["name"])
+    overwrites = channel.overwrites
+    return category, template, overwrites
+
+
+def cached(channel, config, cache):
+    settings = cache.get(channel.id)
+    if settings is None:
+        settings = cache[channel.id] = Settings(channel, config)
+    return settings.category_channel, settings.template, dict(settings.overwrites)
+
+
+def main():
+    lobby = build()
+    config = {"name": "@user's room", "limit": 5}
+    for name, func in (("uncached", uncached), ("cached", cached)):
+        state = {}
+        start = time.perf_counter()
+        for _ in range(JOINS):
+            category, template, overwrites = func(lobby, config, state)
+        elapsed = time.perf_counter() - start
+        assert category is lobby.category and len(overwrites) == OVERWRITES
+        print(f"{name:>8}: {elapsed / JOINS * 1e6:7.2f} µs per join with {OVERWRITES} overwrites on the lobby")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""Times a mixed stream of raw voice state updates with and without the pre-filter in front of dispatch.
+
+Payloads go through disnake's real parser and state. Of the guilds, one in ``CONFIGURED`` has a
+lobby and two occupied dynamic channels. The stream is mostly mutes and deafens and moves between
+ordinary channels, with some moves between dynamic channels, which have to reach the bot either
+way. Afterwards both runs have to agree on where every member is and on which members are cached,
+also with ``low_memory``, which only caches members in voice.
+
+Run from the repository root with ``python -m benchmarks.voice_filter``.
+"""
+import asyncio
+import json
+import random
+import tempfile
+import time
+
+from disnake.user import ClientUser
+
+from bot import client
+from bot.utils import metrics
+
+from .server import Server, voice_state
+
+
+GUILDS = 500
+MEMBERS = 40
+CHANNELS = 6  # ordinary voice channels per guild
+CONFIGURED = 5  # one in this many guilds has a lobby
+EVENTS = 100_000
+BATCH = 500
+
+
+def build():
+    server = Server()
+    guilds = []
+    for i in range(GUILDS):
+        guild = server.add_guild(members=MEMBERS)
+        users = [user_id for user_id, m in guild.members.items() if not m["user"]["bot"]]
+        channels = [int(server.add_channel(guild, f"voice {c}")["id"]) for c in range(CHANNELS)]
+        lobby, dynamic = None, []
+        if i % CONFIGURED == 0:
+            lobby = int(server.add_channel(guild, "join me")["id"])
+            dynamic = [int(server.add_channel(guild, f"dynamic {c}")["id"]) for c in range(2)]
+            guild.voice.update(zip(users[:2], dynamic))  # keep them occupied, so nothing gets swept
+        for user_id in users[2:MEMBERS // 2]:
+            guild.voice[user_id] = channels[user_id % CHANNELS]
+        guilds.append((guild, users, channels, lobby, dynamic))
+    return server, guilds
+
+
+def stream(server, guilds, rng):
+    """Raw payloads and how many of them concern a dynamic channel"""
+    where = {(guild.id, user_id): channel_id for guild, *_ in guilds for user_id, channel_id in guild.voice.items()}
+    payloads = []
+    relevant = 0
+    for _ in range(EVENTS):
+        guild, users, channels, lobby, dynamic = rng.choice(guilds)
+        user_id = rng.choice(users[2:])
+        before = where.get((guild.id, user_id))
+        roll = rng.random()
+        if dynamic and roll < 0.1:
+            after = dynamic[0] if before != dynamic[0] else dynamic[1]
+        elif before is not None and roll < 0.7:
+            after = before  # mute, deafen, camera
+        else:
+            after = rng.choice([None, *channels])
+        relevant += before != after and (before in dynamic or after in dynamic)
+        where[guild.id, user_id] = after
+        payload = voice_state(guild.id, user_id, after, guild.members[user_id])
+        payload["self_mute"] = rng.random() < 0.5
+        payloads.append(payload)
+    return payloads, relevant
+
+
+async def run(server, guilds, payloads, *, filtered, low_memory):
+    with tempfile.TemporaryDirectory() as directory:
+        bot = client.Bot(path=directory, low_memory=low_memory)
+        state = bot._connection
+        state.user = ClientUser(state=state, data=server.user)
+        for guild, *_ in guilds:
+            state.parsers["GUILD_CREATE"](json.loads(json.dumps(guild.payload())))
+        for guild, users, channels, lobby, dynamic in guilds:
+            if lobby is not None:
+                bot.configs[str(lobby)] = {}
+                bot.channels.update(dynamic)
+        stats = await bot.prepare()
+        assert stats["kept"] == len(bot.channels) and stats["deleted"] == 0, stats
+        bot.prepared = filtered
+
+        for counter in client.VOICE_EVENTS.values:
+            client.VOICE_EVENTS.values[counter] = 0
+        parse = state.parsers["VOICE_STATE_UPDATE"]
+        current = asyncio.current_task()
+        start = time.perf_counter()
+        for i in range(0, len(payloads), BATCH):
+            for payload in payloads[i:i + BATCH]:
+                parse(payload)
+            await asyncio.gather(*(asyncio.all_tasks() - {current}))  # the dispatched handlers
+        elapsed = time.perf_counter() - start
+
+        where = {(g.id, user_id): s.channel.id for g in bot.guilds for user_id, s in g._voice_states.items() if s.channel}
+        cached = {(g.id, user_id) for g in bot.guilds for user_id in g._members}
+        counts = dict(client.VOICE_EVENTS.values)
+        bot.prepared = False  # no checkpoint
+        await bot.close()
+    return elapsed, (where, cached), counts
+
+
+async def main():
+    metrics.enable()
+    server, guilds = build()
+    payloads, relevant = stream(server, guilds, random.Random(0))
+    for low_memory in (False, True):
+        results = {}
+        for filtered in (False, True):
+            label = ("filtered" if filtered else "unfiltered") + (", low_memory" if low_memory else "")
+            elapsed, results[filtered], counts = await run(
+                server, guilds, [json.loads(json.dumps(p)) for p in payloads], filtered=filtered, low_memory=low_memory
+            )
+            print(f"{label:>22}: {elapsed / len(payloads) * 1e6:6.2f} µs per event, "
+                  f"{counts.get(('dispatched',), 0):.0f} dispatched, {counts.get(('filtered',), 0):.0f} filtered")
+            if filtered:
+                assert counts[("dispatched",)] == relevant, (counts, relevant)
+        assert results[False][0] == results[True][0], "the voice states differ"
+        assert results[False][1] == results[True][1], "the cached members differ"
+    print(f"{len(payloads)} events over {GUILDS} guilds, {relevant} concern a dynamic channel")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
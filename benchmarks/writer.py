@@ -0,0 +1,73 @@
+"""Measures how long a full store write keeps the event loop busy, with orjson and with the stdlib encoder.
+
+While the writer thread encodes, the loop keeps mutating nested values. The file has to match
+the snapshot taken when the write started anyway.
+
+Run from the repository root with ``python -m benchmarks.writer``.
+"""
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+from bot.utils import data
+
+
+ENTRIES = 100_000
+WRITES = 10
+
+
+async def ticker(gaps):
+    """Records the longest time the loop couldn't run this task"""
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(0)
+        gaps.append(loop.time() - start)
+
+
+async def run(directory, encoder):
+    data.orjson = encoder
+    store = data.Dict(os.path.join(directory, f"configs-{'orjson' if encoder else 'json'}.json"))
+    for i in range(ENTRIES):
+        store[str(10 ** 17 + i)] = {"name": "@user's channel", "limit": i % 10, "position": "bottom"}
+
+    gaps = []
+    task = asyncio.get_running_loop().create_task(ticker(gaps))
+    elapsed = stall = 0.0
+    for i in range(WRITES):
+        expected = json.loads(json.dumps(store))
+        await asyncio.sleep(0)
+        gaps.clear()
+
+        start = time.perf_counter()
+        write = asyncio.ensure_future(store.flush())
+        await asyncio.sleep(0)  # lets it take its snapshot
+        while not write.done():
+            store[str(10 ** 17 + i)]["limit"] = -1  # in place, after the snapshot was taken
+            await asyncio.sleep(0)
+        await write
+        elapsed += time.perf_counter() - start
+        stall = max(stall, *gaps)
+
+        with open(store.path) as file:
+            assert json.load(file) == expected, "the file doesn't match the snapshot"
+    task.cancel()
+    return elapsed / WRITES, stall
+
+
+async def main():
+    data.metrics.enable()
+    encoders = [("orjson", data.orjson), ("json", None)] if data.orjson is not None else [("json", None)]
+    with tempfile.TemporaryDirectory() as directory:
+        for name, encoder in encoders:
+            data.ENCODE_SECONDS.series.clear()
+            seconds, stall = await run(directory, encoder)
+            encoded = sum(series.sum for series in data.ENCODE_SECONDS.series.values()) / WRITES
+            print(f"{name:>7}: {seconds * 1000:6.1f} ms per write of {ENTRIES} entries, "
+                  f"{encoded * 1000:6.1f} ms encoding on the writer thread, loop blocked at most {stall * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
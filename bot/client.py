@@ -1,15 +1,21 @@
+import asyncio
 import collections
+import json
 import os
-import re
 import time
-import random
-from contextlib import suppress
 from datetime import datetime
 
 import disnake as discord
 from disnake.ext import commands
 
-from .utils import data
+from .utils import api, checkpoint, data, database, guilds, metrics
+from .utils.censor import Censor
+from .utils.index import ChannelIndex, LobbyIndex
+from .utils.pool import Pool
+from .utils.profiler import Profiler
+from .utils.ratelimit import RateLimiter
+from .utils.sweeper import Sweeper
+from .utils.settings import Settings, overwrites_of
 
 
 intents = discord.Intents(
@@ -19,61 +25,427 @@ intents = discord.Intents(
     guild_messages=True,
 )
 
+# no prefix commands and no member lookups, only the members in voice channels are ever needed
+low_memory_intents = discord.Intents(
+    guilds=True,
+    voice_states=True,
+)
+
+VOICE_SECONDS = metrics.Histogram("dvc_voice_state_update_seconds", "Time spent handling a voice state update")
+JOIN_SECONDS = metrics.Histogram("dvc_join_seconds", "Time from joining a lobby until being moved to the new channel", ("source",))
+VOICE_EVENTS = metrics.Counter("dvc_voice_events_total", "Voice state updates by whether they were dispatched or filtered out", ("result",))
+RATE_LIMITED = metrics.Counter("dvc_rate_limited_total", "Joins turned away by the rate limiter")
+ORPHANS = metrics.Counter("dvc_orphans_total", "Records of guilds and channels that went away unnoticed", ("kind",))
+
+ORPHAN_INTERVAL = 60 * 60
+ORPHAN_BATCH = 100
+CHECKPOINT_AGE = 60 * 60  # older checkpoints are ignored, a full prepare is cheap compared to the downtime
+CATCH_UP_DELAY = 5.0  # guilds come back from an outage in bursts, each burst reads the old directories once
+
 
 class Bot(commands.Bot):
-    def __init__(self):
+    def __init__(self, *, storage="json", path="./data", legacy=None, metrics_port=None, low_memory=False, **options):
+        if low_memory:
+            options.setdefault("member_cache_flags", discord.MemberCacheFlags.from_intents(low_memory_intents))
+            options.setdefault("chunk_guilds_at_startup", False)
+            options.setdefault("max_messages", None)
         super().__init__(
-            intents=intents,
+            intents=low_memory_intents if low_memory else intents,
             activity=discord.Game("click me and invite me again for slash commands"),
-            allowed_mentions=discord.AllowedMentions.none()
+            allowed_mentions=discord.AllowedMentions.none(),
+            **options
         )
+        if low_memory:
+            parse = self._connection.parsers["GUILD_CREATE"]
 
-        self.launched_at = None
+            def parse_guild_create(data):
+                parse(data)
+                self.cache_voice_members(data)
 
-        if not os.path.exists("./data"):
-            os.mkdir("./data")
+            self._connection.parsers["GUILD_CREATE"] = parse_guild_create
 
-        self.configs = data.Dict("./data/configs.json")
-        self.channels = data.List("./data/channels.json")
-        self.blacklists = data.Dict("./data/blacklists.json")
+        parse_voice = self._connection.parsers["VOICE_STATE_UPDATE"]
 
-        self.spam_control = {}
-        self.spam_counter = collections.Counter()
+        def parse_voice_state_update(data):
+            if self.wants_voice_state(data):
+                VOICE_EVENTS.inc("dispatched")
+                parse_voice(data)
+            else:
+                VOICE_EVENTS.inc("filtered")
+                self.update_voice_state(data)
 
-        for filename in os.listdir("./bot/ext"):
+        self._connection.parsers["VOICE_STATE_UPDATE"] = parse_voice_state_update
+
+        self.launched_at = None
+        self.prepared = False
+        self.last_event = None
+        self.path = path
+        self.legacy = legacy
+        self.storage = storage
+        self.metrics_port = metrics_port
+        self.metrics_server = None
+
+        if not os.path.exists(path):
+            os.makedirs(path)
+
+        # before the stores, importing JSON into sqlite asks get_guild_id about every key
+        self.channel_index = ChannelIndex()
+        self.lobby_index = LobbyIndex()  # filled by prepare, the configs don't know their guilds
+        self.pool = Pool()
+        self.database = None
+        if storage == "json":
+            self.configs = data.JournalDict(os.path.join(path, "configs.json"), loop=self.loop)
+            self.channels = data.JournalSet(os.path.join(path, "channels.json"), loop=self.loop)
+            self.blacklists = data.JournalDict(os.path.join(path, "blacklists.json"), loop=self.loop)
+            self.limits = data.JournalDict(os.path.join(path, "limits.json"), loop=self.loop)
+            self.stores = (self.configs, self.channels, self.blacklists, self.limits)
+        elif storage == "sqlite":
+            self.database = database.Database(os.path.join(path, "bot.db"), loop=self.loop)
+            self.configs = database.Dict(self.database, "configs", guild_of=self.get_guild_id)
+            self.channels = database.Set(self.database, "channels", guild_of=self.get_guild_id)
+            self.blacklists = database.Dict(self.database, "blacklists", guild_of=int)
+            self.limits = database.Dict(self.database, "limits", guild_of=int)
+            for store in (self.configs, self.channels, self.blacklists, self.limits):
+                store.migrate(os.path.join(path, f"{store.name}.json"))
+            self.stores = (self.configs, self.channels, self.blacklists, self.limits)
+        elif storage == "guilds":
+            # only the lobby -> guild routes stay in memory, so joins in other channels never touch the disk
+            self.partitions = guilds.Partitions(os.path.join(path, "guilds"), loop=self.loop)
+            self.lobbies = data.JournalDict(os.path.join(path, "lobbies.json"), loop=self.loop)
+            self.configs = guilds.Section(self.partitions, "configs", guild_of=self.get_guild_id, routes=self.lobbies)
+            self.channels = data.JournalSet(os.path.join(path, "channels.json"), loop=self.loop)
+            self.blacklists = guilds.Section(self.partitions, "blacklists", guild_of=int)
+            self.limits = guilds.Section(self.partitions, "limits", guild_of=int)
+            self.stores = (self.partitions, self.lobbies, self.channels)
+        else:
+            raise ValueError(f"unknown storage {storage!r}")
+
+        self.api = api.Scheduler(loop=self.loop)
+        self.settings = {}  # lobby id -> resolved Settings
+        self.censors = {}
+
+        self.rate_limiter = RateLimiter()
+        self.sweeper = Sweeper(self.sweep, loop=self.loop)
+        self.profiler = Profiler(loop=self.loop)  # idle until /bot profile
+        self.graces = {}  # channel id -> seconds it may stay empty, if not 0
+        self.collector = None
+        self.unadopted = set()  # guilds whose records are still in an earlier directory, see adopt
+        self.unpartitioned = False  # configs.json still has configs of unavailable guilds, see partition
+        self.returned = set()  # guilds back from an outage that catch_up has to look at
+        self.catching_up = None
+
+        if metrics_port is not None:
+            metrics.enable()
+            metrics.Gauge("dvc_guilds", "Guilds the bot is in", lambda: len(self.guilds))
+            metrics.Gauge("dvc_channels", "Dynamic channels that currently exist", lambda: len(self.channels))
+            metrics.Gauge("dvc_pooled_channels", "Hidden channels waiting in pools", lambda: len(self.pool.owners))
+            metrics.Gauge("dvc_api_queued", "API calls waiting in the scheduler", self.api.depth)
+            metrics.Gauge("dvc_empty_channels", "Empty channels waiting for their grace period to end", self.sweeper.__len__)
+
+        for filename in os.listdir(os.path.join(os.path.dirname(__file__), "ext")):
             if filename.endswith(".py"):
                 self.load_extension("bot.ext." + filename[:-3])
                 print("loaded", filename)
 
-    async def prepare(self):
-        channels = self.channels.copy()
-        self.channels.clear()
+    def read_records(self, directory):
+        """The configs, channels, blacklists and limits kept in a data directory, whichever storage wrote them"""
+        names = ("configs", "channels", "blacklists", "limits")
+        records = ({}, set(), {}, {})
+        for name, found in zip(names, records):
+            path = os.path.join(directory, f"{name}.json")
+            if os.path.exists(path):
+                found.update((data.JournalSet if name == "channels" else data.JournalDict)(path, loop=self.loop))
+        if os.path.exists(os.path.join(directory, "bot.db")):
+            db = database.Database(os.path.join(directory, "bot.db"), loop=self.loop)
+            for name, found in zip(names, records):
+                found.update((database.Set if name == "channels" else database.Dict)(db, name))
+            db.close()
+        if os.path.isdir(os.path.join(directory, "guilds")):
+            partitions = guilds.Partitions(os.path.join(directory, "guilds"), loop=self.loop)
+            for guild_id in partitions.known:
+                partition = partitions.get(guild_id)
+                for name, found in zip(names, records):
+                    found.update(partition.get(name, ()))
+        return records
+
+    async def adopt(self):
+        """Copies the records of this bot's guilds out of the directories they were kept in before, see :mod:`bot.cluster`.
+
+        Records only name their channel, so those of unavailable guilds can't be told apart. These
+        guilds are written to ``unadopted.json`` and adopted by :meth:`catch_up` once they are back.
+        """
+        if self.legacy is None or os.path.exists(os.path.join(self.path, "adopted")):
+            return
+
+        path = os.path.join(self.path, "unadopted.json")
+        if os.path.exists(path):
+            with open(path) as file:
+                unadopted = set(json.load(file))
+            self.unadopted = {guild.id for guild in self.guilds if guild.id in unadopted}
+        else:
+            self.unadopted = {guild.id for guild in self.guilds}
+        await self.adopt_guilds([guild for guild in self.guilds if guild.id in self.unadopted and not guild.unavailable])
+
+    async def adopt_guilds(self, guilds):
+        """Adopts available guilds, their channels tell which records are theirs"""
+        sources = collections.defaultdict(list)
+        for guild in guilds:
+            sources[self.legacy.locate(guild.id)].append(guild)
+        for directory, located in sources.items():
+            guild_ids = {str(guild.id) for guild in located}
+            owners = {channel.id: guild.id for guild in located for channel in guild.voice_channels}
+            configs, channels, blacklists, limits = self.read_records(directory)
+            configs = {key: value for key, value in configs.items() if int(key) in owners}
+            if self.storage == "guilds":
+                self.lobbies.update({key: owners[int(key)] for key in configs})
+            self.configs.update(configs)
+            self.channels.update(key for key in channels if key in owners)
+            self.blacklists.update({key: value for key, value in blacklists.items() if key in guild_ids})
+            self.limits.update({key: value for key, value in limits.items() if key in guild_ids})
+        for store in self.stores:
+            await store.flush()
+
+        self.unadopted.difference_update(guild.id for guild in guilds)
+        self.write_unadopted()
+
+    def write_unadopted(self):
+        path = os.path.join(self.path, "unadopted.json")
+        if self.unadopted:
+            with open(path + ".tmp", "w") as file:
+                json.dump(sorted(self.unadopted), file)
+            os.replace(path + ".tmp", path)
+            return
+        with open(os.path.join(self.path, "adopted"), "w"):
+            pass
+        if os.path.exists(path):
+            os.remove(path)
+
+    async def catch_up(self):
+        """Adopts and partitions the records of guilds that were unavailable during prepare once they are back"""
+        while self.returned:
+            await asyncio.sleep(CATCH_UP_DELAY)
+            guilds = [guild for guild in map(self.get_guild, self.returned) if guild is not None and not guild.unavailable]
+            self.returned.clear()
+            adopting = [guild for guild in guilds if guild.id in self.unadopted]
+            if adopting:
+                await self.adopt_guilds(adopting)
+            if self.unpartitioned:
+                await self.partition()
+            for guild in guilds:
+                self.index_guild(guild)
+            await self.channels.save()
+            if self.database is not None:
+                for store in self.stores:
+                    await store.backfill()
+
+    def start_catching_up(self):
+        if self.catching_up is None or self.catching_up.done():
+            self.catching_up = self.loop.create_task(self.catch_up())
+
+    async def partition(self):
+        """Moves the JSON stores into per guild files, each file is renamed once it is empty.
+
+        A config only names its lobby, so configs no available guild has a channel for stay in
+        ``configs.json`` until :meth:`catch_up` finds their guild. Once no guild is unavailable
+        anymore, those left over belong to lobbies that are gone and are dropped.
+        """
+        owners = {channel.id: guild.id for guild in self.guilds for channel in guild.voice_channels}
+        unavailable = any(guild.unavailable for guild in self.guilds)
+        self.unpartitioned = False
+        stores = (
+            (self.configs, "configs.json", lambda key: owners.get(int(key))),
+            (self.blacklists, "blacklists.json", int),
+            (self.limits, "limits.json", int),
+        )
+        for store, filename, guild_of in stores:
+            path = os.path.join(self.path, filename)
+            if not os.path.exists(path):
+                continue
+            source = data.JournalDict(path, loop=self.loop)
+            moved = []
+            for key, value in source.items():
+                guild_id = guild_of(key)
+                if guild_id is None:
+                    continue
+                if store is self.configs:
+                    if "top" in value:  # the migration below would have to load every guild
+                        value["position"] = "top" if value.pop("top") else "bottom"
+                    self.lobbies[key] = guild_id
+                store[key] = value
+                moved.append(key)
+            await store.flush()
+            if unavailable and len(moved) < len(source):
+                for key in moved:
+                    del source[key]
+                await source.close()
+                self.unpartitioned = True
+                continue
+            for file in (path, path + ".log"):
+                if os.path.exists(file):
+                    os.replace(file, file + ".migrated")
+
+    async def migrate(self):
+        """Runs the migrations this data directory hasn't seen yet, the number of those it has is kept in ``schema``"""
+        path = os.path.join(self.path, "schema")
+        done = 0
+        if os.path.exists(path):
+            with open(path) as file:
+                done = int(file.read().strip() or 0)
+        for version, migration in enumerate(MIGRATIONS[done:], done + 1):
+            await migration(self)
+            with open(path, "w") as file:
+                file.write(str(version))
+
+    async def migrate_positions(self):
+        """``top`` became ``position``, the guilds storage converts configs while partitioning"""
+        for key in self.configs.keys() if self.storage != "guilds" else ():
+            config = self.configs[key]
+            if "top" in config:
+                config["position"] = "top" if config.pop("top") else "bottom"
+                self.configs[key] = config
+        await self.configs.flush()
+
+    def write_checkpoint(self):
+        """Writes down which lobbies and dynamic channels each guild has, see :mod:`.utils.checkpoint`"""
+        guild_ids = {guild.id for guild in self.guilds}
+        channels = collections.defaultdict(list)
+        for channel_id in self.channels:
+            if channel_id in self.channel_index:
+                guild_id = self.channel_index.locations[channel_id][0]
+            else:
+                guild_id = self.lobby_index.owners.get(self.pool.owners.get(channel_id))
+            if guild_id not in guild_ids:
+                return  # the next start has to look for it
+            channels[guild_id].append(channel_id)
+
+        checkpoint.write(os.path.join(self.path, "checkpoint.json"), {
+            "last_event": self.last_event,
+            "guilds": {
+                str(guild_id): [list(self.lobby_index.guilds.get(guild_id, ())), channels.get(guild_id, [])]
+                for guild_id in guild_ids
+            },
+            "graces": {str(key): value for key, value in self.graces.items() if key in self.channels},
+        })
+
+    async def prepare(self, *, concurrency=50, per_guild=5):
+        started = time.perf_counter()
+        await self.adopt()
+        if self.storage == "guilds":
+            await self.partition()
+        await self.migrate()
+        state = checkpoint.load(os.path.join(self.path, "checkpoint.json"), max_age=CHECKPOINT_AGE)
+        known = state["guilds"] if state is not None else {}
+        if state is not None:
+            self.graces.update((int(key), value) for key, value in state["graces"].items())
+
+        # figure out what has to be done before touching the API
+        tracked = self.channels.copy()
+        kept = set()
+        stale = []
+        waiting = []
+        lobbies = []
+        self.channel_index.clear()
+        self.lobby_index.clear()
+        if self.storage == "guilds":
+            for key, guild_id in self.lobbies.items():
+                self.lobby_index.add(guild_id, int(key))
         for guild in self.guilds:
-            for channel in guild.voice_channels:
-                if channel.id in channels:
+            saved = known.get(str(guild.id))
+            if saved is None:
+                channels = guild.voice_channels
+            else:
+                # only what the guild had at shutdown can have changed since
+                channels = [c for c in map(guild.get_channel, (*saved[0], *saved[1])) if c is not None]
+            for channel in channels:
+                if channel.id in tracked:
                     if len(channel.members) == 0:
-                        await channel.delete()
+                        stale.append(channel)
                     else:
-                        self.channels.append(channel.id)
+                        self.channel_index.add(channel)
+                        kept.add(channel.id)
                 elif str(channel.id) in self.configs:
-                    for member in channel.members:
-                        await self.on_voice_join(member, channel)
-        await self.channels.save()
-
-        # migration from old to new framework
-        for key in self.configs.keys():
-            if "top" in self.configs[key]:
-                self.configs[key]["position"] = "top" if self.configs[key]["top"] else "bottom"
-                del self.configs[key]["top"]
-        await self.configs.save()
+                    self.lobby_index.add(guild.id, channel.id)
+                    waiting.extend((member, channel) for member in channel.members)
+                    lobbies.append(channel)
+        for channel_id in tracked - kept:
+            self.channels.discard(channel_id)
+            self.graces.pop(channel_id, None)
+
+        stats = collections.Counter(kept=len(self.channels), checkpoint=len(known))
+        total = len(stale) + len(waiting)
+        limit = asyncio.Semaphore(concurrency)
+        guild_limits = collections.defaultdict(lambda: asyncio.Semaphore(per_guild))
+
+        async def run(guild, key, func, *args):
+            async with guild_limits[guild.id], limit:  # guild first so a busy guild doesn't hog global slots
+                try:
+                    await func(*args)
+                except discord.HTTPException as error:
+                    stats["failed"] += 1
+                    print("prepare:", key, "failed in", guild.id, "-", error)
+                else:
+                    stats[key] += 1
+            done = stats["deleted"] + stats["served"] + stats["failed"]
+            if done % 100 == 0:
+                print(f"prepare: {done}/{total} done after {time.perf_counter() - started:.2f}s")
+
+        await asyncio.gather(
+            *(run(c.guild, "deleted", self.api.submit, c.guild.id, api.DELETE, c.delete) for c in stale),
+            *(run(c.guild, "served", self.serve, member, c) for member, c in waiting)
+        )
+        await self.channels.flush()
+
+        # pool channels left over from the last run were empty, so they are gone by now
+        for lobby in lobbies:
+            if self.get_settings(lobby).pool > 0:
+                self.loop.create_task(self.refill(lobby))
+
+        if self.database is not None:
+            # rows imported from JSON or written before login have no guild yet, the indexes know it now
+            for store in self.stores:
+                stats["backfilled"] += await store.backfill()
+
+        stats["seconds"] = round(time.perf_counter() - started, 3)
+        print("prepare:", ", ".join(f"{key} {value}" for key, value in stats.items()))
+        self.prepared = True
+        if self.unadopted or self.unpartitioned:
+            # some may have come back while prepare ran
+            self.returned.update(guild.id for guild in self.guilds if not guild.unavailable)
+            self.start_catching_up()
+        return stats
 
     async def on_ready(self):
         if self.launched_at is None:
             self.launched_at = datetime.utcnow()
             await self.prepare()
+            self.collector = self.loop.create_task(self.collect_loop())
             print("Logged in as", self.user)
             print("ID:", self.user.id)
 
+    async def start(self, *args, **kwargs):
+        if self.metrics_port is not None:
+            self.metrics_server = await metrics.serve(self.metrics_port)
+            self.loop.create_task(metrics.watch_loop())
+        await super().start(*args, **kwargs)
+
+    async def close(self):
+        try:
+            await super().close()
+        finally:
+            if self.metrics_server is not None:
+                self.metrics_server.close()
+            self.sweeper.close()  # whatever is left empty gets deleted by the next prepare
+            if self.collector is not None:
+                self.collector.cancel()
+            if self.catching_up is not None:
+                self.catching_up.cancel()
+            for store in self.stores:
+                await store.close()
+            if self.database is not None:
+                self.database.close()
+            if self.prepared:
+                self.write_checkpoint()
+
     async def process_commands(self, message):
         return
 
@@ -86,66 +458,190 @@ class Bot(commands.Bot):
         self.owner_id = app.owner.id
         return app.owner
 
-    def get_settings(self, channel):
-        settings = self.configs[str(channel.id)].copy()  # we don't want data stored that can be defaulted
+    def cache_voice_members(self, data):
+        """Caches the members a guild's voice states refer to.
+
+        disnake only caches the members sent with a guild if it caches every member, so with
+        just the voice cache channel.members would stay empty until everyone moved once.
+        """
+        guild = self._connection._get_guild(int(data["id"]))
+        if guild is None:
+            return
+        for payload in data.get("members", ()):
+            if int(payload["user"]["id"]) in guild._voice_states:
+                guild._add_member(discord.Member(data=payload, guild=guild, state=self._connection))
+
+    def is_dynamic(self, channel_id):
+        """Whether voice events in a channel concern the bot, it is a lobby or a dynamic channel"""
+        return channel_id in self.lobby_index or channel_id in self.channel_index
+
+    def wants_voice_state(self, data):
+        """Whether a raw voice state update has to be dispatched.
+
+        Most voice traffic is mutes, deafens and members moving between channels that are neither
+        lobbies nor dynamic channels. Until prepare has filled the indexes everything is wanted.
+        """
+        if not self.prepared or "guild_id" not in data or int(data["user_id"]) == self.user.id:
+            return True
+        guild = self._connection._get_guild(int(data["guild_id"]))
+        if guild is None:
+            return True  # disnake discards it
+        state = guild._voice_states.get(int(data["user_id"]))
+        before = state.channel.id if state is not None and state.channel is not None else None
+        after = data["channel_id"] and int(data["channel_id"])
+        if before == after:
+            return False
+        return self.is_dynamic(before) or self.is_dynamic(after)
+
+    def update_voice_state(self, data):
+        """Keeps the voice state and member caches up to date like disnake's parser, without dispatching anything.
+
+        The copy of the old voice state disnake makes for the event is left out, nobody gets to see it.
+        """
+        guild = self._connection._get_guild(int(data["guild_id"]))
+        user_id = int(data["user_id"])
+        channel_id = data["channel_id"] and int(data["channel_id"])
+        channel = guild.get_channel(channel_id)
+        if channel is None:
+            guild._voice_states.pop(user_id, None)
+        else:
+            state = guild._voice_states.get(user_id)
+            if state is None:
+                guild._voice_states[user_id] = discord.VoiceState(data=data, channel=channel)
+            else:
+                state._update(data, channel)
+
+        flags = self._connection.member_cache_flags
+        if not flags.voice:
+            return
+        member = guild.get_member(user_id)
+        if member is None and "member" in data:
+            member = discord.Member(data=data["member"], guild=guild, state=self._connection)
+        if member is None:
+            return
+        if channel_id is None and flags._voice_only:
+            guild._remove_member(member)
+        elif channel_id is not None:
+            guild._add_member(member)
+
+    def get_guild_id(self, channel_id):
+        channel = self.get_channel(int(channel_id))
+        if channel is not None:
+            return channel.guild.id
+        location = self.channel_index.locations.get(int(channel_id))
+        if location is not None:
+            return location[0]
+        guild_id = self.lobby_index.owners.get(int(channel_id))
+        if guild_id is not None:
+            return guild_id
+        lobby = self.get_channel(self.pool.owners.get(int(channel_id)))
+        return lobby.guild.id if lobby is not None else None
+
+    def hidden_overwrites(self, lobby):
+        hidden = discord.PermissionOverwrite(view_channel=False, connect=False)
+        overwrites = {target: hidden for target in (lobby.guild.default_role, *overwrites_of(lobby))}
+        overwrites[lobby.guild.me] = discord.PermissionOverwrite(view_channel=True, connect=True, manage_channels=True)
+        return overwrites
+
+    async def refill(self, lobby):
+        """Creates hidden channels until the lobby's pool is full again"""
+        if lobby.id in self.pool.refilling:
+            return
+        self.pool.refilling.add(lobby.id)
+        try:
+            while str(lobby.id) in self.configs:
+                settings = self.get_settings(lobby)
+                if self.pool.size(lobby.id) >= settings.pool:
+                    break
+                channel = await self.api.submit(
+                    lobby.guild.id,
+                    api.REFILL,
+                    lobby.guild.create_voice_channel,
+                    name=lobby.name,
+                    category=settings.category_channel,
+                    bitrate=settings.bitrate,
+                    user_limit=settings.limit,
+                    rtc_region=lobby.rtc_region,
+                    video_quality_mode=lobby.video_quality_mode,
+                    overwrites=self.hidden_overwrites(lobby)
+                )
+                self.pool.put(lobby.id, channel)
+                self.channels.add(channel.id)  # tracked, so prepare cleans it up after a crash
+        except discord.HTTPException as error:
+            print("refill failed for", lobby.id, "-", error)
+        finally:
+            self.pool.refilling.discard(lobby.id)
+        await self.channels.save()
 
-        settings.setdefault("name", "@user's channel")
-        settings.setdefault("limit", channel.user_limit)
-        settings.setdefault("bitrate", channel.bitrate)
-        settings.setdefault("position", "bottom")
-        settings.setdefault("category", channel.category.id if channel.category else None)
+    async def reset_pool(self, lobby):
+        """Replaces the pooled channels of a lobby, e.g. after its settings changed"""
+        channels = self.pool.drain(lobby.id)
+        for channel in channels:
+            self.channels.discard(channel.id)
+        await asyncio.gather(
+            *(self.api.submit(lobby.guild.id, api.DELETE, channel.delete) for channel in channels),
+            return_exceptions=True
+        )
+        await self.refill(lobby)
 
+    def get_settings(self, channel):
+        """The lobby's resolved settings, the config only stores what differs from the defaults"""
+        settings = self.settings.get(channel.id)
+        if settings is None:
+            settings = self.settings[channel.id] = Settings(channel, self.configs[str(channel.id)])
         return settings
 
-    def update_rate_limit(self, key):
-        now = time.monotonic()
-        if key in self.spam_control:
-            time_passed = now - self.spam_control[key]
-        else:
-            time_passed = None
-        self.spam_control[key] = now
-        return time_passed
+    def forget_settings(self, guild_id):
+        """Drops the settings of a guild's lobbies, e.g. after a role or category they refer to is gone"""
+        for lobby_id in self.lobby_index.guilds.get(guild_id, ()):
+            self.settings.pop(lobby_id, None)
+
+    def get_censor(self, guild_id):
+        censor = self.censors.get(guild_id)
+        if censor is None:
+            censor = self.censors[guild_id] = Censor(self.blacklists.get(str(guild_id), []))
+        return censor
 
     async def on_voice_join(self, member, channel):
+        self.sweeper.rescue(channel.id)
+        if await self.serve(member, channel) is not None:
+            await self.channels.save()
+
+    async def serve(self, member, channel):
+        """Creates a dynamic channel for a member who joined a lobby and moves them there"""
         if str(channel.id) not in self.configs:
             return
-        # RATE LIMIT CHECK (3 time within 15 seconds)
-        now = time.monotonic()
-        mkey = str(member.id)
-        if mkey in self.spam_control:
-            time_passed = now - self.spam_control[mkey]
-            if time_passed < 15.0:
-                self.spam_counter[member.id] += 1
-                if self.spam_counter[member.id] >= 3:
-                    retry_after = 15.0 - time_passed
-                    return await member.send(f"You are being rate limited. Try again in `{retry_after:.2f}` seconds.")
-            else:
-                del self.spam_counter[member.id]
-        self.spam_control[mkey] = now
+        joined = time.perf_counter()
+        # RATE LIMIT CHECK (3 times within 15 seconds unless the guild changed it)
+        limit = self.limits.get(str(member.guild.id))
+        if limit is None or limit["rate"] > 0:
+            # one bucket per member and guild, guilds have their own limits and joins in one don't count in another
+            key = member.guild.id << 64 | member.id
+            retry_after = self.rate_limiter.hit(key, *((limit["rate"], limit["per"]) if limit else ()))
+            if retry_after:
+                RATE_LIMITED.inc()
+                await member.send(f"You are being rate limited. Try again in `{retry_after:.2f}` seconds.")
+                return
 
         settings = self.get_settings(channel)
-        name = settings["name"]
-        category = member.guild.get_channel(settings["category"])
+        category = settings.category_channel
 
         # figure out position
-        if settings["position"] == "top":
+        if settings.position == "top":
             position = 0
-        elif settings["position"] == "below":
+        elif settings.position == "below":
             position = channel.position + 1
-        elif settings["position"] == "above":
+        elif settings.position == "above":
             position = channel.position
         else:
             position = discord.utils.MISSING
 
-        # SUBSTITUTION
-        if "@user" in name:
-            name = name.replace("@user", member.display_name)
-
-        if "@position" in name:
-            channels = [c for c in category.voice_channels if c.id in self.channels]
-            name = name.replace("@position", str(len(channels) + 1))
-
-        name = re.sub(r"@\[([^\]]+)\]", lambda m: random.choice(m[1].split(",")), name)
+        # SUBSTITUTION, BLACKLISTED WORDS AND OVERFLOW
+        template = settings.template
+        count = 0
+        if template.uses_position:
+            count = self.channel_index.count(member.guild.id, category.id if category else None)
+        name = template.render(member.display_name, count + 1, censor=self.get_censor(member.guild.id))
 
         # -------------------------------------------------
         # NO LONGER SUPPORTED DUE TO MISSING INTENTS
@@ -159,17 +655,8 @@ class Bot(commands.Bot):
         #         name = name.replace('@game', 'no game')
         # -------------------------------------------------
 
-        # BLACKLISTED WORDS
-        blacklist = self.blacklists.get(str(member.guild.id), [])
-        for word in blacklist:
-            if word.casefold() in name.casefold():
-                name = re.sub(word, '*' * len(word), name, flags=re.IGNORECASE)
-
-        # OVERFLOW
-        if len(name) > 100:
-            name = name[:97] + '...'
-
-        overwrites = channel.overwrites
+        overwrites = dict(settings.overwrites)
+        overwrites.pop(discord.Object(member.id), None)  # the lobby's overwrite for them if they weren't cached yet
         overwrites[member] = discord.PermissionOverwrite(
             manage_channels=True,
             view_channel=True,
@@ -177,59 +664,274 @@ class Bot(commands.Bot):
             speak=True
         )
 
-        new_channel = await member.guild.create_voice_channel(
-            name=name,
-            category=category,
-            position=position,
-            bitrate=settings["bitrate"],
-            user_limit=settings["limit"],
-            rtc_region=channel.rtc_region,
-            video_quality_mode=channel.video_quality_mode,
-            overwrites=overwrites
+        # channels are tracked before the member is moved, they can leave again before the move returns
+        pooled = self.pool.take(channel.id)
+        if pooled is not None:
+            self.loop.create_task(self.refill(channel))
+            self.channel_index.add(pooled)  # already in self.channels since the refill
+            if settings.grace:
+                self.graces[pooled.id] = settings.grace
+            new_channel = await self.claim(member, pooled, name=name, overwrites=overwrites, position=position)
+            if new_channel is None:
+                return
+            JOIN_SECONDS.observe(time.perf_counter() - joined, "pool")
+        else:
+            new_channel = await self.api.submit(
+                member.guild.id,
+                api.CREATE,
+                member.guild.create_voice_channel,
+                key=("join", member.id),
+                name=name,
+                category=category,
+                position=position,
+                bitrate=settings.bitrate,
+                user_limit=settings.limit,
+                rtc_region=channel.rtc_region,
+                video_quality_mode=channel.video_quality_mode,
+                overwrites=overwrites
+            )
+            if new_channel is None:
+                return  # left the lobby while the channel was still queued
+
+            if member.voice is None or member.voice.channel != channel:
+                # left while the channel was being created, nobody is going to use it
+                await self.api.submit(member.guild.id, api.DELETE, new_channel.delete)
+                return
+            self.channel_index.add(new_channel)  # first, so the store can resolve its guild
+            self.channels.add(new_channel.id)
+            if settings.grace:
+                self.graces[new_channel.id] = settings.grace
+            try:
+                await self.api.submit(member.guild.id, api.MOVE, member.move_to, new_channel)
+            except discord.HTTPException:
+                await self.api.submit(member.guild.id, api.DELETE, new_channel.delete)
+                raise
+            JOIN_SECONDS.observe(time.perf_counter() - joined, "create")
+        return new_channel
+
+    async def claim(self, member, channel, *, position, **kwargs):
+        """Hands a pooled channel to a member.
+
+        Members can be moved into channels they can't see, so the move doesn't wait for the edit
+        that renames the channel and gives them access.
+        """
+        if position is not discord.utils.MISSING:
+            kwargs["position"] = position
+
+        async def move_to():
+            await member.move_to(channel)
+            return channel
+
+        moved, edited = await asyncio.gather(
+            self.api.submit(member.guild.id, api.MOVE, move_to, key=("join", member.id)),
+            self.api.submit(member.guild.id, api.CREATE, channel.edit, **kwargs),
+            return_exceptions=True
         )
+        if moved is channel and not isinstance(edited, Exception):
+            return channel
 
-        await member.move_to(new_channel)
-        self.channels.append(new_channel.id)
-        await self.channels.save()
+        await self.api.submit(member.guild.id, api.DELETE, channel.delete)
+        for result in (moved, edited):
+            if isinstance(result, Exception):
+                raise result
 
     async def on_voice_leave(self, channel):
         if channel.id in self.channels:
             if len(channel.members) == 0:
-                await channel.delete()
-                # no need to remove from self.channels because of on_guild_channel_delete
+                self.sweeper.mark(channel, self.graces.get(channel.id, 0))
+
+    async def sweep(self, channels):
+        """Deletes channels that stayed empty, the tracked channels are saved once for all of them"""
+        channels = [c for c in channels if c.id in self.channels and len(c.members) == 0]
+        for channel in channels:
+            # untracked first, so on_guild_channel_delete doesn't save for every single one
+            self.channels.discard(channel.id)
+            self.channel_index.discard(channel.id)
+            self.graces.pop(channel.id, None)
+        results = await asyncio.gather(
+            *(self.api.submit(channel.guild.id, api.DELETE, channel.delete) for channel in channels),
+            return_exceptions=True
+        )
+        for channel, result in zip(channels, results):
+            if isinstance(result, Exception) and not isinstance(result, discord.NotFound):
+                print("sweep: deleting", channel.id, "failed -", result)
+                self.channel_index.add(channel)
+                self.channels.add(channel.id)
+        if channels:
+            await self.channels.save()
 
     async def on_voice_state_update(self, member, before, after):
+        self.last_event = time.time()
+        with VOICE_SECONDS.time():
+            await self.handle_voice_state(member, before, after)
+
+    async def handle_voice_state(self, member, before, after):
         if before.channel != after.channel:
             if before.channel is not None:
                 # check for delted channel
                 if member.guild.get_channel(before.channel.id) is None:
                     return
+                if str(before.channel.id) in self.configs:
+                    self.api.cancel(("join", member.id))
                 await self.on_voice_leave(before.channel)
             if after.channel is not None:
                 await self.on_voice_join(member, after.channel)
 
+    async def on_guild_channel_update(self, before, after):
+        if before.category_id != after.category_id:
+            self.channel_index.move(after)
+        self.settings.pop(after.id, None)  # defaults and overwrites come from the lobby itself
+
+    async def on_guild_role_delete(self, role):
+        self.forget_settings(role.guild.id)
+
     async def on_guild_channel_delete(self, channel):
+        self.pool.discard(channel.id)
+        if isinstance(channel, discord.CategoryChannel):
+            self.forget_settings(channel.guild.id)
+        self.sweeper.forget(channel.id)
+        self.graces.pop(channel.id, None)
         if channel.id in self.channels:
             self.channels.remove(channel.id)
+            self.channel_index.discard(channel.id)
             await self.channels.save()
 
         key = str(channel.id)
         if key in self.configs:
             self.configs.pop(key)
+            self.lobby_index.discard(channel.id)
+            self.settings.pop(channel.id, None)
+            await self.reset_pool(channel)
             await self.configs.save()
 
-    async def on_guild_remove(self, guild):
-        with suppress(KeyError):
-            self.blacklists.pop(str(guild.id))
+    async def on_guild_available(self, guild):
+        # lobbies of guilds that were unavailable during prepare aren't indexed yet, prepare clears the index anyway
+        self.index_guild(guild)
+        if self.prepared and (guild.id in self.unadopted or self.unpartitioned):
+            self.returned.add(guild.id)
+            self.start_catching_up()
 
+    def index_guild(self, guild):
+        """Indexes the lobbies of a guild and the dynamic channels adopted since prepare"""
         for channel in guild.voice_channels:
-            if channel.id in self.channels:
-                self.channels.remove(channel.id)
             if str(channel.id) in self.configs:
-                self.configs.pop(str(channel.id))
+                self.lobby_index.add(guild.id, channel.id)
+            elif channel.id in self.channels and channel.id not in self.channel_index:
+                self.channel_index.add(channel)
+                if len(channel.members) == 0:
+                    self.sweeper.mark(channel, self.graces.get(channel.id, 0))
 
-        await self.channels.save()
-        await self.configs.save()
+    async def on_guild_remove(self, guild):
+        if guild.id in self.unadopted:
+            self.unadopted.discard(guild.id)
+            self.write_unadopted()
+        self.forget_guild(guild.id)
+        if self.database is not None:
+            await self.forget_stored(guild.id)
+        await asyncio.gather(*(store.save() for store in self.stores))
+
+    def forget_guild(self, guild_id):
+        """Drops every record of a guild through the indexes, the guild's channels may not be cached anymore"""
+        self.blacklists.pop(str(guild_id), None)
+        self.limits.pop(str(guild_id), None)
+        self.censors.pop(guild_id, None)
+        for lobby_id in self.lobby_index.pop(guild_id):
+            self.forget_lobby(lobby_id)  # the pooled channels went away with the guild
+        for channel_id in self.channel_index.guild(guild_id):
+            self.forget_channel(channel_id)
+        if self.storage == "guilds":
+            self.partitions.drop(guild_id)
+
+    async def forget_stored(self, guild_id):
+        """Drops the lobbies and channels sqlite has written for a guild, including those the indexes never saw"""
+        for key in await self.configs.guild(guild_id):
+            self.forget_lobby(int(key))
+        for channel_id in await self.channels.guild(guild_id):
+            self.forget_channel(channel_id)
+
+    def forget_lobby(self, lobby_id):
+        """Drops a lobby's config and returns the channels that were pooled for it"""
+        self.configs.pop(str(lobby_id), None)
+        self.lobby_index.discard(lobby_id)
+        self.settings.pop(lobby_id, None)
+        pooled = self.pool.drain(lobby_id)
+        for channel in pooled:
+            self.channels.discard(channel.id)
+        return pooled
+
+    def forget_channel(self, channel_id):
+        self.channels.discard(channel_id)
+        self.channel_index.discard(channel_id)
+        self.sweeper.forget(channel_id)
+        self.graces.pop(channel_id, None)
+
+    def orphans(self):
+        """Stored guilds, lobbies and channels the cache doesn't know, e.g. deleted while the bot was offline"""
+        live = {guild.id: guild for guild in self.guilds}
+        stored = set(self.lobby_index.guilds) | set(self.channel_index.guilds)
+        if self.storage == "guilds":
+            stored |= self.partitions.known
+        else:
+            stored |= {int(key) for key in self.blacklists} | {int(key) for key in self.limits}
+        guild_ids = stored - live.keys()
+
+        # a config is only purged once its guild is there and doesn't have the lobby, configs that were
+        # never indexed could belong to a guild that is still unavailable
+        lobby_ids = [
+            lobby_id
+            for guild_id, lobbies in self.lobby_index.guilds.items() if guild_id in live and not live[guild_id].unavailable
+            for lobby_id in lobbies if live[guild_id].get_channel(lobby_id) is None
+        ]
+
+        channel_ids = [
+            channel_id
+            for channel_id, (guild_id, _) in self.channel_index.locations.items()
+            if guild_id in live and not live[guild_id].unavailable and live[guild_id].get_channel(channel_id) is None
+        ]
+        channel_ids.extend(c for c in self.channels if c not in self.channel_index and c not in self.pool)
+        return guild_ids, lobby_ids, channel_ids
+
+    async def collect_orphans(self, *, batch=ORPHAN_BATCH):
+        """Purges the records :meth:`orphans` finds, writing the stores after every ``batch`` of them"""
+        stats = collections.Counter()
+        guild_ids, lobby_ids, channel_ids = self.orphans()
+        work = [
+            *((self.forget_guild, guild_id, "guilds") for guild_id in guild_ids),
+            *((self.forget_lobby, lobby_id, "lobbies") for lobby_id in lobby_ids),
+            *((self.forget_channel, channel_id, "channels") for channel_id in channel_ids),
+        ]
+        for start in range(0, len(work), batch):
+            deletes = []
+            for func, key, kind in work[start:start + batch]:
+                pooled = func(key)
+                if kind == "guilds" and self.database is not None:
+                    await self.forget_stored(key)
+                if pooled:
+                    deletes.extend(self.api.submit(c.guild.id, api.DELETE, c.delete) for c in pooled)
+                stats[kind] += 1
+                ORPHANS.inc(kind)
+            for store in self.stores:
+                await store.flush()
+            await asyncio.gather(*deletes, return_exceptions=True)
+        return stats
+
+    async def collect_loop(self, interval=ORPHAN_INTERVAL):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                stats = await self.collect_orphans()
+            except Exception as error:
+                print("orphan collection failed -", error)
+            else:
+                if stats:
+                    print("orphans:", ", ".join(f"{kind} {count}" for kind, count in stats.items()))
 
     async def on_slash_command_error(self, ctx, error):
         await ctx.send(str(error), ephemeral=True)
+
+
+MIGRATIONS = (Bot.migrate_positions,)
+
+
+class ShardedBot(Bot, commands.AutoShardedBot):
+    """Runs the shards in ``shard_ids`` out of ``shard_count``, see :mod:`bot.cluster`"""
@@ -0,0 +1,182 @@
+"""Runs the bot as several processes, each one owning a contiguous range of shards.
+
+A guild always lives on the same shard, so every cluster keeps its own data directory
+and no file is ever written by two processes.
+
+Which shard a guild lives on depends on the shard count, so the directories belong to a
+generation of one shard and cluster count. Changing either starts a new generation, whose
+clusters adopt their guilds from the directories of the one before. Those aren't written
+anymore, so nothing changes under the adopting clusters. Guilds that are unavailable while a
+cluster adopts are adopted once they are back, until then their records stay where they were.
+"""
+import json
+import multiprocessing
+import os
+import time
+
+
+def shard_of(guild_id, shard_count):
+    return (guild_id >> 22) % shard_count
+
+
+def partition(shard_count, clusters):
+    return [list(range(i * shard_count // clusters, (i + 1) * shard_count // clusters)) for i in range(clusters)]
+
+
+def cluster_of(shard_id, shard_count, clusters):
+    return next(index for index, shard_ids in enumerate(partition(shard_count, clusters)) if shard_id in shard_ids)
+
+
+class Layout:
+    """The shard and cluster counts of every generation so far, the last one is the current one.
+
+    Cluster ``i`` of generation ``g`` keeps its data in ``path/generation-g/cluster-i``, ``path``
+    itself is where the bot kept its data before it was clustered.
+    """
+
+    __slots__ = ("path", "generations", "unadopted")
+
+    def __init__(self, path, generations):
+        self.path = path
+        self.generations = generations
+        self.unadopted = {}  # directory -> guilds it hasn't adopted yet, read once
+
+    @property
+    def generation(self):
+        return len(self.generations)
+
+    def directory(self, index, generation=None):
+        return os.path.join(self.path, f"generation-{generation or self.generation}", f"cluster-{index}")
+
+    def locate(self, guild_id):
+        """The directory a guild's records were last written to.
+
+        That is the newest earlier generation whose cluster for the guild adopted it, a cluster
+        that never got that far left them where they were.
+        """
+        for generation in range(self.generation - 1, 0, -1):
+            shard_count, clusters = self.generations[generation - 1]
+            directory = self.directory(cluster_of(shard_of(guild_id, shard_count), shard_count, clusters), generation)
+            if os.path.exists(os.path.join(directory, "adopted")):
+                return directory
+            if directory not in self.unadopted:
+                self.unadopted[directory] = unadopted(directory)
+            pending = self.unadopted[directory]
+            if pending is not None and guild_id not in pending:
+                return directory
+        return self.path
+
+
+def unadopted(directory):
+    """The guilds a cluster hasn't adopted yet, ``None`` if it never got to adopt any"""
+    path = os.path.join(directory, "unadopted.json")
+    if not os.path.exists(path):
+        return None
+    with open(path) as file:
+        return set(json.load(file))
+
+
+def layout(path, shard_count, clusters):
+    """Loads the layout kept in ``path``, starting a new generation if the counts changed"""
+    file = os.path.join(path, "layout.json")
+    generations = []
+    if os.path.exists(file):
+        with open(file) as f:
+            generations = [tuple(counts) for counts in json.load(f)]
+    if not generations or generations[-1] != (shard_count, clusters):
+        generations.append((shard_count, clusters))
+        if not os.path.exists(path):
+            os.makedirs(path)
+        with open(file + ".tmp", "w") as f:
+            json.dump(generations, f)
+        os.replace(file + ".tmp", file)
+    return Layout(path, generations)
+
+
+def run_cluster(token, shard_ids, shard_count, path, legacy, options):
+    from . import client
+
+    bot = client.ShardedBot(shard_ids=shard_ids, shard_count=shard_count, path=path, legacy=legacy, **options)
+    bot.run(token)
+
+
+class Supervisor:
+    """Starts one process per cluster and restarts the ones that crash.
+
+    A cluster that exits cleanly is left alone, one that crashes more than ``max_restarts``
+    times within ``window`` seconds is given up on.
+    """
+
+    def __init__(self, target, clusters, *, max_restarts=5, window=300.0, backoff=5.0):
+        self.target = target
+        self.clusters = clusters
+        self.max_restarts = max_restarts
+        self.window = window
+        self.backoff = backoff
+        self.context = multiprocessing.get_context("spawn")
+        self.processes = {}
+        self.crashes = {index: [] for index in range(len(clusters))}
+
+    def start(self, index):
+        process = self.context.Process(target=self.target, args=self.clusters[index], name=f"cluster-{index}")
+        process.start()
+        self.processes[index] = process
+        print(f"cluster {index} started (pid {process.pid})")
+
+    def run(self):
+        for index in range(len(self.clusters)):
+            self.start(index)
+        restarts = {}
+        try:
+            while self.processes or restarts:
+                time.sleep(0.5)
+                now = time.monotonic()
+                for index, when in list(restarts.items()):
+                    if when <= now:
+                        del restarts[index]
+                        self.start(index)
+
+                for index, process in list(self.processes.items()):
+                    if process.is_alive():
+                        continue
+                    del self.processes[index]
+                    if process.exitcode == 0:
+                        print(f"cluster {index} exited")
+                        continue
+
+                    crashes = self.crashes[index] = [t for t in self.crashes[index] if now - t < self.window] + [now]
+                    if len(crashes) > self.max_restarts:
+                        print(f"cluster {index} crashed {len(crashes)} times in {self.window:.0f}s, giving up")
+                        continue
+                    print(f"cluster {index} crashed with exit code {process.exitcode}, restarting")
+                    restarts[index] = now + self.backoff * (len(crashes) - 1)
+        finally:
+            for process in self.processes.values():
+                process.terminate()
+            for process in self.processes.values():
+                process.join()
+
+
+def cluster_options(options, index):
+    if options.get("metrics_port") is None:
+        return options
+    return {**options, "metrics_port": options["metrics_port"] + index}  # one endpoint per process
+
+
+def cluster_args(token, *, shard_count, clusters, path="./data", **options):
+    """The arguments of :func:`run_cluster` for each cluster, see :func:`launch`"""
+    legacy = layout(path, shard_count, clusters)
+    return [
+        (token, shard_ids, shard_count, legacy.directory(index), legacy, cluster_options(options, index))
+        for index, shard_ids in enumerate(partition(shard_count, clusters))
+    ]
+
+
+def launch(token, *, shard_count, clusters, path="./data", **options):
+    """Runs ``clusters`` processes sharing ``shard_count`` shards.
+
+    Data that was written before clustering stays in ``path``, each cluster copies its own guilds
+    out of it once, and again out of the previous generation's directories after the counts change.
+    Cluster ``i`` serves its metrics on ``metrics_port + i``.
+    """
+    Supervisor(run_cluster, cluster_args(token, shard_count=shard_count, clusters=clusters, path=path, **options)).run()
@@ -16,6 +16,7 @@ async def child_add(ctx, word: str):
         raise commands.BadArgument("This word is already blacklisted")
     blacklist.append(word)
     ctx.bot.blacklists[str(ctx.guild.id)] = blacklist
+    ctx.bot.censors.pop(ctx.guild.id, None)
     await ctx.bot.blacklists.save()
     await ctx.send("The word has been blacklisted")
 
@@ -31,6 +32,7 @@ async def child_remove(ctx, word: str):
         ctx.bot.blacklists[str(ctx.guild.id)] = blacklist
     else:
         ctx.bot.blacklists.pop(str(ctx.guild.id))
+    ctx.bot.censors.pop(ctx.guild.id, None)
     await ctx.bot.blacklists.save()
     await ctx.send("Removed the word from the Blacklist")
 
@@ -42,6 +44,7 @@ async def child_clear(ctx):
         del ctx.bot.blacklists[str(ctx.guild.id)]
     except KeyError:
         raise commands.CommandError("You haven't added any words to the blacklist yet")
+    ctx.bot.censors.pop(ctx.guild.id, None)
     await ctx.bot.blacklists.save()
     await ctx.send("Blacklist has been cleared.")
 
@@ -1,3 +1,5 @@
+import io
+
 import disnake as discord
 from disnake.ext import commands
 import psutil
@@ -42,6 +44,9 @@ async def child_info(ctx):
         cpu_usage = proc.cpu_percent() / psutil.cpu_count()
     embed.add_field(name="Servers", value=str(len(ctx.bot.guilds)))
     embed.add_field(name="Channels", value=str(len(ctx.bot.channels)))
+    stores = ctx.bot.stores
+    embed.add_field(name="Disk writes", value=f"{sum(s.performed for s in stores)} / {sum(s.requested for s in stores)} saves")
+    embed.add_field(name="API queue", value=f"{ctx.bot.api.depth()} queued, p99 wait {ctx.bot.api.wait_percentile(99) * 1000:.0f} ms")
     embed.add_field(name="Latency", value=f"{round(ctx.bot.latency * 1000, 2)} ms")
     embed.add_field(name="Uptime", value=str(uptime))
     embed.add_field(name="CPU usage", value=f"{round(cpu_usage)}%")
@@ -49,6 +54,22 @@ async def child_info(ctx):
     await ctx.send(embed=embed)
 
 
+@parent.sub_command(name="profile")
+@commands.is_owner()
+async def child_profile(
+    ctx,
+    seconds: int = commands.Param(default=30, min_value=1, max_value=300),
+    memory: bool = commands.Param(default=True, description="Also trace allocations, slows the bot down while it runs")
+):
+    """Samples where the bot spends its time and what it allocates"""
+    if ctx.bot.profiler.running:
+        raise commands.BadArgument("A profile is already being taken")
+    await ctx.response.defer(ephemeral=True)
+    profile = await ctx.bot.profiler.run(seconds, memory=memory)
+    report = discord.File(io.BytesIO(profile.format().encode()), filename="profile.txt")
+    await ctx.send(profile.summary(), file=report, ephemeral=True)
+
+
 @parent.sub_command(name="support")
 async def child_support(ctx):
     """Gives you the github repo link"""
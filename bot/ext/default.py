@@ -1,6 +1,8 @@
 import disnake as discord
 from disnake.ext import commands
 
+from ..utils.template import Template, TemplateError
+
 
 class Default(commands.Cog):
     def __init__(self, bot):
@@ -8,11 +10,16 @@ class Default(commands.Cog):
 
     async def configure(self, channel, key, value):
         try:
-            self.bot.configs[str(channel.id)][key] = value
+            config = self.bot.configs[str(channel.id)]
         except KeyError:
             raise commands.BadArgument("This channel has not been added yet")
         else:
+            config[key] = value
+            self.bot.configs[str(channel.id)] = config  # reassigned so the journal picks it up
+            self.bot.settings.pop(channel.id, None)
             await self.bot.configs.save()
+            if key not in ("name", "grace"):
+                self.bot.loop.create_task(self.bot.reset_pool(channel))  # pooled channels were made with the old settings
 
     @commands.slash_command(name="default")
     @commands.has_guild_permissions(manage_guild=True)
@@ -23,6 +30,10 @@ class Default(commands.Cog):
     @parent.sub_command(name="name")
     async def child_name(self, ctx, channel: discord.VoiceChannel, name: str):
         """Sets the default name of an dynamic-voice-channel. See help for more features."""
+        try:
+            Template(name, strict=True)
+        except TemplateError as error:
+            raise commands.BadArgument(str(error))
         await self.configure(channel, "name", name)
         await ctx.send(f"Default name has been set to `{name}`")
 
@@ -53,6 +64,28 @@ class Default(commands.Cog):
         await self.configure(channel, "category", category.id)
         await ctx.send(f"Default category has been set to `{category.name}`")
 
+    @parent.sub_command(name="pool")
+    async def child_pool(self, ctx, channel: discord.VoiceChannel, size: int = commands.Param(min_value=0, max_value=10)):
+        """Keeps hidden channels ready so joining members don't wait for a new one. 0 disables it."""
+        await self.configure(channel, "pool", size)
+        await ctx.send(f"Pool size has been set to `{size}`")
+
+    @parent.sub_command(name="grace")
+    async def child_grace(self, ctx, channel: discord.VoiceChannel, seconds: int = commands.Param(min_value=0, max_value=3600)):
+        """Keeps empty channels around for a while so members can reconnect. 0 deletes them right away."""
+        await self.configure(channel, "grace", seconds)
+        await ctx.send(f"Empty channels are now deleted after `{seconds}` seconds")
+
+    @parent.sub_command(name="ratelimit")
+    async def child_ratelimit(self, ctx, joins: int = commands.Param(min_value=0, max_value=50), seconds: int = commands.Param(min_value=1, max_value=3600)):
+        """Sets how many channels a member can create in the given time. 0 joins disables it."""
+        self.bot.limits[str(ctx.guild.id)] = {"rate": joins, "per": seconds}
+        await self.bot.limits.save()
+        if joins == 0:
+            await ctx.send("Members are no longer rate limited")
+        else:
+            await ctx.send(f"Members can now create `{joins}` channel(s) every `{seconds}` seconds")
+
 
 def setup(bot):
     bot.add_cog(Default(bot))
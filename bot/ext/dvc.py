@@ -1,6 +1,10 @@
+import re
+
 import disnake as discord
 from disnake.ext import commands
 
+from ..utils.menu import Menu
+
 
 not_added = commands.BadArgument("This channel has not been added yet")
 no_added = commands.BadArgument("You haven't added any channels yet")
@@ -20,81 +24,129 @@ async def child_setup(ctx):
     category = await ctx.guild.create_category("Dynamic Voice Channels")
     channel = await category.create_voice_channel("join me")
     ctx.bot.configs[str(channel.id)] = {}
+    ctx.bot.lobby_index.add(ctx.guild.id, channel.id)
     await ctx.bot.configs.save()
     await ctx.send(f"A new category and a new channel have been created. Join `{channel.name}` and try it out")
 
 
+def get_lobbies(ctx, channel, category, channels):
+    """The voice channels a command was given, one or all in a category or a list of mentions and ids"""
+    if channel is None and category is None and channels is None:
+        raise commands.BadArgument("Give me a channel, a category or a list of channels")
+    lobbies = {}
+    if channel is not None:
+        lobbies[channel.id] = channel
+    if category is not None:
+        lobbies.update((c.id, c) for c in category.voice_channels)
+    for channel_id in re.findall(r"\d{15,20}", channels or ""):
+        listed = ctx.guild.get_channel(int(channel_id))
+        if not isinstance(listed, discord.VoiceChannel):
+            raise commands.BadArgument(f"`{channel_id}` is not a voice channel in this server")
+        lobbies[listed.id] = listed
+    # the dynamic channels themselves can't become lobbies
+    return [c for c in lobbies.values() if c.id not in ctx.bot.channels]
+
+
+def forget(bot, lobbies):
+    """Removes lobbies without saving, so a whole batch is saved at once"""
+    for channel in lobbies:
+        del bot.configs[str(channel.id)]
+        bot.lobby_index.discard(channel.id)
+        bot.settings.pop(channel.id, None)
+        bot.loop.create_task(bot.reset_pool(channel))
+
+
 @parent.sub_command(name="add")
-async def child_add(ctx, channel: discord.VoiceChannel):
-    """Adds a voice channel to the dynamic-voice-channels"""
-    if str(channel.id) in ctx.bot.configs:
-        raise commands.BadArgument("This channel has already been added")
-    else:
-        limit = 25  # message embed limit -> non-paginated list command
-        channels = [c for c in ctx.guild.voice_channels if str(c.id) in ctx.bot.configs]
-        if len(channels) >= limit:
-            raise commands.CommandError(f"You cannot add more than {limit} auto-channels")
-        else:
-            ctx.bot.configs[str(channel.id)] = {}
-            await ctx.bot.configs.save()
-            await ctx.send("Channel has been added")
+async def child_add(
+    ctx,
+    channel: discord.VoiceChannel = None,
+    category: discord.CategoryChannel = commands.Param(default=None, description="Adds every voice channel in it"),
+    channels: str = commands.Param(default=None, description="Mentions or IDs of voice channels")
+):
+    """Adds voice channels to the dynamic-voice-channels"""
+    lobbies = [c for c in get_lobbies(ctx, channel, category, channels) if str(c.id) not in ctx.bot.configs]
+    if not lobbies:
+        raise commands.BadArgument("These channels have already been added")
+    for lobby in lobbies:
+        ctx.bot.configs[str(lobby.id)] = {}
+        ctx.bot.lobby_index.add(ctx.guild.id, lobby.id)
+    await ctx.bot.configs.save()
+    await ctx.send("Channel has been added" if len(lobbies) == 1 else f"{len(lobbies)} channels have been added")
 
 
 @parent.sub_command(name="remove")
-async def child_remove(ctx, channel: discord.VoiceChannel):
-    """Removes a voice channel from the dynamic-voice-channels"""
-    try:
-        del ctx.bot.configs[str(channel.id)]
-    except KeyError:
+async def child_remove(
+    ctx,
+    channel: discord.VoiceChannel = None,
+    category: discord.CategoryChannel = commands.Param(default=None, description="Removes every voice channel in it"),
+    channels: str = commands.Param(default=None, description="Mentions or IDs of voice channels")
+):
+    """Removes voice channels from the dynamic-voice-channels"""
+    lobbies = [c for c in get_lobbies(ctx, channel, category, channels) if str(c.id) in ctx.bot.configs]
+    if not lobbies:
         raise not_added
-    else:
-        await ctx.bot.configs.save()
-        await ctx.send("Channel has been removed")
+    forget(ctx.bot, lobbies)
+    await ctx.bot.configs.save()
+    await ctx.send("Channel has been removed" if len(lobbies) == 1 else f"{len(lobbies)} channels have been removed")
 
 
 @parent.sub_command(name="clear")
 async def child_clear(ctx):
     """Automatically clears all dynamic-voice-channels"""
-    n = 0
-    for channel in ctx.guild.voice_channels:
-        try:
-            del ctx.bot.configs[str(channel.id)]
-        except KeyError:
-            continue
-        else:
-            n += 1
-    if n == 0:
+    lobby_ids = ctx.bot.lobby_index.guilds.get(ctx.guild.id)
+    if not lobby_ids:
         raise no_added
-    else:
-        await ctx.bot.configs.save()
-        await ctx.send(f"Successfully removed {n} channel(s)")
+    n = len(lobby_ids)
+    lobbies = []
+    for lobby_id in list(lobby_ids):
+        lobby = ctx.guild.get_channel(lobby_id)
+        if lobby is None:
+            ctx.bot.forget_lobby(lobby_id)  # deleted while the bot was offline
+        else:
+            lobbies.append(lobby)
+    forget(ctx.bot, lobbies)
+    await ctx.bot.configs.save()
+    await ctx.send(f"Successfully removed {n} channel(s)")
 
 
-@parent.sub_command(name="list")
-async def child_list(ctx):
-    """Lists all dynamic-voice-channels including their settings"""
-    channels = [c for c in ctx.guild.voice_channels if str(c.id) in ctx.bot.configs]
-    if len(channels) == 0:
-        raise no_added
-    else:
+class LobbyMenu(Menu):
+    def __init__(self, bot, lobbies, *, per_page):
+        super().__init__(lobbies, per_page=per_page)
+        self.bot = bot
+
+    def format_page(self, page):
         embed = discord.Embed(
             title="Dynamic-Voice-Channels",
             description="Here is a list with all dynamic-voice-channels in this server:",
             color=discord.Color.blue()
         )
-        for channel in channels:
-            settings = ctx.bot.get_settings(channel)
-            category = ctx.guild.get_channel(settings["category"])
+        for channel in self.get_entries(page):
+            settings = self.bot.get_settings(channel)
+            category = settings.category_channel
             embed.add_field(
                 name=f"{channel.name} (ID: {channel.id})",
                 value=f"Category: `{'no category' if category is None else category.name}`\n"
-                      f"Name: `{settings['name']}`\n"
-                      f"Limit: `{settings['limit']} users`\n" 
-                      f"Bitrate: `{settings['bitrate']} kbps`\n"
-                      f"Position: `{settings['position']}`",
+                      f"Name: `{settings.name}`\n"
+                      f"Limit: `{settings.limit} users`\n" 
+                      f"Bitrate: `{settings.bitrate} kbps`\n"
+                      f"Position: `{settings.position}`\n"
+                      f"Pool: `{settings.pool} channels`\n"
+                      f"Grace: `{settings.grace} seconds`",
                 inline=False
             )
-        await ctx.send(embed=embed)
+        return embed
+
+
+@parent.sub_command(name="list")
+async def child_list(ctx):
+    """Lists all dynamic-voice-channels including their settings"""
+    lobbies = (ctx.guild.get_channel(lobby_id) for lobby_id in ctx.bot.lobby_index.guilds.get(ctx.guild.id, ()))
+    lobbies = sorted((c for c in lobbies if c is not None), key=lambda c: c.position)
+    if len(lobbies) == 0:
+        raise no_added
+    else:
+        menu = LobbyMenu(ctx.bot, lobbies, per_page=5)
+        await menu.send_initial(ctx)
 
 
 def setup(bot):
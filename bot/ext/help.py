@@ -1,6 +1,8 @@
 import disnake as discord
 from disnake.ext import commands
-import difflib
+
+from ..utils.menu import Menu
+from ..utils.search import Index
 
 
 def get_command_info(cmd):
@@ -10,75 +12,54 @@ def get_command_info(cmd):
         return cmd.qualified_name, cmd.option.description
 
 
-class HelpMenu(discord.ui.View):
-    def __init__(self, cmds, *, per_page):
-        super().__init__()
-        self.cmds = list(cmds)
-        self.per_page = per_page
-        self.page = 0
-        self.pages = (len(self.cmds) + per_page - 1) // per_page
+class HelpIndex:
+    """Everything /help shows, built once for the registered commands and rebuilt when they change"""
 
-        self.add_item(discord.ui.Button(label="Wiki", emoji="📚", url="https://github.com/Pawl-Patrol/Dynamic-Voice-Channels/wiki"))
-        self.add_item(discord.ui.Button(label="Issues", url="https://github.com/Pawl-Patrol/Dynamic-Voice-Channels/issues"))
-        self.add_item(discord.ui.Button(label="Source", url="https://github.com/Pawl-Patrol/Dynamic-Voice-Channels"))
+    def __init__(self, key, cmds, *, per_page):
+        self.key = key
+        self.commands = {}
+        for cmd in sorted(cmds, key=lambda c: get_command_info(c)[0]):
+            name, description = get_command_info(cmd)
+            self.commands[name] = description
+        self.search = Index(self.commands)
 
-    def format_page(self, page):
+        self.embeds = {
+            name: discord.Embed(title=f"/{name}", description=description)
+            for name, description in self.commands.items()
+        }
+        names = list(self.commands)
+        self.pages = [self.render(names[i:i + per_page]) for i in range(0, len(names), per_page)]
+
+    def render(self, names):
         embed = discord.Embed(
             title="Help",
             description="Use `/help <command>` for more info on a command."
         )
-        idx = self.page * self.per_page
-        for cmd in self.cmds[idx:(min(idx + self.per_page, len(self.cmds)))]:
-            name, description = get_command_info(cmd)
+        for name in names:
             embed.add_field(
                 name=f"/{name}",
-                value=description or "No description",
+                value=self.commands[name] or "No description",
                 inline=False
             )
-        embed.set_footer(text=f"Page {self.page + 1} of {self.pages}")
         return embed
 
-    def update(self):
-        self.previous.disabled = self.page == 0
-        self.first.disabled = self.page < 2
-        self.next.disabled = self.page == (self.pages - 1)
-        self.last.disabled = self.page > (self.pages - 3)
-
-        return self.format_page(self.page)
-
-    async def send_initial(self, ctx):
-        await ctx.response.send_message(embed=self.update(), view=self)
-
-    @discord.ui.button(emoji="⏮️", style=discord.ButtonStyle.secondary)
-    async def first(self, button, ctx):
-        self.page = 0
-        await ctx.response.edit_message(embed=self.update(), view=self)
 
-    @discord.ui.button(emoji="◀️", style=discord.ButtonStyle.secondary)
-    async def previous(self, button, ctx):
-        self.page -= 1
-        await ctx.response.edit_message(embed=self.update(), view=self)
+class HelpMenu(Menu):
+    def __init__(self, index):
+        super().__init__(index.pages, per_page=1)
+        self.index = index
 
-    @discord.ui.button(emoji="⏹️", style=discord.ButtonStyle.secondary)
-    async def close(self, button, ctx):
-        self.clear_items()
-        await ctx.response.edit_message(embed=self.update(), view=self)
-        self.stop()
-
-    @discord.ui.button(emoji="▶️", style=discord.ButtonStyle.secondary)
-    async def next(self, button, ctx):
-        self.page += 1
-        await ctx.response.edit_message(embed=self.update(), view=self)
+        self.add_item(discord.ui.Button(label="Wiki", emoji="📚", url="https://github.com/Pawl-Patrol/Dynamic-Voice-Channels/wiki"))
+        self.add_item(discord.ui.Button(label="Issues", url="https://github.com/Pawl-Patrol/Dynamic-Voice-Channels/issues"))
+        self.add_item(discord.ui.Button(label="Source", url="https://github.com/Pawl-Patrol/Dynamic-Voice-Channels"))
 
-    @discord.ui.button(emoji="⏭️", style=discord.ButtonStyle.secondary)
-    async def last(self, button, ctx):
-        self.page = self.pages - 1
-        await ctx.response.edit_message(embed=self.update(), view=self)
+    def format_page(self, page):
+        return self.index.pages[page]
 
 
-async def get_commands(ctx):
+def get_commands(bot):
     cmds = []
-    for cmd in ctx.bot.slash_commands:
+    for cmd in bot.all_slash_commands.values():
         if not cmd.children:
             cmds.append(cmd)
             continue
@@ -87,31 +68,36 @@ async def get_commands(ctx):
     return cmds
 
 
+index = None
+
+
+def get_index(bot):
+    """The help index, rebuilt when an extension was loaded or reloaded since it was built"""
+    global index
+    # reloading creates new command objects, the index holds on to the old ones so they can't be mistaken for them
+    key = tuple(bot.all_slash_commands.values())
+    if index is None or len(index.key) != len(key) or any(a is not b for a, b in zip(index.key, key)):
+        index = HelpIndex(key, get_commands(bot), per_page=4)
+    return index
+
+
 async def auto_complete(ctx, arg):
-    cmds = [get_command_info(cmd)[0] for cmd in await get_commands(ctx)]
-    results = difflib.get_close_matches(arg, cmds)
-    for cmd in cmds:
-        if arg in cmd and cmd not in results:
-            results.append(cmd)
-    return results
+    return get_index(ctx.bot).search.search(arg)
 
 
 @commands.slash_command(name="help")
 async def help_command(ctx, command: str = commands.Param(default=None, autocomplete=auto_complete)):
     """Shows you this"""
+    help_index = get_index(ctx.bot)
     if command is None:
-        menu = HelpMenu(await get_commands(ctx), per_page=4)
+        menu = HelpMenu(help_index)
         await menu.send_initial(ctx)
     else:
-        cmd = discord.utils.find(lambda c: get_command_info(c)[0] == command, await get_commands(ctx))
-        if not cmd:
+        embed = help_index.embeds.get(command)
+        if embed is None:
             await ctx.send("Command not found.", ephemeral=True)
         else:
-            name, description = get_command_info(cmd)
-            await ctx.send(embed=discord.Embed(
-                title=f"/{name}",
-                description=description
-            ))
+            await ctx.send(embed=embed)
 
 
 def setup(bot):
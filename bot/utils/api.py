@@ -0,0 +1,121 @@
+import asyncio
+import collections
+import heapq
+import itertools
+import time
+
+from . import metrics
+
+
+# lower runs first: waiting members are moved before new channels are created, deletes can wait
+MOVE = 0
+CREATE = 1
+DELETE = 2
+REFILL = 3
+PRIORITIES = {MOVE: "move", CREATE: "create", DELETE: "delete", REFILL: "refill"}
+
+CALL_SECONDS = metrics.Histogram("dvc_api_call_seconds", "Duration of API calls made through the scheduler", ("call",))
+QUEUE_SECONDS = metrics.Histogram("dvc_api_queue_seconds", "Time API calls spent waiting in their guild's queue", ("priority",))
+
+
+class Job:
+    __slots__ = ("func", "args", "kwargs", "key", "future", "queued_at", "dropped")
+
+    def __init__(self, func, args, kwargs, key, future):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.key = key
+        self.future = future
+        self.queued_at = time.monotonic()
+        self.dropped = False
+
+
+class Scheduler:
+    """Queues API calls per guild so a busy guild only competes with itself for its rate limit bucket"""
+
+    def __init__(self, *, per_guild=2, loop=None):
+        self.per_guild = per_guild
+        self.loop = loop or asyncio.get_event_loop()
+        self.queues = {}
+        self.running = collections.Counter()
+        self.keys = {}
+        self.sequence = itertools.count()
+
+        self.queued = 0
+        self.dropped = 0
+        self.processed = collections.Counter()
+        self.waits = collections.deque(maxlen=1000)
+
+    def submit(self, guild_id, priority, func, *args, key=None, **kwargs):
+        """Queues ``func(*args, **kwargs)`` and returns a future with its result.
+
+        A job submitted with a ``key`` can be dropped with :meth:`cancel` until it starts,
+        its future then resolves to ``None``.
+        """
+        if key is not None:
+            self.cancel(key)
+        job = Job(func, args, kwargs, key, self.loop.create_future())
+        if key is not None:
+            self.keys[key] = job
+        heapq.heappush(self.queues.setdefault(guild_id, []), (priority, next(self.sequence), job))
+        self.queued += 1
+        self._pump(guild_id)
+        return job.future
+
+    def cancel(self, key):
+        job = self.keys.pop(key, None)
+        if job is None:
+            return False
+        job.dropped = True  # stays in the heap until it is popped
+        if not job.future.done():
+            job.future.set_result(None)
+        self.queued -= 1
+        self.dropped += 1
+        return True
+
+    def _pump(self, guild_id):
+        queue = self.queues.get(guild_id)
+        while queue and self.running[guild_id] < self.per_guild:
+            priority, _, job = heapq.heappop(queue)
+            if job.dropped:
+                continue
+            if job.key is not None and self.keys.get(job.key) is job:
+                del self.keys[job.key]  # too late to cancel it
+            self.queued -= 1
+            self.running[guild_id] += 1
+            self.loop.create_task(self._run(guild_id, priority, job))
+        if not queue:
+            self.queues.pop(guild_id, None)
+
+    async def _run(self, guild_id, priority, job):
+        wait = time.monotonic() - job.queued_at
+        self.waits.append(wait)
+        QUEUE_SECONDS.observe(wait, PRIORITIES[priority])
+        start = time.perf_counter()
+        try:
+            result = await job.func(*job.args, **job.kwargs)
+        except Exception as error:
+            if not job.future.done():
+                job.future.set_exception(error)
+        else:
+            if not job.future.done():
+                job.future.set_result(result)
+        finally:
+            CALL_SECONDS.observe(time.perf_counter() - start, getattr(job.func, "__name__", "call"))
+            self.processed[priority] += 1
+            self.running[guild_id] -= 1
+            if self.running[guild_id] <= 0:
+                del self.running[guild_id]
+            self._pump(guild_id)
+
+    def depth(self, guild_id=None):
+        if guild_id is None:
+            return self.queued
+        return sum(1 for _, _, job in self.queues.get(guild_id, ()) if not job.dropped)
+
+    def wait_percentile(self, percentile):
+        if not self.waits:
+            return 0.0
+        waits = sorted(self.waits)
+        return waits[min(len(waits) - 1, int(len(waits) * percentile / 100))]
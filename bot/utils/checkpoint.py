@@ -0,0 +1,41 @@
+"""What a graceful shutdown knew about each guild, so the next start doesn't have to look at every voice channel.
+
+A checkpoint only describes the stores as they were when it was written, so it is removed as soon
+as it is loaded and a crash later on leaves none behind.
+"""
+import os
+import time
+import uuid
+
+from . import data
+
+
+VERSION = 1
+
+
+def write(path, state):
+    state = {"version": VERSION, "written": time.time(), **state}
+    temp = f"{path}-{uuid.uuid4()}.tmp"
+    with open(temp, "wb") as file:
+        file.write(data.encode(state))
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp, path)
+
+
+def load(path, *, max_age):
+    """Removes and returns the checkpoint, ``None`` if there is none or it can't be trusted anymore"""
+    try:
+        with open(path, "rb") as file:
+            text = file.read()
+    except FileNotFoundError:
+        return None
+    os.remove(path)
+
+    try:
+        state = data.decode(text)
+    except ValueError:
+        return None
+    if state.get("version") != VERSION or time.time() - state.get("written", 0) > max_age:
+        return None
+    return state
@@ -2,34 +2,521 @@ import json
 import uuid
 import os
 import asyncio
+import queue
+import threading
+import time
+
+from . import metrics
+
+try:
+    import orjson
+except ImportError:  # optional, only makes encoding faster
+    orjson = None
+
+
+FLUSH_SECONDS = metrics.Histogram("dvc_store_flush_seconds", "Time taken to write a store's pending changes", ("store",))
+ENCODE_SECONDS = metrics.Histogram("dvc_store_encode_seconds", "Time the writer thread spent encoding a store", ("store",))
+WRITTEN_BYTES = metrics.Counter("dvc_store_written_bytes_total", "Bytes written by each store", ("store",))
+
+
+def _encode(value):
+    if orjson is not None:
+        return orjson.dumps(value, default=list)
+    return json.dumps(value, ensure_ascii=True, separators=(",", ":"), default=list).encode()
+
+
+def encode(value):
+    """Compact JSON as bytes, sets become arrays.
+
+    Both encoders hold the GIL for a whole call, so big dicts are encoded an item at a time
+    and the writer thread lets the loop run in between.
+    """
+    if isinstance(value, dict) and len(value) > 1000:
+        return b"{" + b",".join(_encode(key) + b":" + _encode(item) for key, item in value.items()) + b"}"
+    return _encode(value)
+
+
+def decode(data):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def sync_directory(path):
+    """Makes a rename into the directory of ``path`` survive a power loss"""
+    try:
+        fd = os.open(os.path.dirname(path) or ".", os.O_RDONLY)
+    except OSError:  # directories can't be opened on Windows
+        return
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _copy(value):
+    return value.copy() if value.__class__ in (dict, list) else value
+
+
+def snapshot(value, depth=2):
+    """Copies a store and the dicts and lists in it, which is as deep as any store goes.
+
+    Taken on the loop, so the writer thread never reads anything the loop is mutating.
+    """
+    if isinstance(value, set):
+        return list(value)  # can't hold anything mutable
+    if depth == 1:
+        return _copy(value)
+    if isinstance(value, dict):
+        return {key: _copy(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_copy(item) for item in value]
+    return value
+
+
+def _resolve(future, result, error):
+    if future.done():
+        return
+    if error is None:
+        future.set_result(result)
+    else:
+        future.set_exception(error)
+
+
+class Writer:
+    """A thread doing every file write of the stores, so encoding never competes with disnake's executor work.
+
+    Jobs wait in a queue of at most ``maxsize``, when it is full the callers wait on the loop.
+    """
+
+    def __init__(self, maxsize=64):
+        self.queue = queue.Queue(maxsize)
+        self.full = 0
+        self.thread = threading.Thread(target=self._work, name="store-writer", daemon=True)
+        self.thread.start()
+        metrics.Gauge("dvc_writer_queued", "Writes waiting for the writer thread", self.queue.qsize)
+
+    def _work(self):
+        while True:
+            future, func, args = self.queue.get()
+            result = error = None
+            try:
+                result = func(*args)
+            except Exception as exception:
+                error = exception
+            try:
+                future.get_loop().call_soon_threadsafe(_resolve, future, result, error)
+            except RuntimeError:
+                pass  # the loop is closed, nobody is waiting anymore
+
+    async def run(self, func, *args):
+        future = asyncio.get_running_loop().create_future()
+        while True:
+            try:
+                self.queue.put_nowait((future, func, args))
+                break
+            except queue.Full:
+                self.full += 1
+                await asyncio.sleep(0.01)
+        return await future
+
+
+_writer = None
+
+
+def writer():
+    global _writer
+    if _writer is None:
+        _writer = Writer()
+    return _writer
+
+
+class Scheduler:
+    """Coalesces saves, the class it is mixed into implements ``_write``.
+
+    The first unflushed save starts a timer of ``delay`` seconds, ``max_pending`` unflushed saves cut it short.
+    """
+
+    def _setup(self, loop, delay, max_pending):
+        self.loop = loop or asyncio.get_event_loop()
+        self.lock = asyncio.Lock()
+        self.delay = delay
+        self.max_pending = max_pending
+        self.waiters = []
+        self.timer = None
+        self.requested = 0
+        self.performed = 0
+
+    @property
+    def label(self):
+        return os.path.basename(self.path)
+
+    async def _write(self):
+        """Writes the pending changes and returns how many bytes that took, if it is known"""
+        raise NotImplementedError
+
+    def _schedule(self, delay):
+        if self.timer is not None:
+            self.timer.cancel()
+        self.timer = self.loop.call_later(delay, self._start)
+
+    def _start(self):
+        self.timer = None
+        task = self.loop.create_task(self.flush())
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())  # raised through the waiters
+
+    def save(self):
+        """Marks the store as dirty and returns a future that resolves once the change is written"""
+        self.requested += 1
+        future = self.loop.create_future()
+        self.waiters.append(future)
+        if len(self.waiters) >= self.max_pending:
+            self._schedule(0)
+        elif self.timer is None:
+            self._schedule(self.delay)
+        return future
+
+    async def flush(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        waiters, self.waiters = self.waiters, []
+
+        start = time.perf_counter()
+        try:
+            async with self.lock:
+                written = await self._write()
+        except Exception as error:
+            for waiter in waiters:
+                if not waiter.done():
+                    waiter.set_exception(error)
+            raise
+        else:
+            self.performed += 1
+            FLUSH_SECONDS.observe(time.perf_counter() - start, self.label)
+            if written:
+                WRITTEN_BYTES.inc(self.label, amount=written)
+            for waiter in waiters:
+                if not waiter.done():
+                    waiter.set_result(None)
+
+    async def close(self):
+        # flush takes the lock, so a write that is still running finishes first
+        await self.flush()
 
 
 def handle(_type):
-    class FileHandle(_type):
-        def __init__(self, path, *, loop=None):
+    class FileHandle(Scheduler, _type):
+        def __init__(self, path, *, loop=None, delay=1.0, max_pending=100):
             self.path = path
-            self.loop = loop or asyncio.get_event_loop()
-            self.lock = asyncio.Lock()
+            self._setup(loop, delay, max_pending)
 
             try:
-                with open(self.path, "r") as file:
-                    super().__init__(json.load(file))
+                with open(self.path, "rb") as file:
+                    super().__init__(decode(file.read()))
             except FileNotFoundError:
                 super().__init__()
-                self._dump()
+                self._dump(snapshot(self))
+
+        def _dump(self, value, *, sync=False):
+            """Writes a snapshot taken on the loop, returns the bytes written and the seconds spent encoding.
 
-        def _dump(self):
+            With ``sync`` the snapshot is on disk under its name before this returns.
+            """
+            start = time.perf_counter()
+            encoded = encode(value)
+            seconds = time.perf_counter() - start
             temp = f"{self.path}-{uuid.uuid4()}.tmp"
-            with open(temp, "w", encoding="utf-8") as tmp:
-                json.dump(self.copy(), tmp, ensure_ascii=True, separators=(",", ":"))
+            with open(temp, "wb") as tmp:
+                tmp.write(encoded)
+                if sync:
+                    tmp.flush()
+                    os.fsync(tmp.fileno())
             os.replace(temp, self.path)
+            if sync:
+                sync_directory(self.path)
+            return len(encoded), seconds
 
-        async def save(self):
-            async with self.lock:
-                await self.loop.run_in_executor(None, self._dump)
+        async def _run(self, func, *args):
+            written, seconds = await writer().run(func, *args)
+            ENCODE_SECONDS.observe(seconds, self.label)
+            return written
+
+        async def _write(self):
+            return await self._run(self._dump, snapshot(self))
 
     return FileHandle
 
 
+class RecordingDict(dict):
+    """A dict that reports its top-level mutations to ``_record``.
+
+    Values are not watched, so a value changed in place has to be assigned to its key again.
+    """
+
+    def _record(self, op, *args):
+        pass
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self._record("set", key)
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self._record("del", key)
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def pop(self, key, *default):
+        if key in self:
+            self._record("del", key)
+        return super().pop(key, *default)
+
+    def popitem(self):
+        key, value = super().popitem()
+        self._record("del", key)
+        return key, value
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def clear(self):
+        super().clear()
+        self._record("clear")
+
+
+class RecordingList(list):
+    """A list that reports its mutations to ``_record``.
+
+    Appends and removals are reported as such, anything that reorders the list reports a ``reset``.
+    """
+
+    def _record(self, op, *args):
+        pass
+
+    def append(self, value):
+        super().append(value)
+        self._record("add", value)
+
+    def extend(self, values):
+        for value in values:
+            self.append(value)
+
+    def __iadd__(self, values):
+        self.extend(values)
+        return self
+
+    def remove(self, value):
+        super().remove(value)
+        self._record("remove", value)
+
+    def clear(self):
+        super().clear()
+        self._record("clear")
+
+    def _reset(name):
+        def method(self, *args, **kwargs):
+            result = getattr(list, name)(self, *args, **kwargs)
+            self._record("reset")
+            return self if name.startswith("__i") else result
+        method.__name__ = name
+        return method
+
+    insert = _reset("insert")
+    pop = _reset("pop")
+    sort = _reset("sort")
+    reverse = _reset("reverse")
+    __setitem__ = _reset("__setitem__")
+    __delitem__ = _reset("__delitem__")
+    __imul__ = _reset("__imul__")
+    del _reset
+
+
+class RecordingSet(set):
+    """A set that reports the values it gains or loses to ``_record``.
+
+    In-place operators report a ``reset`` since they may change any number of values.
+    """
+
+    def _record(self, op, *args):
+        pass
+
+    def add(self, value):
+        if value not in self:
+            super().add(value)
+            self._record("add", value)
+
+    def update(self, *others):
+        for other in others:
+            for value in other:
+                self.add(value)
+
+    def remove(self, value):
+        super().remove(value)
+        self._record("remove", value)
+
+    def discard(self, value):
+        if value in self:
+            self.remove(value)
+
+    def pop(self):
+        value = super().pop()
+        self._record("remove", value)
+        return value
+
+    def clear(self):
+        super().clear()
+        self._record("clear")
+
+    def _reset(name):
+        def method(self, *args, **kwargs):
+            result = getattr(set, name)(self, *args, **kwargs)
+            self._record("reset")
+            return self if name.startswith("__i") else result
+        method.__name__ = name
+        return method
+
+    difference_update = _reset("difference_update")
+    intersection_update = _reset("intersection_update")
+    symmetric_difference_update = _reset("symmetric_difference_update")
+    __ior__ = _reset("__ior__")
+    __iand__ = _reset("__iand__")
+    __isub__ = _reset("__isub__")
+    __ixor__ = _reset("__ixor__")
+    del _reset
+
+
+def journal(_type):
+    class JournalHandle(handle(_type)):
+        """Appends mutations to ``<path>.log`` instead of rewriting the whole file on every save.
+
+        The log is replayed on top of the snapshot at ``path`` on startup and folded back
+        into it in the background once it grows past ``threshold`` bytes.
+        """
+
+        def __init__(self, path, *, threshold=256 * 1024, **kwargs):
+            self.log = path + ".log"
+            self.threshold = threshold
+            self.pending = []
+            self.reset = False
+            self.compaction = None
+            super().__init__(path, **kwargs)
+            self._replay()
+            self.logged = os.path.getsize(self.log) if os.path.exists(self.log) else 0
+
+        def _record(self, op, *args):
+            if op == "reset":
+                self.reset = True
+            else:
+                self.pending.append((op, *args))
+
+        def _replay(self):
+            try:
+                with open(self.log, "rb") as file:
+                    lines = file.readlines()
+            except FileNotFoundError:
+                return
+
+            records = []
+            for line in lines:
+                try:
+                    records.append(decode(line))
+                except ValueError:
+                    break  # torn write from a crash, everything after it never got acknowledged
+            if isinstance(self, dict):
+                for op, *args in records:
+                    if op == "clear":
+                        self.clear()
+                    elif op == "set":
+                        self[args[0]] = args[1]
+                    elif op == "del":
+                        self.pop(args[0], None)
+            else:
+                add = self.add if isinstance(self, set) else self.append
+                seen = set(self)
+                for op, *args in records:  # replays have to be idempotent
+                    if op == "clear":
+                        self.clear()
+                        seen.clear()
+                    elif op == "add" and args[0] not in seen:
+                        seen.add(args[0])
+                        add(args[0])
+                    elif op == "remove" and args[0] in seen:
+                        seen.remove(args[0])
+                        self.remove(args[0])
+            self.pending.clear()
+
+        def _collect(self):
+            # values are copied here so the writer thread never reads what the loop is mutating
+            records = []
+            for op, *args in self.pending:
+                if op == "set":
+                    key = args[0]
+                    records.append(["set", key, snapshot(self[key], 1)] if key in self else ["del", key])
+                else:
+                    records.append([op, *args])
+            self.pending.clear()
+            return records
+
+        def _append(self, records):
+            start = time.perf_counter()
+            lines = b"".join(encode(record) + b"\n" for record in records)
+            seconds = time.perf_counter() - start
+            with open(self.log, "ab") as file:
+                file.write(lines)
+                file.flush()
+                os.fsync(file.fileno())
+            return len(lines), seconds
+
+        def _compact(self, value):
+            # the log is only emptied once the snapshot that replaces it can't be lost anymore
+            result = self._dump(value, sync=True)
+            with open(self.log, "w"):
+                pass
+            return result
+
+        async def compact(self):
+            async with self.lock:
+                written = await self._run(self._compact, snapshot(self))
+                self.logged = 0
+            WRITTEN_BYTES.inc(self.label, amount=written)
+
+        async def _write(self):
+            if self.reset:
+                self.reset = False
+                self.pending.clear()
+                written = await self._run(self._compact, snapshot(self))
+                self.logged = 0
+                return written
+
+            records = self._collect()
+            if not records:
+                return
+            written = await self._run(self._append, records)
+            self.logged += written
+            if self.logged > self.threshold and (self.compaction is None or self.compaction.done()):
+                self.compaction = self.loop.create_task(self.compact())
+            return written
+
+        async def close(self):
+            await super().close()
+            if self.compaction is not None:
+                await self.compaction
+
+    return JournalHandle
+
+
 List = handle(list)
 Dict = handle(dict)
+Set = handle(set)
+JournalList = journal(RecordingList)
+JournalDict = journal(RecordingDict)
+JournalSet = journal(RecordingSet)
@@ -0,0 +1,156 @@
+import asyncio
+import json
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+from . import data
+
+
+class Database:
+    """A sqlite database in WAL mode, every statement runs on one dedicated writer thread"""
+
+    def __init__(self, path, *, loop=None):
+        self.path = path
+        self.loop = loop or asyncio.get_event_loop()
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite-writer")
+        self.connection = self.call(self._connect)
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def call(self, func, *args):
+        """Runs ``func`` on the writer thread and blocks until it is done, only meant for startup"""
+        return self.executor.submit(func, *args).result()
+
+    def run(self, func, *args):
+        return self.loop.run_in_executor(self.executor, func, *args)
+
+    def close(self):
+        self.call(self.connection.close)
+        self.executor.shutdown()
+
+
+def table(_type, source):
+    class TableHandle(data.Scheduler, _type):
+        """Mirrors a table in memory and writes the rows that changed since the last flush.
+
+        Keys (or values of a set) have to be snowflakes. ``guild_of`` maps them to the guild id
+        stored alongside each row, it is called when the row changes.
+        """
+
+        def __init__(self, database, name, *, guild_of=None, delay=1.0, max_pending=100):
+            self.database = database
+            self.name = name
+            self.guild_of = guild_of or (lambda key: None)
+            self.changes = {}
+            self.rewrite = False
+            self._setup(database.loop, delay, max_pending)
+
+            database.call(self._create)
+            super().__init__(database.call(self._load))
+
+        @property
+        def label(self):
+            return self.name
+
+        def _create(self):
+            with self.database.connection as connection:
+                connection.execute(
+                    f"CREATE TABLE IF NOT EXISTS {self.name} "
+                    f"(id INTEGER PRIMARY KEY, guild_id INTEGER, value TEXT)"
+                )
+                connection.execute(f"CREATE INDEX IF NOT EXISTS {self.name}_guild_id ON {self.name} (guild_id)")
+
+        def _load(self):
+            rows = self.database.connection.execute(f"SELECT id, value FROM {self.name}")
+            if issubclass(_type, dict):
+                return {str(key): json.loads(value) for key, value in rows}
+            return {key for key, _ in rows}
+
+        def _record(self, op, *args):
+            if op == "clear":
+                self.rewrite = True
+                self.changes.clear()
+            elif op == "reset":
+                self.rewrite = True
+                self.changes = {key: self.guild_of(key) for key in self}
+            else:
+                self.changes[args[0]] = self.guild_of(args[0])
+
+        def _collect(self):
+            upserts = []
+            deletes = []
+            for key, guild_id in self.changes.items():
+                if key not in self:
+                    deletes.append((int(key),))
+                elif isinstance(self, dict):
+                    upserts.append((int(key), guild_id, json.dumps(self[key], separators=(",", ":"))))
+                else:
+                    upserts.append((int(key), guild_id, None))
+            rewrite, self.rewrite = self.rewrite, False
+            self.changes = {}
+            return rewrite, upserts, deletes
+
+        def _apply(self, rewrite, upserts, deletes):
+            with self.database.connection as connection:  # one transaction per flush
+                if rewrite:
+                    connection.execute(f"DELETE FROM {self.name}")
+                connection.executemany(
+                    f"INSERT INTO {self.name} (id, guild_id, value) VALUES (?, ?, ?) "
+                    f"ON CONFLICT (id) DO UPDATE SET guild_id = coalesce(excluded.guild_id, guild_id), value = excluded.value",
+                    upserts
+                )
+                connection.executemany(f"DELETE FROM {self.name} WHERE id = ?", deletes)
+
+        async def _write(self):
+            rewrite, upserts, deletes = self._collect()
+            if rewrite or upserts or deletes:
+                await self.database.run(self._apply, rewrite, upserts, deletes)
+
+        def _key(self, key):
+            return str(key) if isinstance(self, dict) else key
+
+        def _unresolved(self):
+            return [key for key, in self.database.connection.execute(f"SELECT id FROM {self.name} WHERE guild_id IS NULL")]
+
+        def _resolve(self, rows):
+            with self.database.connection as connection:
+                connection.executemany(f"UPDATE {self.name} SET guild_id = ? WHERE id = ? AND guild_id IS NULL", rows)
+
+        async def backfill(self):
+            """Fills in the guild of rows written before ``guild_of`` knew it, e.g. imported ones, returns how many"""
+            rows = []
+            for key in await self.database.run(self._unresolved):
+                guild_id = self.guild_of(self._key(key))
+                if guild_id is not None:
+                    rows.append((guild_id, key))
+            if rows:
+                await self.database.run(self._resolve, rows)
+            return len(rows)
+
+        def _select(self, guild_id):
+            return [key for key, in self.database.connection.execute(f"SELECT id FROM {self.name} WHERE guild_id = ?", (guild_id,))]
+
+        async def guild(self, guild_id):
+            """The keys written for a guild, looked up through the guild_id index"""
+            return [self._key(key) for key in await self.database.run(self._select, guild_id)]
+
+        def migrate(self, path):
+            """Imports a JSON store once, its files are renamed afterwards"""
+            if not os.path.exists(path):
+                return
+            self.update(source(path, loop=self.loop))
+            self.database.call(self._apply, *self._collect())
+            for file in (path, path + ".log"):
+                if os.path.exists(file):
+                    os.replace(file, file + ".migrated")
+
+    return TableHandle
+
+
+Dict = table(data.RecordingDict, data.JournalDict)
+Set = table(data.RecordingSet, data.JournalSet)
@@ -0,0 +1,221 @@
+import asyncio
+import collections
+import os
+import uuid
+from collections.abc import MutableMapping
+
+from . import data
+
+
+class Partitions(data.Scheduler):
+    """One small JSON file per guild under ``path``, read the first time the guild is needed.
+
+    Loaded guilds are kept in an LRU holding about ``budget`` bytes of JSON. A guild that changed
+    is written back on the next flush, if it is evicted before that it is encoded right away and
+    written with the next flush instead. Until a write is done the guild is read from what is being
+    written, its file is missing or out of date.
+    """
+
+    def __init__(self, path, *, budget=16 * 1024 ** 2, loop=None, delay=1.0, max_pending=100):
+        self.path = path
+        self.budget = budget
+        self._setup(loop, delay, max_pending)
+
+        if not os.path.exists(path):
+            os.makedirs(path)
+        self.known = {int(name[:-5]) for name in os.listdir(path) if name[:-5].isdigit()}
+        self.cache = collections.OrderedDict()  # guild id -> partition, least recently used first
+        self.sizes = {}
+        self.size = 0
+        self.dirty = set()
+        self.evicted = {}  # guild id -> encoded partition that still has to be written
+        self.writing = {}  # guild id -> encoded partition the writer thread is writing, None if it removes the file
+
+        self.loads = 0
+        self.evictions = 0
+
+    def __contains__(self, guild_id):
+        return guild_id in self.known
+
+    def _file(self, guild_id):
+        return os.path.join(self.path, f"{guild_id}.json")
+
+    def get(self, guild_id, *, create=False):
+        """Returns the partition of a guild, ``None`` if it has none and ``create`` is false"""
+        partition = self.cache.get(guild_id)
+        if partition is not None:
+            self.cache.move_to_end(guild_id)
+            return partition
+
+        if guild_id in self.evicted:
+            text = self.evicted.pop(guild_id)
+            self.dirty.add(guild_id)
+        elif self.writing.get(guild_id) is not None:
+            text = self.writing[guild_id]
+        elif guild_id in self.known:
+            with open(self._file(guild_id), "rb") as file:
+                text = file.read()
+            self.loads += 1
+        elif create:
+            text = b"{}"
+            self.known.add(guild_id)
+            self.dirty.add(guild_id)  # there is no file until it is written
+        else:
+            return None
+
+        partition = self.cache[guild_id] = data.decode(text)
+        self.sizes[guild_id] = len(text)
+        self.size += len(text)
+        self._evict()
+        return partition
+
+    def touch(self, guild_id):
+        self.dirty.add(guild_id)
+
+    def drop(self, guild_id):
+        """Forgets everything stored for a guild, the file is removed with the next flush"""
+        if guild_id not in self.known:
+            return
+        if guild_id in self.cache:
+            del self.cache[guild_id]
+            self.size -= self.sizes.pop(guild_id)
+        self.dirty.discard(guild_id)
+        self.evicted[guild_id] = b"{}"
+        self.save()
+
+    def _evict(self):
+        while self.size > self.budget and len(self.cache) > 1:
+            guild_id, partition = self.cache.popitem(last=False)
+            self.size -= self.sizes.pop(guild_id)
+            self.evictions += 1
+            if guild_id in self.dirty:
+                self.dirty.discard(guild_id)
+                self.evicted[guild_id] = data.encode(partition)
+                self.save()
+
+    def _collect(self):
+        # encoded here, partitions are small and the writer thread must not read what the loop is mutating
+        writes, self.evicted = self.evicted, {}
+        for guild_id in self.dirty:
+            partition = self.cache[guild_id]
+            text = writes[guild_id] = data.encode(partition)
+            self.size += len(text) - self.sizes[guild_id]
+            self.sizes[guild_id] = len(text)
+        self.dirty.clear()
+
+        for guild_id, text in writes.items():
+            if text == b"{}":
+                writes[guild_id] = None
+                self.known.discard(guild_id)
+                if guild_id in self.cache:
+                    del self.cache[guild_id]
+                    self.size -= self.sizes.pop(guild_id)
+        return writes
+
+    def _apply(self, writes):
+        for guild_id, text in writes.items():
+            path = self._file(guild_id)
+            if text is None:
+                if os.path.exists(path):
+                    os.remove(path)
+                continue
+            temp = f"{path}-{uuid.uuid4()}.tmp"
+            with open(temp, "wb") as file:
+                file.write(text)
+            os.replace(temp, path)
+
+    async def _write(self):
+        writes = self._collect()
+        if writes:
+            self.writing = writes
+            try:
+                await data.writer().run(self._apply, writes)
+            finally:
+                self.writing = {}
+        self._evict()
+        return sum(len(text) for text in writes.values() if text is not None)
+
+
+class Section(MutableMapping):
+    """The ``name`` part of every guild's partition, used like one dict keyed by snowflakes.
+
+    ``guild_of`` maps a key to its guild. Keys that aren't guild ids can be kept in ``routes``,
+    a store mapping them to their guild, so checking whether a key exists never touches the disk.
+    """
+
+    def __init__(self, partitions, name, *, guild_of, routes=None):
+        self.partitions = partitions
+        self.name = name
+        self.guild_of = guild_of
+        self.routes = routes
+
+    def _guild(self, key):
+        if self.routes is None:
+            return self.guild_of(key)
+        return self.routes.get(key)
+
+    def _section(self, key):
+        guild_id = self._guild(key)
+        if guild_id is None:
+            return None, None
+        partition = self.partitions.get(guild_id)
+        return guild_id, None if partition is None else partition.get(self.name)
+
+    def __contains__(self, key):
+        if self.routes is not None:
+            return key in self.routes
+        _, section = self._section(key)
+        return section is not None and key in section
+
+    def __getitem__(self, key):
+        _, section = self._section(key)
+        if section is None:
+            raise KeyError(key)
+        return section[key]
+
+    def __setitem__(self, key, value):
+        guild_id = self._guild(key)
+        if guild_id is None:
+            guild_id = self.guild_of(key)
+            if guild_id is None:
+                raise KeyError(f"no guild known for {key}")
+        self.partitions.get(guild_id, create=True).setdefault(self.name, {})[key] = value
+        self.partitions.touch(guild_id)
+        if self.routes is not None and self.routes.get(key) != guild_id:
+            self.routes[key] = guild_id
+
+    def __delitem__(self, key):
+        guild_id, section = self._section(key)
+        if section is None:
+            raise KeyError(key)
+        del section[key]
+        if not section:
+            del self.partitions.get(guild_id)[self.name]
+        self.partitions.touch(guild_id)
+        if self.routes is not None:
+            del self.routes[key]
+
+    def __iter__(self):
+        """Loads every guild that has a partition, meant for maintenance rather than requests"""
+        if self.routes is not None:
+            yield from list(self.routes)
+            return
+        for guild_id in list(self.partitions.known):
+            partition = self.partitions.get(guild_id)
+            if partition is not None:
+                yield from list(partition.get(self.name, ()))
+
+    def __len__(self):
+        if self.routes is not None:
+            return len(self.routes)
+        return sum(1 for _ in self)
+
+    def save(self):
+        if self.routes is None:
+            return self.partitions.save()
+        return asyncio.gather(self.partitions.save(), self.routes.save())
+
+    async def flush(self):
+        await self.partitions.flush()
+        if self.routes is not None:
+            await self.routes.flush()
@@ -0,0 +1,89 @@
+import collections
+
+
+class ChannelIndex:
+    """Keeps track of where the dynamic channels live so lookups by guild or category don't need a scan"""
+
+    def __init__(self):
+        self.guilds = collections.defaultdict(set)
+        self.categories = collections.Counter()
+        self.locations = {}
+
+    def __len__(self):
+        return len(self.locations)
+
+    def __contains__(self, channel_id):
+        return channel_id in self.locations
+
+    def add(self, channel):
+        self.discard(channel.id)
+        location = channel.guild.id, channel.category_id
+        self.locations[channel.id] = location
+        self.guilds[location[0]].add(channel.id)
+        self.categories[location] += 1
+
+    def discard(self, channel_id):
+        location = self.locations.pop(channel_id, None)
+        if location is None:
+            return
+        guild_id, _ = location
+        self.guilds[guild_id].discard(channel_id)
+        if not self.guilds[guild_id]:
+            del self.guilds[guild_id]
+        self.categories[location] -= 1
+        if self.categories[location] <= 0:
+            del self.categories[location]
+
+    def move(self, channel):
+        if channel.id in self.locations:
+            self.add(channel)
+
+    def clear(self):
+        self.guilds.clear()
+        self.categories.clear()
+        self.locations.clear()
+
+    def count(self, guild_id, category_id):
+        """Number of dynamic channels in a category, ``None`` meaning no category"""
+        return self.categories[guild_id, category_id]
+
+    def guild(self, guild_id):
+        return frozenset(self.guilds.get(guild_id, ()))
+
+
+class LobbyIndex:
+    """Which lobbies belong to which guild, so a guild's lobbies can be dropped without scanning every config"""
+
+    def __init__(self):
+        self.guilds = collections.defaultdict(set)
+        self.owners = {}
+
+    def __len__(self):
+        return len(self.owners)
+
+    def __contains__(self, lobby_id):
+        return lobby_id in self.owners
+
+    def add(self, guild_id, lobby_id):
+        self.discard(lobby_id)
+        self.owners[lobby_id] = guild_id
+        self.guilds[guild_id].add(lobby_id)
+
+    def discard(self, lobby_id):
+        guild_id = self.owners.pop(lobby_id, None)
+        if guild_id is None:
+            return
+        self.guilds[guild_id].discard(lobby_id)
+        if not self.guilds[guild_id]:
+            del self.guilds[guild_id]
+
+    def pop(self, guild_id):
+        """Removes and returns the lobbies of a guild"""
+        lobby_ids = self.guilds.pop(guild_id, set())
+        for lobby_id in lobby_ids:
+            del self.owners[lobby_id]
+        return lobby_ids
+
+    def clear(self):
+        self.guilds.clear()
+        self.owners.clear()
@@ -0,0 +1,61 @@
+import disnake as discord
+
+
+class Menu(discord.ui.View):
+    """Pages through ``entries``, ``per_page`` at a time.
+
+    Subclasses implement ``format_page``, it is only called for the page that is shown.
+    """
+
+    def __init__(self, entries, *, per_page):
+        super().__init__()
+        self.entries = list(entries)
+        self.per_page = per_page
+        self.page = 0
+        self.pages = (len(self.entries) + per_page - 1) // per_page
+
+    def format_page(self, page):
+        raise NotImplementedError
+
+    def get_entries(self, page):
+        idx = page * self.per_page
+        return self.entries[idx:(min(idx + self.per_page, len(self.entries)))]
+
+    def update(self):
+        self.previous.disabled = self.page == 0
+        self.first.disabled = self.page < 2
+        self.next.disabled = self.page == (self.pages - 1)
+        self.last.disabled = self.page > (self.pages - 3)
+
+        embed = self.format_page(self.page)
+        embed.set_footer(text=f"Page {self.page + 1} of {self.pages}")
+        return embed
+
+    async def send_initial(self, ctx):
+        await ctx.response.send_message(embed=self.update(), view=self)
+
+    @discord.ui.button(emoji="⏮️", style=discord.ButtonStyle.secondary)
+    async def first(self, button, ctx):
+        self.page = 0
+        await ctx.response.edit_message(embed=self.update(), view=self)
+
+    @discord.ui.button(emoji="◀️", style=discord.ButtonStyle.secondary)
+    async def previous(self, button, ctx):
+        self.page -= 1
+        await ctx.response.edit_message(embed=self.update(), view=self)
+
+    @discord.ui.button(emoji="⏹️", style=discord.ButtonStyle.secondary)
+    async def close(self, button, ctx):
+        self.clear_items()
+        await ctx.response.edit_message(embed=self.update(), view=self)
+        self.stop()
+
+    @discord.ui.button(emoji="▶️", style=discord.ButtonStyle.secondary)
+    async def next(self, button, ctx):
+        self.page += 1
+        await ctx.response.edit_message(embed=self.update(), view=self)
+
+    @discord.ui.button(emoji="⏭️", style=discord.ButtonStyle.secondary)
+    async def last(self, button, ctx):
+        self.page = self.pages - 1
+        await ctx.response.edit_message(embed=self.update(), view=self)
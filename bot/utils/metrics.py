@@ -0,0 +1,156 @@
+"""Counters and histograms in the Prometheus text format, served on a local ``/metrics`` endpoint.
+
+Nothing is recorded until :func:`enable` is called, so instrumented code costs a flag check otherwise.
+"""
+import asyncio
+import bisect
+import collections
+import time
+from contextlib import contextmanager
+
+
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+enabled = False
+registry = {}
+
+
+def enable():
+    global enabled
+    enabled = True
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(names, values)) + "}"
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.values = collections.defaultdict(float)
+        registry[name] = self
+
+    def inc(self, *labels, amount=1):
+        if enabled:
+            self.values[labels] += amount
+
+    def samples(self):
+        for labels, value in self.values.items():
+            yield self.name + _labels(self.labels, labels), value
+
+
+class Series:
+    __slots__ = ("counts", "sum")
+
+    def __init__(self, size):
+        self.counts = [0] * size
+        self.sum = 0.0
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self.series = {}
+        registry[name] = self
+
+    def observe(self, value, *labels):
+        if not enabled:
+            return
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = Series(len(self.buckets) + 1)
+        series.counts[bisect.bisect_left(self.buckets, value)] += 1
+        series.sum += value
+
+    @contextmanager
+    def time(self, *labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def samples(self):
+        for labels, series in self.series.items():
+            total = 0
+            for bound, count in zip((*self.buckets, "+Inf"), series.counts):
+                total += count
+                yield self.name + "_bucket" + _labels((*self.labels, "le"), (*labels, bound)), total
+            yield self.name + "_sum" + _labels(self.labels, labels), series.sum
+            yield self.name + "_count" + _labels(self.labels, labels), total
+
+
+class Gauge:
+    """Read from ``func`` on every scrape, it returns a number or a dict of label tuples to numbers"""
+
+    def __init__(self, name, help, func, labels=(), kind="gauge"):
+        self.name = name
+        self.help = help
+        self.func = func
+        self.labels = labels
+        self.kind = kind
+        registry[name] = self
+
+    def samples(self):
+        value = self.func()
+        if not isinstance(value, dict):
+            value = {(): value}
+        for labels, number in value.items():
+            yield self.name + _labels(self.labels, labels), number
+
+
+def render():
+    lines = []
+    for metric in registry.values():
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(f"{name} {value}" for name, value in metric.samples())
+    return "\n".join(lines) + "\n"
+
+
+async def _handle(reader, writer):
+    try:
+        request = await reader.readline()
+        while await reader.readline() not in (b"\r\n", b"\n", b""):
+            pass  # headers
+        if request.split(b" ")[1:2] == [b"/metrics"]:
+            status, body = "200 OK", render().encode()
+        else:
+            status, body = "404 Not Found", b"not found\n"
+        writer.write(
+            f"HTTP/1.1 {status}\r\n"
+            f"Content-Type: text/plain; version=0.0.4\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: close\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(port, host="127.0.0.1"):
+    return await asyncio.start_server(_handle, host, port)
+
+
+LOOP_LAG = Histogram("dvc_event_loop_lag_seconds", "How late a sleep on the event loop woke up")
+
+
+async def watch_loop(interval=0.5):
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        LOOP_LAG.observe(loop.time() - start - interval)
@@ -0,0 +1,43 @@
+import collections
+
+
+class Pool:
+    """Hidden channels created ahead of time, handed out to members joining their lobby"""
+
+    def __init__(self):
+        self.lobbies = collections.defaultdict(collections.deque)
+        self.owners = {}
+        self.refilling = set()
+
+    def __contains__(self, channel_id):
+        return channel_id in self.owners
+
+    def size(self, lobby_id):
+        return len(self.lobbies.get(lobby_id, ()))
+
+    def put(self, lobby_id, channel):
+        self.lobbies[lobby_id].append(channel)
+        self.owners[channel.id] = lobby_id
+
+    def take(self, lobby_id):
+        channels = self.lobbies.get(lobby_id)
+        if not channels:
+            return None
+        channel = channels.popleft()
+        del self.owners[channel.id]
+        return channel
+
+    def discard(self, channel_id):
+        lobby_id = self.owners.pop(channel_id, None)
+        if lobby_id is not None:
+            channels = self.lobbies[lobby_id]
+            for channel in channels:
+                if channel.id == channel_id:
+                    channels.remove(channel)
+                    break
+
+    def drain(self, lobby_id):
+        channels = self.lobbies.pop(lobby_id, ())
+        for channel in channels:
+            del self.owners[channel.id]
+        return list(channels)
@@ -0,0 +1,153 @@
+"""Samples what the event loop runs and allocates, but only while a profile is being taken.
+
+Nothing is hooked into the loop: a second thread looks at the loop thread's stack with
+``sys._current_frames`` every few milliseconds and stops when the profile is done, so the bot
+pays nothing in between.
+"""
+import asyncio
+import collections
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+
+IDLE = ("selectors.py", "select")  # the loop waiting for I/O
+
+
+def describe(code):
+    filename = os.sep.join(code.co_filename.split(os.sep)[-2:])
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+
+def stack(frame, limit=12):
+    lines = []
+    while frame is not None and len(lines) < limit:
+        lines.append(f"{describe(frame.f_code)} line {frame.f_lineno}")
+        frame = frame.f_back
+    return lines
+
+
+class Profile:
+    __slots__ = ("seconds", "samples", "idle", "own", "total", "blocks", "allocations")
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.samples = 0
+        self.idle = 0
+        self.own = collections.Counter()  # code -> samples it was on top of the stack
+        self.total = collections.Counter()  # code -> samples it was anywhere on the stack
+        self.blocks = []  # (seconds, stack) of each time the loop was blocked
+        self.allocations = []  # tracemalloc.StatisticDiff, largest growth first
+
+    def summary(self):
+        busy = self.samples - self.idle
+        text = f"{self.samples} samples over {self.seconds:.0f}s, loop busy {busy / max(self.samples, 1):.0%} of the time"
+        if self.blocks:
+            text += f", blocked {len(self.blocks)} time(s) for up to {max(s for s, _ in self.blocks) * 1000:.0f} ms"
+        return text
+
+    def format(self, limit=25):
+        busy = max(self.samples - self.idle, 1)
+        lines = [self.summary(), ""]
+        for title, counter in (("own time", self.own), ("total time", self.total)):
+            lines.append(f"Top functions by {title}, share of busy samples")
+            lines.extend(f"{count / busy:7.1%}  {describe(code)}" for code, count in counter.most_common(limit))
+            lines.append("")
+        if self.allocations:
+            lines.append("Top allocation sites, growth during the profile")
+            lines.extend(
+                f"{stat.size_diff / 1024:9.1f} KiB {stat.count_diff:+8d} blocks  {stat.traceback[0]}"
+                for stat in self.allocations[:limit]
+            )
+            lines.append("")
+        if self.blocks:
+            lines.append("Event loop blocked")
+            for seconds, frames in self.blocks:
+                lines.append(f"{seconds * 1000:7.0f} ms in")
+                lines.extend(f"    {line}" for line in frames)
+        return "\n".join(lines)
+
+
+class Profiler:
+    """Takes one profile at a time for a bounded number of seconds.
+
+    Every ``interval`` seconds the sampler thread records the loop thread's stack. A heartbeat on
+    the loop tells it when the loop last got to run, a handler that keeps it from running for
+    longer than ``threshold`` seconds is reported along with the stack it was stuck in.
+    """
+
+    def __init__(self, *, interval=0.005, threshold=0.1, loop=None):
+        self.interval = interval
+        self.threshold = threshold
+        self.loop = loop or asyncio.get_event_loop()
+        self.running = False
+        self.beat = 0.0
+
+    async def run(self, seconds, *, memory=True):
+        if self.running:
+            raise RuntimeError("a profile is already being taken")
+        self.running = True
+        profile = Profile(seconds)
+        tracing = memory and not tracemalloc.is_tracing()
+        try:
+            if tracing:
+                tracemalloc.start()
+            before = tracemalloc.take_snapshot() if memory else None
+
+            stop = threading.Event()
+            heartbeat = self.loop.create_task(self.heartbeat())
+            sampler = threading.Thread(target=self.sample, args=(threading.get_ident(), stop, profile), name="profiler", daemon=True)
+            sampler.start()
+            try:
+                await asyncio.sleep(seconds)
+            finally:
+                stop.set()
+                heartbeat.cancel()
+                await self.loop.run_in_executor(None, sampler.join)
+
+            if memory:
+                ignore = (tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__))
+                after = tracemalloc.take_snapshot().filter_traces(ignore)
+                profile.allocations = [s for s in after.compare_to(before.filter_traces(ignore), "lineno") if s.size_diff > 0]
+        finally:
+            if tracing:
+                tracemalloc.stop()
+            self.running = False
+        return profile
+
+    async def heartbeat(self):
+        while True:
+            self.beat = time.perf_counter()
+            await asyncio.sleep(self.interval)
+
+    def sample(self, thread_id, stop, profile):
+        blocked = None  # heartbeat and stack when the loop was found blocked
+        while not stop.wait(self.interval):
+            frame = sys._current_frames().get(thread_id)
+            if frame is None:
+                continue
+            beat = self.beat
+            if blocked is not None and beat != blocked[0]:
+                seconds = beat - blocked[0] - self.interval
+                profile.blocks.append((seconds, blocked[1]))
+                print(f"profile: event loop blocked for {seconds * 1000:.0f} ms in", *blocked[1], sep="\n    ")
+                blocked = None
+            elif blocked is None and time.perf_counter() - beat > self.threshold:
+                blocked = beat, stack(frame)
+
+            profile.samples += 1
+            code = frame.f_code
+            if (os.path.basename(code.co_filename), code.co_name) == IDLE:
+                profile.idle += 1
+                continue
+            profile.own[code] += 1
+            seen = set()
+            while frame is not None:
+                if frame.f_code not in seen:
+                    seen.add(frame.f_code)
+                    profile.total[frame.f_code] += 1
+                frame = frame.f_back
+        if blocked is not None:
+            profile.blocks.append((time.perf_counter() - blocked[0], blocked[1]))
@@ -0,0 +1,62 @@
+import heapq
+import time
+
+
+class Bucket:
+    __slots__ = ("tokens", "updated", "full_at")
+
+    def __init__(self, tokens, now):
+        self.tokens = tokens
+        self.updated = now
+        self.full_at = now
+
+
+class RateLimiter:
+    """Token buckets keyed by id, ``rate`` hits per ``per`` seconds.
+
+    A bucket that has filled up again is no different from a missing one, so it is dropped.
+    Each bucket has exactly one entry in a heap ordered by when it was last known to be full.
+    """
+
+    def __init__(self, rate=3, per=15.0, *, clock=time.monotonic):
+        self.rate = rate
+        self.per = per
+        self.clock = clock
+        self.buckets = {}
+        self.heap = []
+        self.rejected = 0
+
+    def __len__(self):
+        return len(self.buckets)
+
+    def expire(self, now):
+        heap = self.heap
+        while heap and heap[0][0] <= now:
+            _, key = heapq.heappop(heap)
+            bucket = self.buckets[key]
+            if bucket.full_at <= now:
+                del self.buckets[key]
+            else:
+                heapq.heappush(heap, (bucket.full_at, key))
+
+    def hit(self, key, rate=None, per=None):
+        """Takes a token for ``key`` and returns 0, or the seconds until the next one if there is none left"""
+        rate = self.rate if rate is None else rate
+        per = self.per if per is None else per
+        now = self.clock()
+        self.expire(now)
+
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = Bucket(rate, now)
+            heapq.heappush(self.heap, (now + per, key))  # it is full again by then at the latest
+        else:
+            bucket.tokens = min(rate, bucket.tokens + (now - bucket.updated) * rate / per)
+            bucket.updated = now
+
+        if bucket.tokens < 1:
+            self.rejected += 1
+            return (1 - bucket.tokens) * per / rate
+        bucket.tokens -= 1
+        bucket.full_at = now + (rate - bucket.tokens) * per / rate
+        return 0.0
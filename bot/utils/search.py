@@ -0,0 +1,70 @@
+import collections
+import re
+
+
+WORD = re.compile(r"[^\s_-]+")
+
+
+def bigrams(text):
+    text = f" {text} "
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+class Index:
+    """Ranks names for autocompletion without comparing the query to each of them.
+
+    Names starting with the query come first, then names with a word starting with it, then names
+    containing it and then names sharing enough letter pairs with it to be a typo away.
+    Everything is lowercase.
+    """
+
+    def __init__(self, names, *, limit=25, cutoff=0.4):
+        self.names = sorted({name.lower() for name in names})
+        self.limit = limit
+        self.cutoff = cutoff
+        self.prefixes = {}  # prefix -> names, best match first
+        self.grams = collections.defaultdict(list)  # bigram -> indices into names
+        self.sizes = []
+
+        ranks = collections.defaultdict(dict)
+        for i, name in enumerate(self.names):
+            for match in WORD.finditer(name):
+                rank = 0 if match.start() == 0 else 1
+                for end in range(match.start() + 1, len(name) + 1):
+                    prefix = name[match.start():end]
+                    ranks[prefix][name] = min(rank, ranks[prefix].get(name, rank))
+            grams = bigrams(name)
+            self.sizes.append(len(grams))
+            for gram in grams:
+                self.grams[gram].append(i)
+        for prefix, names in ranks.items():
+            self.prefixes[prefix] = sorted(names, key=lambda name: (names[name], name))
+
+    def __len__(self):
+        return len(self.names)
+
+    def search(self, query):
+        query = " ".join(query.lower().split())
+        if not query:
+            return self.names[:self.limit]
+
+        results = self.prefixes.get(query, [])[:self.limit]
+        if len(results) == self.limit:
+            return results
+
+        grams = bigrams(query)
+        shared = collections.Counter()
+        for gram in grams:
+            shared.update(self.grams.get(gram, ()))
+        scored = []
+        for i, count in shared.items():
+            name = self.names[i]
+            if query in name:
+                scored.append((-2.0, name))  # after the prefixes, before anything fuzzy
+                continue
+            score = 2 * count / (len(grams) + self.sizes[i])
+            if score >= self.cutoff:
+                scored.append((-score, name))
+        found = set(results)
+        results.extend(name for _, name in sorted(scored) if name not in found)
+        return results[:self.limit]
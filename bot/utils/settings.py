@@ -0,0 +1,43 @@
+import disnake as discord
+
+from .template import Template
+
+
+def overwrites_of(channel):
+    """``channel.overwrites``, but members that aren't cached stay in as :class:`disnake.Object`.
+
+    disnake leaves them out, and with ``low_memory`` that is nearly every member.
+    """
+    overwrites = {}
+    for overwrite in channel._overwrites:
+        if overwrite.is_role():
+            target = channel.guild.get_role(overwrite.id)
+            if target is None:
+                continue
+        else:
+            target = channel.guild.get_member(overwrite.id) or discord.Object(overwrite.id)
+        overwrites[target] = discord.PermissionOverwrite.from_pair(discord.Permissions(overwrite.allow), discord.Permissions(overwrite.deny))
+    return overwrites
+
+
+class Settings:
+    """A lobby's config with the defaults filled in, resolved once and cached until something it depends on changes.
+
+    ``overwrites`` are the lobby's own, shared by every join, so they have to be copied before
+    adding to them.
+    """
+
+    __slots__ = ("name", "limit", "bitrate", "position", "category", "pool", "grace", "template", "category_channel", "overwrites")
+
+    def __init__(self, channel, config):
+        self.name = config.get("name", "@user's channel")
+        self.limit = config.get("limit", channel.user_limit)
+        self.bitrate = config.get("bitrate", channel.bitrate)
+        self.position = config.get("position", "bottom")
+        self.category = config.get("category", channel.category.id if channel.category else None)
+        self.pool = config.get("pool", 0)
+        self.grace = config.get("grace", 0)
+
+        self.template = Template(self.name)
+        self.category_channel = channel.guild.get_channel(self.category)
+        self.overwrites = overwrites_of(channel)
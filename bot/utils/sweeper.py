@@ -0,0 +1,63 @@
+import asyncio
+import time
+
+
+class Sweeper:
+    """Remembers since when dynamic channels are empty and hands those past their grace period to ``sweep``.
+
+    Runs every ``interval`` seconds while there is something to sweep, so a member who
+    reconnects within the grace period keeps their channel.
+    """
+
+    def __init__(self, sweep, *, interval=1.0, clock=time.monotonic, loop=None):
+        self.sweep = sweep
+        self.interval = interval
+        self.clock = clock
+        self.loop = loop or asyncio.get_event_loop()
+        self.empty = {}  # channel id -> (deadline, channel)
+        self.task = None
+
+        self.swept = 0
+        self.rescued = 0
+
+    def __len__(self):
+        return len(self.empty)
+
+    def __contains__(self, channel_id):
+        return channel_id in self.empty
+
+    def mark(self, channel, grace=0):
+        self.empty[channel.id] = (self.clock() + grace, channel)
+        if self.task is None or self.task.done():
+            self.task = self.loop.create_task(self.run())
+
+    def rescue(self, channel_id):
+        """Keeps a channel someone joined again before it was swept"""
+        if self.empty.pop(channel_id, None) is not None:
+            self.rescued += 1
+
+    def forget(self, channel_id):
+        self.empty.pop(channel_id, None)
+
+    def due(self):
+        now = self.clock()
+        channels = [channel for deadline, channel in self.empty.values() if deadline <= now]
+        for channel in channels:
+            del self.empty[channel.id]
+        return channels
+
+    async def run(self):
+        while self.empty:
+            await asyncio.sleep(self.interval)
+            channels = self.due()
+            if not channels:
+                continue
+            self.swept += len(channels)
+            try:
+                await self.sweep(channels)
+            except Exception as error:
+                print("sweep failed -", error)
+
+    def close(self):
+        if self.task is not None:
+            self.task.cancel()
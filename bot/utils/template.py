@@ -0,0 +1,104 @@
+import random
+import re
+
+
+# a choice runs to the next ], one that is never closed ends at the next token
+TOKEN = re.compile(r"@user|@position|@\[([^\]]*)\]|@\[(?:(?!@user|@position|@\[)[^\]])*")
+OPTION_TOKEN = re.compile(r"@user|@position")
+LIMIT = 100
+
+USER = object()
+POSITION = object()
+
+
+class TemplateError(ValueError):
+    pass
+
+
+class Template:
+    """A channel name template compiled into literal, user, position and random choice parts.
+
+    ``@user`` is replaced with the member's name, ``@position`` with the number of the channel
+    in its category and ``@[a,b,c]`` with one of the options, which can use ``@user`` and
+    ``@position`` themselves. Malformed choices raise a :class:`TemplateError` if ``strict``,
+    otherwise they are kept as they are.
+    """
+
+    __slots__ = ("source", "parts", "uses_position")
+
+    def __init__(self, source, *, strict=False):
+        if strict and not source.strip():
+            raise TemplateError("The name cannot be empty")
+
+        self.source = source
+        self.parts = []
+        self.uses_position = False
+        end = 0
+        for match in TOKEN.finditer(source):
+            self._literal(source[end:match.start()])
+            end = match.end()
+            token = match[0]
+            if token == "@user":
+                self.parts.append(USER)
+            elif token == "@position":
+                self.parts.append(POSITION)
+                self.uses_position = True
+            elif token.endswith("]") and match[1]:
+                self.parts.append(tuple(self._option(option) for option in match[1].split(",")))
+            elif not strict:
+                self._literal(token)
+            elif not token.endswith("]"):
+                raise TemplateError(f"`{token}` is missing a closing `]`")
+            else:
+                raise TemplateError("`@[]` needs at least one option, e.g. `@[red,blue]`")
+        self._literal(source[end:])
+
+    def _option(self, text):
+        """An option of a choice, either a string or the parts it renders from"""
+        parts = []
+        end = 0
+        for match in OPTION_TOKEN.finditer(text):
+            if match.start() > end:
+                parts.append(text[end:match.start()])
+            end = match.end()
+            if match[0] == "@user":
+                parts.append(USER)
+            else:
+                parts.append(POSITION)
+                self.uses_position = True
+        if not parts:
+            return text
+        if end < len(text):
+            parts.append(text[end:])
+        return tuple(parts)
+
+    def _literal(self, text):
+        if not text:
+            return
+        if self.parts and isinstance(self.parts[-1], str):
+            self.parts[-1] += text
+        else:
+            self.parts.append(text)
+
+    def render(self, user, position=0, *, censor=None):
+        """Renders the name in one pass, ``censor`` runs before it is cut to Discord's limit"""
+        pieces = []
+        for part in self.parts:
+            if isinstance(part, tuple):
+                part = random.choice(part)
+                if isinstance(part, tuple):
+                    pieces.extend(user if p is USER else str(position) if p is POSITION else p for p in part)
+                    continue
+            if part is USER:
+                pieces.append(user)
+            elif part is POSITION:
+                pieces.append(str(position))
+            else:
+                pieces.append(part)
+        name = "".join(pieces)
+
+        if censor is not None:
+            name = censor(name)
+        if len(name) > LIMIT:
+            name = name[:LIMIT - 3] + "..."
+        return name
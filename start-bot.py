@@ -1,7 +1,16 @@
-from bot import client
+import os
+
+from bot import client, cluster
 
 TOKEN = "YOUR_TOKEN"
+CLUSTERS = 1  # more than one runs the shards in separate processes, see bot/cluster.py
+SHARDS = 1
+METRICS_PORT = None  # e.g. 9100 to serve http://127.0.0.1:9100/metrics
+LOW_MEMORY = False  # only cache members in voice channels, see README
 
 if __name__ == '__main__':
-    bot = client.Bot()
-    bot.run(TOKEN)
+    if CLUSTERS > 1 or os.path.exists("./data/layout.json"):  # once clustered, the data lives in the cluster directories
+        cluster.launch(TOKEN, shard_count=SHARDS, clusters=CLUSTERS, metrics_port=METRICS_PORT, low_memory=LOW_MEMORY)
+    else:
+        bot = client.Bot(metrics_port=METRICS_PORT, low_memory=LOW_MEMORY)
+        bot.run(TOKEN)